@@ -0,0 +1,122 @@
+# client/dashboard.py
+import tkinter as tk
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+# 中文字体只需设置一次
+matplotlib.rcParams['font.sans-serif'] = ['SimHei']  # 使用黑体
+matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+
+
+class _BarPanel:
+    """
+    一个坐标轴中的柱状图。柱子数量不变时只更新位置、宽度、高度和数量标签，
+    数量变化时才重建这一个坐标轴
+    """
+
+    def __init__(self, ax, title, xlabel, ylabel, color, annotate=False):
+        self.ax = ax
+        self.title = title
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.color = color
+        self.annotate = annotate
+        self.bars = []
+        self.labels = []
+        self._decorate()
+
+    def _decorate(self):
+        self.ax.set_title(self.title)
+        self.ax.set_xlabel(self.xlabel)
+        self.ax.set_ylabel(self.ylabel)
+
+    def update(self, xs, heights, widths, ticklabels=None):
+        if len(xs) != len(self.bars):
+            self.ax.clear()
+            self._decorate()
+            self.bars = list(self.ax.bar(xs, heights, widths, align='edge', color=self.color))
+            self.labels = [self.ax.annotate('', xy=(0, 0), xytext=(0, 3), textcoords="offset points",
+                                            ha='center', va='bottom', fontsize=9)
+                           for _ in self.bars] if self.annotate else []
+        for bar, x, height, width in zip(self.bars, xs, heights, widths):
+            bar.set_x(x)
+            bar.set_width(width)
+            bar.set_height(height)
+        for label, bar in zip(self.labels, self.bars):
+            label.set_text(f'{int(bar.get_height())}')
+            label.xy = (bar.get_x() + bar.get_width() / 2, bar.get_height())
+        if ticklabels is not None:
+            self.ax.set_xticks([x + width / 2 for x, width in zip(xs, widths)])
+            self.ax.set_xticklabels(ticklabels, rotation=45, ha='right')
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+    def show_categories(self, counts):
+        names = list(counts)
+        self.update([i - 0.4 for i in range(len(names))], [counts[name] for name in names],
+                    [0.8] * len(names), ticklabels=names)
+
+    def show_histogram(self, histogram):
+        edges, counts = histogram["edges"], histogram["counts"]
+        self.update(edges[:-1], counts, [b - a for a, b in zip(edges, edges[1:])])
+
+
+class StatisticsDashboard:
+    """
+    统计面板：只创建一个窗口、一个 Figure 和一个画布，每次刷新原地更新图形。
+    数据来自服务器预先分桶的聚合结果（各类数量、价格直方图），不需要下载原始房源
+    """
+
+    def __init__(self, root, on_refresh):
+        self.root = root
+        self.on_refresh = on_refresh
+        self.window = None
+
+    def show(self, data):
+        """
+        :param data: {"rooms": {房型: 数量}, "prices": 价格摘要, "orientation": {朝向: 数量}}
+        """
+        if self.window is None:
+            self._create()
+        self.rooms.show_categories(data["rooms"])
+        self.orientation.show_categories(data["orientation"])
+        self.price.show_histogram(data["prices"]["price"]["histogram"])
+        self.unit_price.show_histogram(data["prices"]["unit_price"]["histogram"])
+        percentiles = data["prices"]["price"]["percentiles"]
+        self.summary.config(text=f"共 {data['prices']['count']} 套，总价中位数 {percentiles['p50'] or '-'} 万，"
+                                 f"均价 {data['prices']['price']['mean'] or '-'} 万")
+        self.canvas.draw_idle()
+        self.window.deiconify()
+        self.window.lift()
+
+    def _create(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.title("统计图")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = tk.Frame(self.window)
+        toolbar.pack(fill=tk.X)
+        tk.Button(toolbar, text="刷新", command=self.on_refresh).pack(side=tk.LEFT, padx=5, pady=5)
+        self.summary = tk.Label(toolbar, text="", font=("Arial", 11))
+        self.summary.pack(side=tk.LEFT, padx=10)
+
+        # 直接使用 Figure 而不是 pyplot，图形不会登记在 pyplot 的全局列表中
+        self.figure = Figure(figsize=(11, 7), tight_layout=True)
+        axes = self.figure.subplots(2, 2)
+        self.rooms = _BarPanel(axes[0][0], '二手房房型统计', '房型', '数量', 'skyblue', annotate=True)
+        self.orientation = _BarPanel(axes[0][1], '朝向统计', '朝向', '数量', 'mediumseagreen', annotate=True)
+        self.price = _BarPanel(axes[1][0], '总价分布', '总价（万）', '数量', 'salmon')
+        self.unit_price = _BarPanel(axes[1][1], '单价分布', '单价（元/㎡）', '数量', 'orange')
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.window)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    def close(self):
+        """关闭窗口并释放图形占用的资源"""
+        if self.window is None:
+            return
+        self.figure.clear()
+        self.canvas.get_tk_widget().destroy()
+        self.window.destroy()
+        self.window = self.figure = self.canvas = None
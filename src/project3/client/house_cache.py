@@ -0,0 +1,76 @@
+# client/house_cache.py
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# 本地房源缓存文件，可通过环境变量 HOUSES_CACHE 指定
+CACHE_PATH = os.environ.get('HOUSES_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'houses_cache.db'))
+
+
+class HouseCache:
+    """
+    房源的本地 SQLite 缓存：保存服务器上的房源及上次同步的 ETag，
+    启动时直接显示缓存的数据，之后只向服务器请求 id 大于本地最大 id 的新房源
+    """
+
+    def __init__(self, fields, path=CACHE_PATH, server_url=None):
+        self.fields = list(fields)
+        self.path = path
+        self._lock = threading.Lock()
+        columns = ", ".join(f"{field} TEXT" for field in self.fields)
+        with self._connect() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS houses (id INTEGER PRIMARY KEY, {columns})")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # 换了服务器时旧缓存无效
+        if server_url is not None and self.get_meta('server_url') != server_url:
+            self.reset()
+            self.set_meta('server_url', server_url)
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作单独打开连接，后台线程和界面线程都可以使用
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_meta(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def etag(self):
+        return self.get_meta('etag')
+
+    def max_id(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM houses").fetchone()[0]
+
+    def load_rows(self):
+        """按 id 顺序返回缓存的房源，元组顺序与 fields 一致"""
+        with self._connect() as conn:
+            return conn.execute(f"SELECT {', '.join(self.fields)} FROM houses ORDER BY id").fetchall()
+
+    def apply_delta(self, rows, etag):
+        """
+        在一个事务中写入新房源并记录对应的 ETag
+        :param rows: (id, 字段...) 元组列表
+        """
+        placeholders = ", ".join("?" * (len(self.fields) + 1))
+        with self._lock, self._connect() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO houses (id, {', '.join(self.fields)}) VALUES ({placeholders})",
+                             rows)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('etag', ?)", (etag,))
+
+    def reset(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM houses")
+            conn.execute("DELETE FROM meta WHERE key = 'etag'")
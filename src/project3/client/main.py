@@ -1,9 +1,192 @@
 # client/main.py
 import tkinter as tk
 from tkinter import messagebox, ttk
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from requests.adapters import HTTPAdapter
+from virtual_table import VirtualTable
+from house_cache import HouseCache
+from dashboard import StatisticsDashboard
+
+# MessagePack 为可选依赖，未安装时退回按列组织的 JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SERVER_URL = "http://localhost:5000"
+
+# 请求超时（连接, 读取），单位秒；爬取请求要等服务器爬完所有页面才返回
+CONNECT_TIMEOUT = 5
+SCRAPE_TIMEOUT = (CONNECT_TIMEOUT, 900)
+DATA_TIMEOUT = (CONNECT_TIMEOUT, 120)
+STATS_TIMEOUT = (CONNECT_TIMEOUT, 30)
+# 统计面板中价格直方图的分桶数
+HISTOGRAM_BINS = 20
+# 主线程处理后台消息的间隔和每次的时间预算（毫秒），保证界面按 60 fps 刷新
+UI_POLL_MS = 16
+UI_BUDGET_MS = 8
+
+HOUSE_FIELDS = ["room_type", "area", "floor", "orientation", "build_year",
+                "owner_name", "address", "description", "price"]
+
+# 客户端支持的最紧凑格式；压缩（gzip/brotli）由 requests 自动协商和解压
+HOUSES_ACCEPT = "application/msgpack" if msgpack is not None else "application/vnd.houses.columns+json"
+
+
+def decode_houses(content_type, body, fields=HOUSE_FIELDS):
+    """按服务器实际返回的格式解码房源列表，返回与 fields 顺序一致的元组列表"""
+    if content_type.startswith("application/msgpack"):
+        payload = msgpack.unpackb(body, raw=False)
+    elif content_type.startswith("application/vnd.houses.columns+json"):
+        payload = json.loads(body)
+    else:
+        return [tuple(item[field] for field in fields) for item in json.loads(body)]
+    columns = payload["columns"]
+    return list(zip(*(columns[field] for field in fields)))
+
+
+def iter_sse(response):
+    """解析 text/event-stream 响应，逐条产出 (event, data)"""
+    event, data_lines = "message", []
+    response.encoding = "utf-8"
+    # chunk_size=None：有数据就立即返回，避免消息被缓冲延迟
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith(":"):
+            continue  # 注释行（保活）
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
+class Cancelled(Exception):
+    pass
+
+
+def read_body(response, cancelled, chunk_size=64 * 1024):
+    """分块读取响应体，期间随时响应取消：取消后立即关闭连接"""
+    chunks = []
+    for chunk in response.iter_content(chunk_size):
+        if cancelled.is_set():
+            response.close()
+            raise Cancelled()
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class HttpWorker:
+    """
+    在后台线程中执行网络请求，所有请求共用一个带连接池的 requests.Session，
+    结果通过 ui_queue 交给 Tk 主线程，按钮回调不会因为等待服务器而卡住界面
+    """
+
+    def __init__(self, ui_queue, max_workers=4):
+        self.ui_queue = ui_queue
+        self.session = requests.Session()
+        # 事件流长期占用一个连接，其余连接供并发请求复用
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers + 1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="http")
+
+    def submit(self, kind, func, *args):
+        """
+        在后台执行 func(session, cancelled, *args)
+        完成后向 ui_queue 放入 (kind, 结果)，出错时放入 (kind + "_error", 异常)；已取消的请求不再回报
+        :return: cancelled 事件，调用其 set() 即可取消
+        """
+        cancelled = threading.Event()
+
+        def run():
+            try:
+                result = func(self.session, cancelled, *args)
+            except Exception as e:
+                if not cancelled.is_set():
+                    self.ui_queue.put((f"{kind}_error", e))
+                return
+            if not cancelled.is_set():
+                self.ui_queue.put((kind, result))
+
+        self._executor.submit(run)
+        return cancelled
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+def post_scrape(session, cancelled, payload):
+    response = session.post(f"{SERVER_URL}/api/scrape", json=payload, timeout=SCRAPE_TIMEOUT)
+    return response.status_code, response.text
+
+
+def load_cached_houses(session, cancelled, cache):
+    return cache.load_rows()
+
+
+def sync_houses(session, cancelled, cache):
+    """
+    增量同步：只下载本地缓存中最大 id 之后的新房源，数据未变化时服务器返回 304
+    :return: (本地缓存的全部房源, 本次新增条数)，未变化时新增条数为 None
+    """
+    since_id = cache.max_id()
+    headers = {"Accept": HOUSES_ACCEPT}
+    if cache.etag:
+        headers["If-None-Match"] = cache.etag
+    with session.get(f"{SERVER_URL}/api/houses", params={"since_id": since_id}, headers=headers,
+                     timeout=DATA_TIMEOUT, stream=True) as response:
+        body = read_body(response, cancelled)
+        if response.status_code in (200, 304) and int(response.headers.get("X-Max-Id", since_id)) < since_id:
+            # 服务器的数据库被重建过，本地缓存作废，重新全量同步
+            cache.reset()
+            return sync_houses(session, cancelled, cache)
+        if response.status_code == 304:
+            return cache.load_rows(), None
+        if response.status_code != 200:
+            raise RuntimeError(f"获取数据失败: {body.decode('utf-8', 'replace')}")
+        rows = decode_houses(response.headers.get("Content-Type", ""), body, ["id"] + HOUSE_FIELDS)
+        cache.apply_delta(rows, response.headers.get("ETag"))
+    return cache.load_rows(), len(rows)
+
+
+def get_json_revalidated(session, path, params, cache):
+    """
+    GET 一个 JSON 接口，带上次的 ETag 重新验证；服务器返回 304 时使用本地缓存的结果
+    :param cache: {(path, 参数): (ETag, 结果)}
+    """
+    key = (path, tuple(sorted(params.items())))
+    etag, payload = cache.get(key, (None, None))
+    headers = {"If-None-Match": etag} if etag else {}
+    response = session.get(f"{SERVER_URL}{path}", params=params, headers=headers, timeout=STATS_TIMEOUT)
+    if response.status_code == 304 and payload is not None:
+        return payload
+    if response.status_code != 200:
+        raise RuntimeError(f"获取统计数据失败: {response.text}")
+    payload = response.json()
+    cache[key] = (response.headers.get("ETag"), payload)
+    return payload
+
+
+def fetch_statistics(session, cancelled, cache):
+    """获取统计面板所需的预先聚合好的数据：房型数量、朝向数量和价格直方图"""
+    return {
+        "rooms": get_json_revalidated(session, "/api/statistics", {}, cache).get("statistics", {}),
+        "orientation": get_json_revalidated(session, "/api/statistics/counts", {"group": "orientation"}, cache),
+        "prices": get_json_revalidated(session, "/api/statistics/prices",
+                                       {"group": "all", "bins": HISTOGRAM_BINS}, cache)["all"],
+    }
+
 
 class ClientGUI:
     def __init__(self, root):
@@ -12,8 +195,23 @@ class ClientGUI:
         self.root.geometry("800x700")
 
         self.scraped_data = []  # 存储爬取到的数据
+        # 后台线程（事件流、爬取请求）通过该队列把结果交给 Tk 主线程
+        self.ui_queue = queue.Queue()
+        # 统计数据的本地缓存及其 ETag，数据未变化时服务器返回 304
+        self.stats_cache = {}
+        self.http = HttpWorker(self.ui_queue)
+        # 进行中的请求：名称 -> 取消事件
+        self.active_requests = {}
+        # 房源的本地缓存，启动时先显示缓存内容
+        self.house_cache = HouseCache(HOUSE_FIELDS, server_url=SERVER_URL)
+
+        self.dashboard = StatisticsDashboard(self.root, self.show_statistics)
 
         self.create_widgets()
+        self.start_request("cached_houses", load_cached_houses, self.house_cache)
+        self.start_event_listener()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
 
     def create_widgets(self):
         # 城市输入框
@@ -42,14 +240,23 @@ class ClientGUI:
         self.stats_button = tk.Button(self.root, text="显示统计图", font=("Arial", 14), command=self.show_statistics)
         self.stats_button.pack(pady=10)
 
-        # 创建表格
-        self.table = ttk.Treeview(self.root, columns=("房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"),
-                                  show="headings", height=15)
-        self.table.pack(pady=10)
+        # 实时进度
+        self.status_label = tk.Label(self.root, text="", font=("Arial", 11))
+        self.status_label.pack(pady=5)
 
-        for col in self.table["columns"]:
-            self.table.heading(col, text=col)
-            self.table.column(col, width=100)
+        progress_frame = tk.Frame(self.root)
+        progress_frame.pack(pady=5)
+        self.progress = ttk.Progressbar(progress_frame, length=400, mode="indeterminate")
+        self.progress.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(progress_frame, text="取消", font=("Arial", 11),
+                                       command=self.cancel_requests, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        # 创建表格
+        # 只渲染可见的行，点击表头可按该列排序
+        self.table = VirtualTable(self.root, ("房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"),
+                                  height=15)
+        self.table.pack(pady=10, fill=tk.BOTH, expand=True)
 
     def scrape_data(self):
         city_code = self.city_entry.get().strip().lower()
@@ -61,89 +268,146 @@ class ClientGUI:
             return
 
         payload = {"city_code": city_code, "pages": pages}
+        # 清空表格，新房源会随着事件流逐页追加
+        self.scraped_data = []
+        self.table.clear()
+        self.scrape_button.config(state=tk.DISABLED)
+        self.status_label.config(text=f"正在爬取 {city_code} ...")
+        # 爬取进度由事件流给出，进度条按页数前进
+        self.progress.stop()
+        self.progress.config(mode="determinate", maximum=pages, value=0)
+        self.start_request("scrape", post_scrape, payload)
+
+    def on_scrape_done(self, result):
+        status_code, text = result
+        if status_code == 200:
+            # 表格中的行来自事件流，可能包含其他城市同时爬到的房源，新增数以服务器的返回为准
+            body = json.loads(text)
+            message = body.get("message", f"爬取完成，获取到 {body.get('data_count', 0)} 条数据。")
+            messagebox.showinfo("成功", f"{message} 新增 {body.get('saved_count', 0)} 条记录已保存到数据库。")
+        else:
+            messagebox.showerror("错误", f"爬取失败: {text}")
+
+    def start_request(self, name, func, *args):
+        """在后台发起请求并显示进度；同名请求进行中时不重复发起"""
+        if name in self.active_requests:
+            return
+        self.active_requests[name] = self.http.submit(name, func, *args)
+        self.cancel_button.config(state=tk.NORMAL)
+        if str(self.progress.cget("mode")) == "indeterminate":
+            self.progress.start(UI_POLL_MS)
+
+    def finish_request(self, name):
+        self.active_requests.pop(name, None)
+        if name == "scrape":
+            self.scrape_button.config(state=tk.NORMAL)
+        if not self.active_requests:
+            self.cancel_button.config(state=tk.DISABLED)
+            self.progress.stop()
+            self.progress.config(mode="indeterminate", value=0)
+
+    def cancel_requests(self):
+        """
+        取消所有进行中的请求：下载中的数据立即断开，其余请求不再等待结果。
+        服务器端已开始的爬取会继续执行，新房源仍会通过事件流显示
+        """
+        for name, cancelled in list(self.active_requests.items()):
+            cancelled.set()
+            self.finish_request(name)
+        self.status_label.config(text="已取消")
+
+    def start_event_listener(self):
+        threading.Thread(target=self._listen_events, daemon=True).start()
+
+    def _listen_events(self):
+        """订阅服务器的 SSE 事件流，断线后自动重连"""
+        while True:
+            try:
+                with self.http.session.get(f"{SERVER_URL}/api/stream", stream=True,
+                                           timeout=(CONNECT_TIMEOUT, 60)) as response:
+                    for event, data in iter_sse(response):
+                        self.ui_queue.put((event, data))
+            except Exception:
+                pass
+            time.sleep(3)
+
+    def process_ui_queue(self):
+        """在 Tk 主线程中处理后台线程送来的消息，每次最多占用 UI_BUDGET_MS 毫秒"""
+        deadline = time.perf_counter() + UI_BUDGET_MS / 1000
         try:
-            response = requests.post("http://localhost:5000/api/scrape", json=payload)
-            if response.status_code == 200:
-                message = response.json().get("message", f"爬取完成，获取到 {len(self.scraped_data)} 条数据。")
-                self.scraped_data = response.json().get("data", [])
-                data_count = len(self.scraped_data)
-                messagebox.showinfo("成功", f"{message} 新增 {data_count} 条记录已保存到数据库。")
-                # 显示在表格中
-                for row in self.table.get_children():
-                    self.table.delete(row)
-                for item in self.scraped_data:
-                    self.table.insert("", tk.END, values=(
-                        item['room_type'], item['area'], item['floor'],
-                        item['orientation'], item['build_year'], item['owner_name'],
-                        item['address'], item['description'], item['price']
-                    ))
+            while time.perf_counter() < deadline:
+                kind, payload = self.ui_queue.get_nowait()
+                self.handle_message(kind, payload)
+        except queue.Empty:
+            pass
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
+
+    def handle_message(self, kind, payload):
+        if kind == "listings":
+            self.append_rows(payload.get("houses", []))
+            if "scrape" in self.active_requests:
+                self.progress.config(value=payload["page"])
+            self.status_label.config(
+                text=f"{payload.get('city_code')}: 第 {payload['page']}/{payload['pages']} 页，"
+                     f"已爬取 {payload['scraped']} 条，新增 {payload['saved']} 条")
+        elif kind == "finished":
+            self.status_label.config(
+                text=f"{payload.get('city_code')} 爬取结束：共 {payload['scraped']} 条，新增 {payload['saved']} 条")
+        elif kind.endswith("_error"):
+            name = kind[:-len("_error")]
+            self.finish_request(name)
+            if isinstance(payload, requests.Timeout):
+                messagebox.showerror("错误", f"请求超时: {payload}")
+            elif isinstance(payload, requests.RequestException):
+                messagebox.showerror("错误", f"无法连接到服务器: {payload}")
             else:
-                messagebox.showerror("错误", f"爬取失败: {response.text}")
-        except Exception as e:
-            messagebox.showerror("错误", f"无法连接到服务器: {e}")
+                messagebox.showerror("错误", str(payload))
+        elif kind == "scrape":
+            self.finish_request(kind)
+            self.on_scrape_done(payload)
+        elif kind == "cached_houses":
+            self.finish_request(kind)
+            if payload and not len(self.table):
+                self.table.set_rows(payload)
+                self.status_label.config(text=f"已显示本地缓存的 {len(payload)} 条数据")
+        elif kind == "houses":
+            self.finish_request(kind)
+            self.on_houses(payload)
+        elif kind == "statistics":
+            self.finish_request(kind)
+            self.on_statistics(payload)
+
+    def append_rows(self, houses):
+        self.scraped_data.extend(houses)
+        self.table.append_rows(tuple(item[field] for field in HOUSE_FIELDS) for item in houses)
 
     def show_data(self):
-        try:
-            response = requests.get("http://localhost:5000/api/houses")
-            if response.status_code == 200:
-                data = response.json()
-                for row in self.table.get_children():
-                    self.table.delete(row)
-                for item in data:
-                    self.table.insert("", tk.END, values=(
-                        item['room_type'], item['area'], item['floor'],
-                        item['orientation'], item['build_year'], item['owner_name'],
-                        item['address'], item['description'], item['price']
-                    ))
-            else:
-                messagebox.showerror("错误", f"获取数据失败: {response.text}")
-        except Exception as e:
-            messagebox.showerror("错误", f"无法连接到服务器: {e}")
+        self.status_label.config(text="正在同步数据 ...")
+        self.start_request("houses", sync_houses, self.house_cache)
+
+    def on_houses(self, result):
+        rows, added = result
+        self.table.set_rows(rows)
+        if added is None:
+            self.status_label.config(text=f"数据未变化，共 {len(rows)} 条")
+        else:
+            self.status_label.config(text=f"同步完成，新增 {added} 条，共 {len(rows)} 条")
 
     def show_statistics(self):
-        try:
-            response = requests.get("http://localhost:5000/api/statistics")
-            if response.status_code == 200:
-                stats = response.json().get("statistics", {})
-                if not stats:
-                    messagebox.showinfo("信息", "没有统计数据可显示。")
-                    return
-                room_types = list(stats.keys())
-                counts = list(stats.values())
-
-                fig, ax = plt.subplots(figsize=(10, 6))
-
-                # 设置中文字体
-                plt.rcParams['font.sans-serif'] = ['SimHei']  # 使用黑体
-                plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-
-                bars = ax.bar(room_types, counts, color='skyblue')
-                ax.set_xlabel('房型')
-                ax.set_ylabel('数量')
-                ax.set_title('二手房房型统计')
-
-                # 旋转x轴标签以防止重叠
-                plt.xticks(rotation=45, ha='right')
-
-                # 在每个柱子上方添加数量标签
-                for bar in bars:
-                    height = bar.get_height()
-                    ax.annotate(f'{height}',
-                                xy=(bar.get_x() + bar.get_width() / 2, height),
-                                xytext=(0, 3),  # 3 points vertical offset
-                                textcoords="offset points",
-                                ha='center', va='bottom', fontsize=10, color='black')
-
-                # 创建一个新的窗口来显示图表
-                stats_window = tk.Toplevel(self.root)
-                stats_window.title("统计图")
-                canvas = FigureCanvasTkAgg(fig, master=stats_window)
-                canvas.draw()
-                canvas.get_tk_widget().pack()
-            else:
-                messagebox.showerror("错误", f"获取统计数据失败: {response.text}")
-        except Exception as e:
-            messagebox.showerror("错误", f"无法连接到服务器: {e}")
+        self.start_request("statistics", fetch_statistics, self.stats_cache)
+
+    def on_statistics(self, data):
+        if not data["rooms"]:
+            messagebox.showinfo("信息", "没有统计数据可显示。")
+            return
+        self.dashboard.show(data)
+
+    def on_close(self):
+        self.dashboard.close()
+        for cancelled in self.active_requests.values():
+            cancelled.set()
+        self.http.close()
+        self.root.destroy()
 
 def main():
     root = tk.Tk()
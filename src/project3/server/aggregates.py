@@ -0,0 +1,208 @@
+# server/aggregates.py
+import re
+from database import House, HouseAggregate
+from sketch import QuantileSketch
+
+
+def parse_total_price(price_str):
+    """从 "360万53412元/㎡" 中提取总价（万）"""
+    match = re.search(r'(\d+(\.\d+)?)万', price_str or '')
+    return float(match.group(1)) if match else None
+
+
+def parse_unit_price(price_str):
+    """从 "360万53412元/㎡" 中提取单价（元/㎡）"""
+    match = re.search(r'(\d+(\.\d+)?)元/', price_str or '')
+    return float(match.group(1)) if match else None
+
+
+def parse_decade(build_year):
+    """"1996年建" -> "1990s" """
+    match = re.search(r'(\d{4})', build_year or '')
+    return f"{int(match.group(1)) // 10 * 10}s" if match else 'N/A'
+
+
+def week_of(created_at):
+    if created_at is None:
+        return None
+    year, week, _ = created_at.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class _Partial:
+    """一批数据在某个聚合键上的增量"""
+
+    def __init__(self):
+        self.count = 0
+        self.price_count = 0
+        self.price_sum = 0.0
+        self.unit_price_count = 0
+        self.unit_price_sum = 0.0
+        self.price_sketch = QuantileSketch()
+        self.unit_price_sketch = QuantileSketch()
+
+    def add(self, price, unit_price):
+        self.count += 1
+        if price is not None:
+            self.price_count += 1
+            self.price_sum += price
+            self.price_sketch.add(price)
+        if unit_price is not None:
+            self.unit_price_count += 1
+            self.unit_price_sum += unit_price
+            self.unit_price_sketch.add(unit_price)
+
+
+def _keys_for(item, city, created_at):
+    district = item.get('district') or 'N/A'
+    keys = [
+        ('city', city, city),
+        ('district', city, district),
+        ('decade', city, parse_decade(item.get('build_year'))),
+        ('orientation', city, item.get('orientation') or 'N/A'),
+    ]
+    week = week_of(created_at)
+    if week:
+        keys.append(('week', city, week))
+    return keys
+
+
+def update_aggregates(session, houses, city, created_at):
+    """
+    在当前事务中把一批新增房源累加到聚合表：
+    先在内存中按聚合键汇总这一批数据，再对每个键做一次读-合并-写；
+    created_at 为空的旧数据不计入按周统计
+    """
+    if not houses:
+        return
+    city = city or 'N/A'
+    partials = {}
+    for item in houses:
+        price = parse_total_price(item.get('price'))
+        unit_price = parse_unit_price(item.get('price'))
+        for key in _keys_for(item, city, created_at):
+            partials.setdefault(key, _Partial()).add(price, unit_price)
+
+    for (dimension, key_city, value), partial in partials.items():
+        row = session.get(HouseAggregate, (dimension, key_city, value))
+        if row is None:
+            row = HouseAggregate(dimension=dimension, city=key_city, value=value,
+                                 count=0, price_count=0, price_sum=0.0,
+                                 unit_price_count=0, unit_price_sum=0.0)
+            session.add(row)
+        row.count += partial.count
+        row.price_count += partial.price_count
+        row.price_sum += partial.price_sum
+        row.unit_price_count += partial.unit_price_count
+        row.unit_price_sum += partial.unit_price_sum
+        row.price_sketch = QuantileSketch.from_json(row.price_sketch).merge(partial.price_sketch).to_json()
+        row.unit_price_sketch = QuantileSketch.from_json(row.unit_price_sketch).merge(partial.unit_price_sketch).to_json()
+
+
+def rebuild_aggregates(session, batch_size=5000):
+    """清空并根据 houses 表重建聚合表（仅用于迁移回填）"""
+    session.query(HouseAggregate).delete()
+    batch, batch_key = [], None
+    query = session.query(House.city, House.district, House.build_year, House.orientation,
+                          House.price, House.created_at)
+    for house in query.order_by(House.city, House.created_at).yield_per(batch_size):
+        key = (house.city, week_of(house.created_at))
+        if batch and (key != batch_key or len(batch) >= batch_size):
+            update_aggregates(session, batch, batch_key[0], batch[0]['_created_at'])
+            session.flush()
+            batch = []
+        batch_key = key
+        batch.append({
+            'district': house.district,
+            'build_year': house.build_year,
+            'orientation': house.orientation,
+            'price': house.price,
+            '_created_at': house.created_at
+        })
+    if batch:
+        update_aggregates(session, batch, batch_key[0], batch[0]['_created_at'])
+
+
+def _summary(rows, bins):
+    """把若干聚合行合并成一份摘要（均值、分位数、直方图）"""
+    count = sum(row.count for row in rows)
+    price_count = sum(row.price_count for row in rows)
+    unit_price_count = sum(row.unit_price_count for row in rows)
+    price_sketch = QuantileSketch()
+    unit_price_sketch = QuantileSketch()
+    for row in rows:
+        price_sketch.merge(QuantileSketch.from_json(row.price_sketch))
+        unit_price_sketch.merge(QuantileSketch.from_json(row.unit_price_sketch))
+
+    def describe(sketch, total, n):
+        edges, counts = sketch.histogram(bins)
+        return {
+            "mean": round(total / n, 2) if n else None,
+            "min": sketch.min,
+            "max": sketch.max,
+            "percentiles": {f"p{int(q * 100)}": sketch.quantile(q) for q in (0.1, 0.25, 0.5, 0.75, 0.9)},
+            "histogram": {"edges": [round(edge, 2) for edge in edges], "counts": counts}
+        }
+
+    return {
+        "count": count,
+        "price": describe(price_sketch, sum(row.price_sum for row in rows), price_count),
+        "unit_price": describe(unit_price_sketch, sum(row.unit_price_sum for row in rows), unit_price_count)
+    }
+
+
+def _rows(session, dimension, city=None):
+    query = session.query(HouseAggregate).filter_by(dimension=dimension)
+    if city:
+        query = query.filter_by(city=city)
+    return query.all()
+
+
+def price_distribution(session, group='city', city=None, bins=10):
+    """按城市或区域返回价格/单价分布，group 为 'all' 时把所有城市（或指定城市）合并为一份"""
+    if group == 'all':
+        return {"all": _summary(_rows(session, 'city', city), bins)}
+    grouped = {}
+    for row in _rows(session, group, city):
+        name = row.value if group == 'city' or city else f"{row.city}/{row.value}"
+        grouped.setdefault(name, []).append(row)
+    return {name: _summary(rows, bins) for name, rows in sorted(grouped.items())}
+
+
+def counts_by(session, group, city=None):
+    """按建造年代或朝向统计数量（未指定城市时合并所有城市）"""
+    counts = {}
+    for row in _rows(session, group, city):
+        counts[row.value] = counts.get(row.value, 0) + row.count
+    return dict(sorted(counts.items()))
+
+
+def weekly_trend(session, city=None):
+    """按入库周统计数量和均价，并给出环比变化"""
+    weeks = {}
+    for row in _rows(session, 'week', city):
+        week = weeks.setdefault(row.value, {"count": 0, "price_count": 0, "price_sum": 0.0,
+                                            "unit_price_count": 0, "unit_price_sum": 0.0})
+        week["count"] += row.count
+        week["price_count"] += row.price_count
+        week["price_sum"] += row.price_sum
+        week["unit_price_count"] += row.unit_price_count
+        week["unit_price_sum"] += row.unit_price_sum
+
+    trend, previous = [], None
+    for name in sorted(weeks):
+        week = weeks[name]
+        entry = {
+            "week": name,
+            "count": week["count"],
+            "mean_price": round(week["price_sum"] / week["price_count"], 2) if week["price_count"] else None,
+            "mean_unit_price": round(week["unit_price_sum"] / week["unit_price_count"], 2) if week["unit_price_count"] else None,
+        }
+        if previous is not None:
+            entry["count_delta"] = entry["count"] - previous["count"]
+            for field in ("mean_price", "mean_unit_price"):
+                if entry[field] is not None and previous[field]:
+                    entry[f"{field}_change_pct"] = round((entry[field] - previous[field]) / previous[field] * 100, 2)
+        trend.append(entry)
+        previous = entry
+    return trend
@@ -1,11 +1,18 @@
 # server/app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, Response, stream_with_context
 from flask_restful import Resource, Api
 from flask_cors import CORS
-from scraper import WebScraper_HouseData
-from database import Session, House
+from scraper import crawl_city
+from database import Session, House, engine, get_data_version
+from cache import response_cache
+from aggregates import price_distribution, counts_by, weekly_trend
+from wire import FORMATS, negotiate_format, negotiate_encoding, encode_rows, compress
+from predictor import model_cache, batcher, parse_listing, predict_rows, ModelNotFound
 from scheduler import scheduler
+from events import broker
+from metrics import registry, instrument_app, instrument_engine
 from sqlalchemy import func
+import json
 import logging
 
 # 配置日志
@@ -15,6 +22,8 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 api = Api(app)
 CORS(app)
+instrument_app(app)
+instrument_engine(engine)
 
 class Scrape(Resource):
     def post(self):
@@ -24,58 +33,214 @@ class Scrape(Resource):
         if not city_code:
             logger.warning("城市代码缺失")
             return {"message": "city_code is required"}, 400
-        base_url = f"https://{city_code}.esf.fang.com/" if city_code != "bj" else "https://esf.fang.com/"
-        scraper = WebScraper_HouseData(base_url=base_url, pages=pages)
-        scraped_data = scraper.scrape()
+        # 每页数据入库后会通过 /api/stream 实时推送给订阅的客户端；
+        # 相同城市和页数的并发请求会合并为一次爬取
+        scraped_data, saved_count, status = crawl_city(city_code, pages)
         if not scraped_data:
             logger.info("没有爬取到任何数据")
-            return {"message": "没有爬取到任何数据。"}, 200
-        scraper.save_to_db(scraped_data)
+            return {"message": "没有爬取到任何数据。", "status": status}, 200
         data_count = len(scraped_data)
         logger.info(f"数据爬取并保存成功，新增 {data_count} 条记录。")
         return {
             "message": f"数据爬取并保存成功，新增 {data_count} 条记录。",
-            "data_count": data_count
+            "data_count": data_count,
+            "saved_count": saved_count,
+            "status": status
         }, 200
 
+HOUSE_FIELDS = ["room_type", "area", "floor", "orientation", "build_year",
+                "owner_name", "address", "description", "price"]
+
+def versioned_response(key, render, mimetype='application/json', vary=(), cache=True):
+    """
+    按数据版本号缓存响应体并支持 ETag/304：
+    数据未变化时直接返回缓存的序列化结果，客户端带 If-None-Match 时返回 304。
+    render 返回 (body, content_encoding)；cache 为 False 时每次重新生成，只使用 ETag
+    """
+    version = get_data_version()
+    etag = f"{key}-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body, content_encoding = response_cache.get_or_compute(key, version, render) if cache else render()
+        response = Response(body, mimetype=mimetype)
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+    response.set_etag(etag)
+    # 允许客户端缓存，但每次使用前都需要用 ETag 重新验证
+    response.headers['Cache-Control'] = 'no-cache'
+    for header in vary:
+        response.vary.add(header)
+    return response
+
+def versioned_json_response(key, compute):
+    return versioned_response(key, lambda: (json.dumps(compute(), ensure_ascii=False), None))
+
+# 增量同步时返回的字段，id 作为客户端的高水位
+DELTA_FIELDS = ["id"] + HOUSE_FIELDS
+
+def load_house_rows(fields=HOUSE_FIELDS, since_id=None):
+    session = Session()
+    try:
+        # 直接查询列元组，避免为每行构造 ORM 对象
+        columns = [getattr(House, field) for field in fields]
+        query = session.query(*columns)
+        if since_id is not None:
+            query = query.filter(House.id > since_id)
+        return query.order_by(House.id).all()
+    finally:
+        session.close()
+
+def max_house_id():
+    session = Session()
+    try:
+        return session.query(func.max(House.id)).scalar() or 0
+    finally:
+        session.close()
+
 class Houses(Resource):
     def get(self):
-        session = Session()
-        houses = session.query(House).all()
+        # 通过 Accept 协商编码格式（逐行/按列 JSON、MessagePack、Arrow IPC），
+        # 通过 Accept-Encoding 协商压缩方式（brotli/gzip）
+        fmt = negotiate_format(request.accept_mimetypes)
+        encoding = negotiate_encoding(request.accept_encodings)
+        since_id = request.args.get('since_id', type=int)
+        if since_id is not None:
+            # 增量同步：只返回 id 大于 since_id 的房源（房源只增不改）。
+            # ETag 由数据版本号和最大 id 决定、与 since_id 无关：客户端同步后带着新的 since_id 和
+            # 上次的 ETag 请求，数据未变化时直接返回 304；结果因客户端而异，不进入响应缓存
+            max_id = max_house_id()
+            response = versioned_response(
+                f"houses-delta:{fmt}:{encoding}:{max_id}",
+                lambda: compress(encode_rows(DELTA_FIELDS, load_house_rows(DELTA_FIELDS, since_id), fmt), encoding),
+                mimetype=FORMATS[fmt],
+                vary=('Accept', 'Accept-Encoding'),
+                cache=False)
+            # 服务器数据库被重建时 id 会变小，客户端据此丢弃本地缓存并全量同步。
+            # 重建后的版本号和最大 id 可能恰好与客户端的 ETag 相同，因此 304 响应也带上该头
+            response.headers['X-Max-Id'] = str(max_id)
+            return response
+        return versioned_response(
+            f"houses:{fmt}:{encoding}",
+            lambda: compress(encode_rows(HOUSE_FIELDS, load_house_rows(), fmt), encoding),
+            mimetype=FORMATS[fmt],
+            vary=('Accept', 'Accept-Encoding'))
+
+def compute_statistics():
+    session = Session()
+    try:
+        count = session.query(House).count()
+        # 按房型统计数量
+        stats = session.query(House.room_type, func.count(House.id)).group_by(House.room_type).all()
+        stats_dict = {room_type: cnt for room_type, cnt in stats}
+        logger.info("统计数据计算完成")
+        return {"total": count, "statistics": stats_dict}
+    finally:
         session.close()
-        data = [{
-            "room_type": house.room_type,
-            "area": house.area,
-            "floor": house.floor,
-            "orientation": house.orientation,
-            "build_year": house.build_year,
-            "owner_name": house.owner_name,
-            "address": house.address,
-            "description": house.description,
-            "price": house.price
-        } for house in houses]
-        return jsonify(data)
 
 class Statistics(Resource):
     def get(self):
-        session = Session()
         try:
-            count = session.query(House).count()
-            # 按房型统计数量
-            stats = session.query(House.room_type, func.count(House.id)).group_by(House.room_type).all()
-            stats_dict = {room_type: cnt for room_type, cnt in stats}
-            logger.info("统计数据获取成功")
-            return jsonify({"total": count, "statistics": stats_dict})
+            return versioned_json_response('statistics', compute_statistics)
         except Exception as e:
             logger.error(f"获取统计数据时出错: {e}")
             return {"message": f"An error occurred: {str(e)}"}, 500
-        finally:
-            session.close()
+
+def query_aggregates(func, *args):
+    session = Session()
+    try:
+        return func(session, *args)
+    finally:
+        session.close()
+
+class PriceStatistics(Resource):
+    def get(self):
+        # 按城市或区域的总价/单价分布（均值、分位数、直方图），数据来自增量维护的聚合表
+        group = request.args.get('group', 'city')
+        city = request.args.get('city')
+        bins = min(max(request.args.get('bins', 10, type=int), 1), 100)
+        if group not in ('city', 'district', 'all'):
+            return {"message": "group must be one of: city, district, all"}, 400
+        return versioned_json_response(f"prices:{group}:{city}:{bins}",
+                                       lambda: query_aggregates(price_distribution, group, city, bins))
+
+class CountStatistics(Resource):
+    def get(self):
+        # 按建造年代或朝向统计数量
+        group = request.args.get('group', 'decade')
+        city = request.args.get('city')
+        if group not in ('decade', 'orientation'):
+            return {"message": "group must be one of: decade, orientation"}, 400
+        return versioned_json_response(f"counts:{group}:{city}",
+                                       lambda: query_aggregates(counts_by, group, city))
+
+class WeeklyStatistics(Resource):
+    def get(self):
+        # 按入库周统计数量、均价及环比变化
+        city = request.args.get('city')
+        return versioned_json_response(f"weekly:{city}", lambda: query_aggregates(weekly_trend, city))
+
+# 单次批量预测的最大房源数
+MAX_PREDICT_BATCH = 10000
+
+class Predict(Resource):
+    def post(self):
+        # 预测总价（万）：{"city": "bj", "listing": {...}} 或 {"city": "bj", "listings": [...]}
+        data = request.get_json(silent=True) or {}
+        city = (data.get('city') or '').strip().lower()
+        if not city:
+            return {"message": "city is required"}, 400
+        try:
+            if 'listings' in data:
+                listings = data['listings']
+                if not isinstance(listings, list) or len(listings) > MAX_PREDICT_BATCH:
+                    return {"message": f"listings must be a list of at most {MAX_PREDICT_BATCH} items"}, 400
+                rows = []
+                for index, item in enumerate(listings):
+                    try:
+                        rows.append(parse_listing(item))
+                    except ValueError as e:
+                        return {"message": f"listings[{index}]: {e}"}, 400
+                # 批量请求本身已是一批，直接向量化预测
+                prices = predict_rows(model_cache, city, rows) if rows else []
+                return {"city": city, "prices": prices}, 200
+            if 'listing' not in data:
+                return {"message": "listing or listings is required"}, 400
+            try:
+                row = parse_listing(data['listing'])
+            except ValueError as e:
+                return {"message": str(e)}, 400
+            # 并发的单条请求由 batcher 合并为一次预测
+            return {"city": city, "price": batcher.predict(city, row)}, 200
+        except ModelNotFound as e:
+            return {"message": str(e)}, 404
+        except Exception as e:
+            logger.error(f"预测失败: {e}")
+            return {"message": f"An error occurred: {str(e)}"}, 500
+
+class Stream(Resource):
+    def get(self):
+        # Server-Sent Events：推送每一页新入库的房源及爬取进度
+        return Response(stream_with_context(broker.stream()),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus 文本格式的监控指标（每个进程各自统计）
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
 api.add_resource(Scrape, '/api/scrape')
 api.add_resource(Houses, '/api/houses')
 api.add_resource(Statistics, '/api/statistics')
+api.add_resource(PriceStatistics, '/api/statistics/prices')
+api.add_resource(CountStatistics, '/api/statistics/counts')
+api.add_resource(WeeklyStatistics, '/api/statistics/weekly')
+api.add_resource(Stream, '/api/stream')
+api.add_resource(Predict, '/api/predict')
 
 if __name__ == '__main__':
+    # 开发服务器；生产环境使用 gunicorn -c gunicorn.conf.py wsgi:application
     scheduler.start()
-    app.run(host='0.0.0.0', port=5000)
+    # SSE 长连接需要多线程服务器，否则会阻塞其他请求
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,27 @@
+# server/cache.py
+import threading
+
+
+class VersionedCache:
+    """按数据版本号缓存计算结果，版本号变化后旧结果自动失效"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, version, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = VersionedCache()
@@ -1,5 +1,7 @@
 # database.py
-from sqlalchemy import create_engine, Column, String, Integer
+import os
+from datetime import datetime
+from sqlalchemy import create_engine, event, Column, String, Integer, Float, Text, DateTime, Index, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -17,7 +19,109 @@ class House(Base):
     address = Column(String)
     description = Column(String)
     price = Column(String)
+    city = Column(String, index=True)
+    district = Column(String)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+    # 入库去重时按 (地址, 价格) 查询
+    __table_args__ = (Index('ix_houses_address_price', 'address', 'price'),)
+
+class HouseAggregate(Base):
+    """
+    增量维护的聚合表：按 (维度, 城市, 取值) 存储数量、价格合计以及价格分位数草图，
+    每批新数据入库时在同一事务中更新，统计接口无需再扫描全表
+    """
+    __tablename__ = 'house_aggregates'
+    dimension = Column(String, primary_key=True)  # city / district / decade / orientation / week
+    city = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    price_count = Column(Integer, nullable=False, default=0)
+    price_sum = Column(Float, nullable=False, default=0.0)
+    unit_price_count = Column(Integer, nullable=False, default=0)
+    unit_price_sum = Column(Float, nullable=False, default=0.0)
+    price_sketch = Column(Text)
+    unit_price_sketch = Column(Text)
+
+class DataVersion(Base):
+    """数据版本号：每次写入数据都会加一，用于缓存失效和 ETag"""
+    __tablename__ = 'data_version'
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# 可通过环境变量指定数据库（例如测试时使用临时文件）
+DB_URL = os.environ.get('HOUSES_DB_URL', 'sqlite:///houses.db')
+
+if DB_URL.startswith('sqlite'):
+    # 写操作由 writer.py 中的单写线程完成，连接池主要服务于并发的读请求
+    engine = create_engine(DB_URL, pool_size=10, max_overflow=20,
+                           connect_args={'timeout': 30, 'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL 模式下读不阻塞写、写不阻塞读；NORMAL 同步级别在 WAL 下仍保证一致性
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=30000')
+        cursor.close()
+else:
+    engine = create_engine(DB_URL)
 
-engine = create_engine('sqlite:///houses.db')
-Base.metadata.create_all(engine)
 Session = sessionmaker(bind=engine)
+
+def bump_data_version(session):
+    """在当前事务内把数据版本号加一，随写入一起提交"""
+    session.query(DataVersion).filter_by(id=1).update({DataVersion.version: DataVersion.version + 1})
+
+def get_data_version():
+    session = Session()
+    try:
+        row = session.get(DataVersion, 1)
+        return row.version if row else 0
+    finally:
+        session.close()
+
+def _add_missing_columns(existing_tables):
+    """为旧数据库中已存在的表补充新增的列和索引，返回是否有改动"""
+    inspector = inspect(engine)
+    changed = False
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(engine.dialect)
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                changed = True
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(engine)
+                changed = True
+    return changed
+
+def init_db():
+    """建表及简单迁移；表结构有变化时同样提升数据版本号"""
+    existing_tables = set(inspect(engine).get_table_names())
+    migrated = _add_missing_columns(existing_tables)
+    Base.metadata.create_all(engine)
+    new_tables = set(Base.metadata.tables) - existing_tables
+    session = Session()
+    try:
+        if session.get(DataVersion, 1) is None:
+            session.add(DataVersion(id=1, version=0))
+            session.flush()
+        if HouseAggregate.__tablename__ in new_tables and session.query(House.id).first() is not None:
+            # 旧数据库第一次升级时，用已有房源一次性回填聚合表
+            from aggregates import rebuild_aggregates
+            rebuild_aggregates(session)
+        if new_tables or migrated:
+            bump_data_version(session)
+        session.commit()
+    finally:
+        session.close()
+
+init_db()
@@ -0,0 +1,141 @@
+# server/events.py
+import glob
+import json
+import os
+import queue
+import socket
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event, data):
+    """按 Server-Sent Events 协议格式化一条消息"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class _Subscriber:
+    def __init__(self, max_queue_size):
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped = False
+
+
+class EventBroker:
+    """
+    发布/订阅中心，爬虫每保存一页数据就向所有订阅的客户端推送一次。
+    默认只在本进程内推送，多进程部署时可通过 enable_relay 在进程间转发
+    """
+
+    def __init__(self, max_queue_size=1000, heartbeat=15):
+        self.max_queue_size = max_queue_size
+        self.heartbeat = heartbeat
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._relay_dir = None
+        self._relay_path = None
+        self._relay_socket = None
+        self._send_socket = None
+
+    def subscribe(self):
+        subscriber = _Subscriber(self.max_queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        logger.info(f"新的事件订阅者，当前共 {len(self._subscribers)} 个")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        message = format_sse(event, data)
+        self._dispatch(message)
+        if self._send_socket is not None:
+            self._relay(message)
+
+    def enable_relay(self, directory):
+        """
+        多进程部署时启用进程间转发：每个进程在 directory 下绑定一个 Unix 数据报套接字，
+        publish 时把消息转发给其他进程，使连接到任意进程的 SSE 客户端都能收到事件
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            logger.warning("当前平台不支持 Unix 套接字，事件只在本进程内推送")
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.sock")
+        if os.path.exists(path):
+            os.remove(path)
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(path)
+        # 发送端不阻塞：某个进程来不及接收时丢弃消息，而不是拖慢爬虫
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sender.setblocking(False)
+        self._relay_dir = directory
+        self._relay_path = path
+        self._relay_socket = receiver
+        self._send_socket = sender
+        threading.Thread(target=self._receive_relayed, args=(receiver,), name="event-relay", daemon=True).start()
+
+    def disable_relay(self):
+        receiver, sender = self._relay_socket, self._send_socket
+        self._relay_socket = self._send_socket = None
+        if receiver is not None:
+            receiver.close()
+            sender.close()
+            if os.path.exists(self._relay_path):
+                os.remove(self._relay_path)
+
+    def _relay(self, message):
+        payload = message.encode('utf-8')
+        for path in glob.glob(os.path.join(self._relay_dir, "*.sock")):
+            if path == self._relay_path:
+                continue
+            try:
+                self._send_socket.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 对应的进程已退出，清理残留的套接字文件
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except OSError as e:
+                logger.warning(f"转发事件到 {path} 失败: {e}")
+
+    def _receive_relayed(self, sock):
+        while True:
+            try:
+                payload = sock.recv(1 << 20)
+            except OSError:
+                return
+            self._dispatch(payload.decode('utf-8'))
+
+    def _dispatch(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                # 客户端消费太慢，直接断开，避免队列无限增长
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+                logger.warning("事件订阅者消费过慢，已断开")
+
+    def stream(self):
+        """为单个 SSE 连接生成消息流，连接断开时自动取消订阅"""
+        subscriber = self.subscribe()
+        try:
+            yield ": connected\n\n"
+            while not subscriber.dropped:
+                try:
+                    yield subscriber.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # 定期发送注释行保活，同时让断开的连接尽快被发现
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+broker = EventBroker()
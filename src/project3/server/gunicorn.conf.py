@@ -0,0 +1,51 @@
+# server/gunicorn.conf.py
+"""
+gunicorn 多进程部署配置：
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+- 主进程预加载应用后 fork 出多个工作进程，吞吐量随 CPU 核数扩展；
+- 每个工作进程使用多线程处理请求；每个 SSE 长连接在断开前一直占用一个线程，
+  一个工作进程同时最多服务 threads 个连接，订阅 /api/stream 的客户端较多时需相应调大 GUNICORN_THREADS，
+  否则 SSE 连接会占满工作进程，普通请求只能排队；
+- 定时任务只在通过文件锁选出的一个工作进程中运行；
+- kill -HUP <主进程> 平滑重启所有工作进程，正在处理的请求在 graceful_timeout 内完成
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+# gthread 工作进程在请求处理期间仍会发送心跳，长时间的爬取请求不会触发超时
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+
+def _relay_dir(server):
+    return os.environ.get('EVENT_RELAY_DIR',
+                          os.path.join(tempfile.gettempdir(), f"houses-events-{server.pid}"))
+
+
+def post_fork(server, worker):
+    from database import engine
+    from events import broker
+    from scheduler import start_as_leader
+
+    # 不关闭从主进程继承的连接（主进程仍持有它们），只让本进程的连接池重新建立连接
+    engine.dispose(close=False)
+    broker.enable_relay(_relay_dir(server))
+    start_as_leader()
+
+
+def worker_exit(server, worker):
+    from events import broker
+    from scheduler import stop_scheduler
+    from writer import writer
+
+    stop_scheduler()
+    writer.stop()
+    broker.disable_relay()
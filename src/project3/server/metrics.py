@@ -0,0 +1,212 @@
+# server/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+
+# 默认的延迟分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """按 Prometheus 文本格式（0.0.4）输出所有指标"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP 请求
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+
+# 爬虫
+CRAWL_PAGES = registry.register(Counter(
+    "crawl_pages_total", "Listing pages fetched, by result.", ("city", "result")))
+CRAWL_RECORDS = registry.register(Counter(
+    "crawl_records_total", "Listings parsed from fetched pages.", ("city",)))
+CRAWL_PAGE_LATENCY = registry.register(Histogram(
+    "crawl_page_fetch_seconds", "Time to fetch and parse one listing page.", ("city",)))
+CRAWL_PAGES_PER_SECOND = registry.register(Gauge(
+    "crawl_last_pages_per_second", "Throughput of the most recent crawl, including politeness delays.", ("city",)))
+
+# 数据库
+DB_SAVE_BATCH_SIZE = registry.register(Histogram(
+    "db_save_batch_size", "Listings per save_to_db call.", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)))
+DB_SAVE_LATENCY = registry.register(Histogram(
+    "db_save_duration_seconds", "save_to_db duration including writer queue wait."))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time by statement type.", ("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)))
+
+# 价格预测
+PREDICT_BATCH_SIZE = registry.register(Histogram(
+    "predict_batch_size", "Rows per vectorised pipeline.predict call.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)))
+PREDICT_LATENCY = registry.register(Histogram(
+    "predict_duration_seconds", "pipeline.predict time per batch.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)))
+
+# 定时任务
+SCHEDULER_JOB_LATENCY = registry.register(Histogram(
+    "scheduler_job_duration_seconds", "Scheduled job run time.", ("job",)))
+SCHEDULER_JOB_FAILURES = registry.register(Counter(
+    "scheduler_job_failures_total", "Scheduled job runs that raised.", ("job",)))
+SCHEDULER_JOB_RECORDS = registry.register(Counter(
+    "scheduler_job_records_total", "Listings scraped and newly saved by scheduled jobs.", ("job", "kind")))
+
+
+def instrument_engine(engine):
+    """通过 SQLAlchemy 引擎事件记录每条 SQL 的执行耗时"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        statement_type = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_LATENCY.observe(time.perf_counter() - start, statement=statement_type)
+
+
+def instrument_app(app):
+    """为 Flask 应用记录每个路由的请求数、延迟和并发数"""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record(response):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - g.metrics_start, method=request.method, route=route)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        if "metrics_start" in g:
+            HTTP_IN_FLIGHT.dec()
@@ -0,0 +1,235 @@
+# server/predictor.py
+import os
+import re
+import sys
+import glob
+import queue
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+import joblib
+import pandas as pd
+from singleflight import SingleFlight
+from metrics import PREDICT_BATCH_SIZE, PREDICT_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# 训练好的 {city}_pipeline.joblib 所在目录（与 project4 保存模型的 models 目录格式相同）
+MODELS_DIR = os.environ.get('MODELS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+# project4 训练的模型中包含 project4 的特征提取类（FeatureExtractor），加载这类模型必须配置 project4 的源码目录；
+# 不设置默认值，未配置时加载失败并提示设置 PROJECT4_DIR，而不是悄悄依赖仓库的目录结构
+PROJECT4_DIR = os.environ.get('PROJECT4_DIR')
+if PROJECT4_DIR:
+    if not os.path.isdir(PROJECT4_DIR):
+        raise RuntimeError(f"PROJECT4_DIR is not a directory: {PROJECT4_DIR}")
+    if os.path.abspath(PROJECT4_DIR) not in sys.path:
+        sys.path.append(os.path.abspath(PROJECT4_DIR))
+# 同时保留在内存中的模型数
+MODEL_CACHE_SIZE = int(os.environ.get('MODEL_CACHE_SIZE', 8))
+# 每个模型记住的单条预测结果数，重复查询相同房源时不再调用 pipeline.predict
+PREDICTION_MEMO_SIZE = int(os.environ.get('PREDICTION_MEMO_SIZE', 10000))
+
+FEATURES = ['room_type', 'orientation', 'floor', 'area', 'build_year']
+
+
+class ModelNotFound(LookupError):
+    pass
+
+
+def parse_listing(item):
+    """
+    把一条房源转换为模型的输入特征，面积和建造年份既可以是数字，
+    也可以是爬取到的原始文本（如 "89㎡"、"2010年建"）
+    """
+    if not isinstance(item, dict):
+        raise ValueError("listing must be an object")
+    missing = [name for name in FEATURES if item.get(name) in (None, '')]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    area = re.search(r'\d+(\.\d+)?', str(item['area']))
+    build_year = re.search(r'\d{4}', str(item['build_year']))
+    if not area:
+        raise ValueError(f"invalid area: {item['area']}")
+    if not build_year:
+        raise ValueError(f"invalid build_year: {item['build_year']}")
+    return (str(item['room_type']), str(item['orientation']), str(item['floor']),
+            float(area.group()), int(build_year.group()))
+
+
+def load_pipeline(path):
+    try:
+        return joblib.load(path)
+    except ModuleNotFoundError as e:
+        raise RuntimeError(f"model {path} needs module {e.name}; "
+                           f"set PROJECT4_DIR to the project4 source directory") from e
+
+
+class _LoadedModel:
+    """已加载的管道及其单条预测结果的 LRU 记录，随模型文件一起失效"""
+
+    def __init__(self, pipeline, memo_size=PREDICTION_MEMO_SIZE):
+        self.pipeline = pipeline
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def recall(self, row):
+        with self._lock:
+            price = self._memo.get(row)
+            if price is not None:
+                self._memo.move_to_end(row)
+            return price
+
+    def remember(self, rows, prices):
+        with self._lock:
+            for row, price in zip(rows, prices):
+                self._memo[row] = price
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+
+class ModelCache:
+    """
+    按城市缓存已加载的预测管道（LRU），模型文件的修改时间变化后自动重新加载；
+    同一文件的并发加载只执行一次
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, max_models=MODEL_CACHE_SIZE):
+        self.models_dir = models_dir
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = SingleFlight()
+
+    def path_for(self, city):
+        if not re.fullmatch(r'[a-z]+', city or ''):
+            raise ModelNotFound(f"invalid city: {city}")
+        return os.path.join(self.models_dir, f"{city}_pipeline.joblib")
+
+    def get(self, city):
+        return self.get_model(city).pipeline
+
+    def get_model(self, city):
+        path = self.path_for(city)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise ModelNotFound(f"no model for city: {city}") from None
+        with self._lock:
+            entry = self._models.get(city)
+            if entry is not None and entry[0] == mtime:
+                self._models.move_to_end(city)
+                return entry[1]
+        model, _ = self._loading.do((city, mtime), lambda: _LoadedModel(load_pipeline(path)))
+        with self._lock:
+            self._models[city] = (mtime, model)
+            self._models.move_to_end(city)
+            while len(self._models) > self.max_models:
+                evicted, _ = self._models.popitem(last=False)
+                logger.info(f"模型缓存已满，移除 {evicted} 的模型")
+        logger.info(f"已加载 {city} 的模型: {path}")
+        return model
+
+    def preload(self):
+        """加载模型目录中的所有模型（最多 max_models 个），返回加载的城市列表"""
+        cities = []
+        for path in sorted(glob.glob(os.path.join(self.models_dir, '*_pipeline.joblib')))[:self.max_models]:
+            city = os.path.basename(path)[:-len('_pipeline.joblib')]
+            try:
+                self.get(city)
+                cities.append(city)
+            except Exception as e:
+                logger.error(f"预加载 {city} 的模型失败: {e}")
+        return cities
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+def predict_rows(cache, city, rows, remember=False):
+    """对已解析的特征行做一次向量化预测，返回总价（万）列表"""
+    model = cache.get_model(city)
+    frame = pd.DataFrame.from_records(rows, columns=FEATURES)
+    with PREDICT_LATENCY.time():
+        prices = [float(price) for price in model.pipeline.predict(frame)]
+    PREDICT_BATCH_SIZE.observe(len(rows))
+    if remember:
+        model.remember(rows, prices)
+    return prices
+
+
+class _PredictTask:
+    def __init__(self, city, row):
+        self.city = city
+        self.row = row
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    合并并发的单条预测：请求线程把特征行放入队列，预测线程每次取出队列中积压的全部请求，
+    按城市合并为一次 pipeline.predict 调用。没有积压时单条请求立即预测，不额外等待；
+    预测过的房源直接返回记住的结果，不进入队列
+    """
+
+    def __init__(self, cache, max_batch=512):
+        self.cache = cache
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # 按进程启动预测线程：fork 出的子进程不会继承父进程的线程
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="predict-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, city, row):
+        self._ensure_started()
+        task = _PredictTask(city, row)
+        self._queue.put(task)
+        return task.future
+
+    def predict(self, city, row):
+        price = self.cache.get_model(city).recall(row)
+        if price is not None:
+            return price
+        return self.submit(city, row).result()
+
+    def _collect_batch(self, first):
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch(self._queue.get())
+            by_city = {}
+            for task in batch:
+                by_city.setdefault(task.city, []).append(task)
+            for city, tasks in by_city.items():
+                try:
+                    prices = predict_rows(self.cache, city, [task.row for task in tasks], remember=True)
+                except Exception as e:
+                    for task in tasks:
+                        task.future.set_exception(e)
+                    continue
+                for task, price in zip(tasks, prices):
+                    task.future.set_result(price)
+
+
+model_cache = ModelCache()
+batcher = MicroBatcher(model_cache)
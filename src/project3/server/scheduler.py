@@ -1,13 +1,104 @@
 # scheduler.py
+import os
+import tempfile
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
-from scraper import WebScraper_HouseData
+from scraper import crawl_city
+from metrics import SCHEDULER_JOB_LATENCY, SCHEDULER_JOB_FAILURES, SCHEDULER_JOB_RECORDS
 
-def scheduled_scrape():
-    base_url = "https://esf.fang.com/"  # 可以根据需要调整
-    scraper = WebScraper_HouseData(base_url=base_url, pages=5)
-    scraped_data = scraper.scrape()
-    scraper.save_to_db(scraped_data)
-    print(f"Scheduled scraping completed. {len(scraped_data)} new records added.")
+logger = logging.getLogger(__name__)
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(scheduled_scrape, 'interval', weeks=1)
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 多进程部署时，只有持有该文件锁的进程运行定时任务
+SCHEDULER_LOCK_FILE = os.environ.get(
+    'SCHEDULER_LOCK_FILE', os.path.join(tempfile.gettempdir(), 'houses-scheduler.lock'))
+
+# 定时爬取的城市、周期和每次的页数
+SCRAPE_CITIES = [c.strip() for c in os.environ.get('SCRAPE_CITIES', 'bj,sh,hf,sy').split(',') if c.strip()]
+SCRAPE_INTERVAL_DAYS = float(os.environ.get('SCRAPE_INTERVAL_DAYS', 7))
+SCRAPE_PAGES = int(os.environ.get('SCRAPE_PAGES', 5))
+# 默认增量爬取：某一页没有新房源时提前结束
+SCRAPE_INCREMENTAL = os.environ.get('SCRAPE_INCREMENTAL', '1') != '0'
+# 每次触发时间的随机偏移（秒）
+SCRAPE_JITTER = int(os.environ.get('SCRAPE_JITTER', 1800))
+# 同时运行的爬取任务数上限
+SCHEDULER_MAX_WORKERS = int(os.environ.get('SCHEDULER_MAX_WORKERS', 2))
+# 各城市的任务以该时间为基准错开，重启服务不会改变任务的触发时刻
+SCHEDULE_ANCHOR = datetime(2024, 1, 1, 3, 0)
+
+def scheduled_scrape(city_code, pages=SCRAPE_PAGES, incremental=SCRAPE_INCREMENTAL):
+    # 与同一城市、同一页数的爬取共享结果，避免重复爬取；增量爬取也可以复用用户触发的完整爬取
+    job = f"scrape_{city_code}"
+    started = time.perf_counter()
+    try:
+        with SCHEDULER_JOB_LATENCY.time(job=job):
+            scraped_data, saved_count, status = crawl_city(city_code, pages=pages, incremental=incremental)
+    except Exception:
+        SCHEDULER_JOB_FAILURES.inc(job=job)
+        logger.exception(f"定时任务 {job} 失败")
+        raise
+    SCHEDULER_JOB_RECORDS.inc(len(scraped_data), job=job, kind="scraped")
+    SCHEDULER_JOB_RECORDS.inc(saved_count, job=job, kind="saved")
+    logger.info(f"定时任务 {job} 完成（{status}），耗时 {time.perf_counter() - started:.1f} 秒，"
+                f"爬取 {len(scraped_data)} 条，新增 {saved_count} 条")
+
+def create_scheduler(cities=SCRAPE_CITIES, interval_days=SCRAPE_INTERVAL_DAYS, jitter=SCRAPE_JITTER,
+                     max_workers=SCHEDULER_MAX_WORKERS):
+    """
+    每个城市注册一个周期任务，触发时间在周期内均匀错开并加随机偏移，避免集中爬取。
+    同一任务不会重叠运行，错过的多次触发合并为一次
+    """
+    scheduler = BackgroundScheduler(
+        executors={'default': ThreadPoolExecutor(max_workers)},
+        job_defaults={'max_instances': 1, 'coalesce': True, 'misfire_grace_time': 3600})
+    interval = timedelta(days=interval_days)
+    for i, city_code in enumerate(cities):
+        scheduler.add_job(scheduled_scrape, 'interval', args=(city_code,), id=f"scrape_{city_code}",
+                          name=f"scrape_{city_code}", seconds=interval.total_seconds(),
+                          start_date=SCHEDULE_ANCHOR + interval * i / len(cities), jitter=jitter)
+    return scheduler
+
+scheduler = create_scheduler()
+_leader_lock = None
+
+
+def _lead(lock_path):
+    global _leader_lock
+    lock_file = open(lock_path, 'a')
+    # 阻塞直到拿到锁：当前的主进程退出后锁自动释放，等待中的进程接替运行定时任务
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    print(f"Process {os.getpid()} is now the scheduler leader.")
+    _leader_lock = lock_file
+    scheduler.start()
+
+
+def start_as_leader(lock_path=SCHEDULER_LOCK_FILE):
+    """
+    在多个工作进程中选出唯一运行定时任务的进程：各进程在后台线程中竞争同一个文件锁，
+    拿到锁的进程启动 scheduler，其余进程一直等待，直到持锁进程退出后接替
+    """
+    if fcntl is None:
+        scheduler.start()
+        return
+    threading.Thread(target=_lead, args=(lock_path,), name="scheduler-leader", daemon=True).start()
+
+
+def stop_scheduler():
+    global _leader_lock
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    if _leader_lock is not None:
+        _leader_lock.close()
+        _leader_lock = None
@@ -1,18 +1,62 @@
 # server/scraper.py
+import os
 import re
 import requests
 from bs4 import BeautifulSoup
 import time
 import random
-from database import House, Session
+from datetime import datetime
+from database import House, bump_data_version
+from aggregates import update_aggregates
+from events import broker
+from writer import writer
+from singleflight import SingleFlight
+from metrics import (CRAWL_PAGES, CRAWL_RECORDS, CRAWL_PAGE_LATENCY, CRAWL_PAGES_PER_SECOND,
+                     DB_SAVE_BATCH_SIZE, DB_SAVE_LATENCY)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 同一城市、同一页码范围的爬取在该时间（秒）内完成过，则直接复用结果
+SCRAPE_FRESH_SECONDS = float(os.environ.get('SCRAPE_FRESH_SECONDS', 600))
+crawl_flight = SingleFlight(fresh_for=SCRAPE_FRESH_SECONDS)
+# 两次翻页之间的随机延时（秒），格式 "最小值,最大值"，压测时可设为 "0,0"
+SCRAPE_DELAY = tuple(float(v) for v in os.environ.get('SCRAPE_DELAY', '1,3').split(','))
+# 目标站点地址模板，压测时可指向本地的模拟站点，例如 "http://127.0.0.1:8765/{city}/"
+SCRAPER_BASE_URL = os.environ.get('SCRAPER_BASE_URL')
+
+def _insert_houses(session, data, city_code, created_at):
+    """在写线程的事务中去重并插入房源，返回新增的记录"""
+    saved = []
+    for item in data:
+        exists = session.query(House.id).filter_by(address=item['address'], price=item['price']).first()
+        if not exists:
+            session.add(House(
+                room_type=item['room_type'],
+                area=item['area'],
+                floor=item['floor'],
+                orientation=item['orientation'],
+                build_year=item['build_year'],
+                owner_name=item['owner_name'],
+                address=item['address'],
+                description=item['description'],
+                price=item['price'],
+                city=city_code,
+                district=item.get('district'),
+                created_at=created_at
+            ))
+            saved.append(item)
+    if saved:
+        # 聚合表和版本号与新增数据在同一事务中更新，使统计缓存失效
+        update_aggregates(session, saved, city_code, created_at)
+        bump_data_version(session)
+    return saved
+
 class WebScraper_HouseData:
-    def __init__(self, base_url, pages=5):
+    def __init__(self, base_url, pages=5, city_code=None):
         self.base_url = base_url
         self.pages = pages
+        self.city_code = city_code or 'N/A'  # 仅用作监控指标的标签
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
         }
@@ -36,12 +80,13 @@ class WebScraper_HouseData:
 
         tel_numbers = [tel.get_text(strip=True) for tel in tel_shop_paragraphs]
         add_shops = [add.get_text(strip=True) for add in add_shop_paragraphs]
+        districts = [self.parse_district(add) for add in add_shop_paragraphs]
         clearfix_labels = [label.get_text(strip=True) for label in clearfix_paragraphs]
         prices = [price.get_text(strip=True) for price in price_right_dd]
 
         data = []
 
-        for tel, addr, label, price in zip(tel_numbers, add_shops, clearfix_labels, prices):
+        for tel, addr, district, label, price in zip(tel_numbers, add_shops, districts, clearfix_labels, prices):
             phone_info = self.parse_phone_info(tel)
             if phone_info:
                 house_data = {
@@ -52,6 +97,7 @@ class WebScraper_HouseData:
                     'build_year': phone_info.get('build_year', 'N/A'),
                     'owner_name': phone_info.get('owner_name', 'N/A'),
                     'address': addr,
+                    'district': district,
                     'description': label,
                     'price': price
                 }
@@ -61,6 +107,13 @@ class WebScraper_HouseData:
 
         return data
 
+    def parse_district(self, add_shop):
+        # 地址形如 <a>小区名</a><span>朝阳-青年路</span>，区域为 span 中 "-" 之前的部分
+        span = add_shop.find('span')
+        if span is None:
+            return 'N/A'
+        return span.get_text(strip=True).split('-')[0] or 'N/A'
+
     def parse_phone_info(self, tel):
         fields = tel.split('|')
         if len(fields) != 6:
@@ -75,56 +128,98 @@ class WebScraper_HouseData:
             'owner_name': fields[5]
         }
 
-    def scrape(self, url=None):
+    def scrape_pages(self, url=None):
+        """逐页爬取，每解析完一页就产出 (页码, 该页数据)"""
         if url is None:
             url = self.base_url
-        all_data = []
+        started = time.perf_counter()
         for page_num in range(1, self.pages + 1):
             full_url = f"{url}?page={page_num}"
             logger.info(f"正在爬取: {full_url}")
-            html = self.get_html(full_url)
-            if html:
-                page_data = self.parse_html(html)
-                all_data.extend(page_data)
-            time.sleep(random.uniform(1, 3))
+            with CRAWL_PAGE_LATENCY.time(city=self.city_code):
+                html = self.get_html(full_url)
+                page_data = self.parse_html(html) if html else []
+            CRAWL_PAGES.inc(city=self.city_code, result='ok' if html else 'failed')
+            CRAWL_RECORDS.inc(len(page_data), city=self.city_code)
+            yield page_num, page_data
+            time.sleep(random.uniform(*SCRAPE_DELAY))
+            CRAWL_PAGES_PER_SECOND.set(page_num / (time.perf_counter() - started), city=self.city_code)
+
+    def scrape(self, url=None):
+        all_data = []
+        for _, page_data in self.scrape_pages(url):
+            all_data.extend(page_data)
         return all_data
 
-    def save_to_db(self, data):
-        session = Session()
-        saved_count = 0
+    def save_to_db(self, data, city_code=None):
+        """
+        保存数据并返回其中新增（去重后）的记录，同时增量更新聚合表。
+        实际写入由单写线程完成，并可能与其他线程的写入合并为一个事务
+        """
+        DB_SAVE_BATCH_SIZE.observe(len(data))
         try:
-            for item in data:
-                exists = session.query(House).filter_by(address=item['address'], price=item['price']).first()
-                if not exists:
-                    house = House(
-                        room_type=item['room_type'],
-                        area=item['area'],
-                        floor=item['floor'],
-                        orientation=item['orientation'],
-                        build_year=item['build_year'],
-                        owner_name=item['owner_name'],
-                        address=item['address'],
-                        description=item['description'],
-                        price=item['price']
-                    )
-                    session.add(house)
-                    saved_count += 1
-            session.commit()
-            logger.info(f"成功保存 {saved_count} 条新记录到数据库。")
+            with DB_SAVE_LATENCY.time():
+                saved = writer.execute(_insert_houses, data, city_code, datetime.now())
+            logger.info(f"成功保存 {len(saved)} 条新记录到数据库。")
+            return saved
         except Exception as e:
-            session.rollback()
             logger.error(f"保存数据到数据库时出错: {e}")
-        finally:
-            session.close()
+            return []
 
-    def scrape_and_save(self, url=None):
-        data = self.scrape(url)
-        if data:
-            self.save_to_db(data)
-        return data
+    def scrape_and_save(self, url=None, city_code=None, incremental=False):
+        """
+        边爬边存：每页数据入库后立即通过事件流推送新增房源和进度。
+        incremental 为 True 时，某一页没有任何新增房源就认为后面都是已入库的旧数据，提前结束
+        :return: (爬取到的数据, 新增记录数)
+        """
+        all_data = []
+        saved_count = 0
+        broker.publish('started', {"city_code": city_code, "pages": self.pages})
+        for page_num, page_data in self.scrape_pages(url):
+            saved = self.save_to_db(page_data, city_code) if page_data else []
+            all_data.extend(page_data)
+            saved_count += len(saved)
+            broker.publish('listings', {
+                "city_code": city_code,
+                "page": page_num,
+                "pages": self.pages,
+                "scraped": len(all_data),
+                "saved": saved_count,
+                "houses": saved
+            })
+            if incremental and page_data and not saved:
+                logger.info(f"{city_code} 第 {page_num} 页没有新房源，增量爬取结束")
+                break
+        broker.publish('finished', {"city_code": city_code, "scraped": len(all_data), "saved": saved_count})
+        return all_data, saved_count
+
+def city_url(city_code):
+    if SCRAPER_BASE_URL:
+        return SCRAPER_BASE_URL.format(city=city_code)
+    return f"https://{city_code}.esf.fang.com/" if city_code != "bj" else "https://esf.fang.com/"
+
+def crawl_city(city_code, pages=5, incremental=False):
+    """
+    爬取并保存指定城市的数据。
+    同一城市、同一页码范围、同一方式的并发请求只执行一次爬取，其余请求等待并共享结果；
+    新鲜期内再次请求直接复用上次的结果。增量爬取遇到没有新房源的一页就结束，结果可能不完整，
+    因此只允许增量请求（定时任务）复用正在进行或刚完成的完整爬取，完整请求不会复用增量爬取的结果
+    :return: (爬取到的数据, 新增记录数, 状态)，状态见 singleflight 模块
+    """
+    def run():
+        scraper = WebScraper_HouseData(base_url=city_url(city_code), pages=pages, city_code=city_code)
+        return scraper.scrape_and_save(city_code=city_code, incremental=incremental)
+    shared = crawl_flight.share((city_code, 1, pages, False)) if incremental else None
+    if shared is not None:
+        (data, saved_count), status = shared
+    else:
+        (data, saved_count), status = crawl_flight.do((city_code, 1, pages, incremental), run)
+    if status != 'executed':
+        logger.info(f"复用 {city_code} 第 1-{pages} 页的爬取结果（{status}）")
+    return data, saved_count, status
 
 if __name__ == "__main__":
     # 示例使用
     scraper = WebScraper_HouseData(base_url="https://hf.esf.fang.com/", pages=1)
-    data = scraper.scrape_and_save()
+    data, saved_count = scraper.scrape_and_save()
     print(f"爬取并保存了 {len(data)} 条数据。")
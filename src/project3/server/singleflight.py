@@ -0,0 +1,80 @@
+# server/singleflight.py
+import threading
+import time
+from concurrent.futures import Future
+
+EXECUTED = 'executed'   # 本次调用实际执行了任务
+JOINED = 'joined'       # 加入了正在执行的相同任务
+FRESH = 'fresh'         # 复用了新鲜期内刚完成的结果
+
+
+class SingleFlight:
+    """
+    合并重复的并发调用：相同 key 同时只执行一次，后来的调用等待并共享同一结果；
+    任务成功完成后的 fresh_for 秒内，相同 key 的调用直接复用该结果
+    """
+
+    def __init__(self, fresh_for=0):
+        self.fresh_for = fresh_for
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._completed = {}
+
+    def do(self, key, func):
+        """
+        :return: (结果, 状态)，状态为 EXECUTED / JOINED / FRESH
+        """
+        with self._lock:
+            completed = self._completed.get(key)
+            if completed is not None:
+                finished_at, result = completed
+                if time.monotonic() - finished_at < self.fresh_for:
+                    return result, FRESH
+                del self._completed[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                owner = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                owner = True
+
+        if not owner:
+            return future.result(), JOINED
+
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            if self.fresh_for > 0:
+                self._completed[key] = (time.monotonic(), result)
+        future.set_result(result)
+        return result, EXECUTED
+
+    def share(self, key):
+        """
+        只复用、不执行：key 正在执行时等待并共享其结果，新鲜期内有结果时直接返回
+        :return: (结果, 状态)，状态为 JOINED / FRESH；没有可复用的结果时返回 None
+        """
+        with self._lock:
+            completed = self._completed.get(key)
+            if completed is not None and time.monotonic() - completed[0] < self.fresh_for:
+                return completed[1], FRESH
+            future = self._in_flight.get(key)
+        if future is None:
+            return None
+        try:
+            return future.result(), JOINED
+        except Exception:
+            # 共享的任务失败时由调用方自己执行
+            return None
+
+    def forget(self, key):
+        """丢弃 key 对应的已完成结果，下次调用会重新执行"""
+        with self._lock:
+            self._completed.pop(key, None)
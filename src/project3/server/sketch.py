@@ -0,0 +1,103 @@
+# server/sketch.py
+import json
+import math
+
+
+class QuantileSketch:
+    """
+    可合并的分位数草图（对数分桶，思路同 DDSketch）：
+    每个正数落入 ceil(log_gamma(v)) 号桶，分位数估计的相对误差不超过 relative_accuracy。
+    两个草图按桶相加即可合并，因此可以随每批新数据增量更新。
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index):
+        # 桶的代表值，使相对误差在桶两端对称
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value):
+        if value is None:
+            return
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, cnt in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + cnt
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def histogram(self, bins=10):
+        """把草图中的桶重新划分为 bins 个等宽区间，返回 (边界, 计数)"""
+        if self.count == 0:
+            return [], []
+        low, high = self.min, self.max
+        if high == low:
+            return [low, high], [self.count]
+        width = (high - low) / bins
+        counts = [0] * bins
+        counts[0] += self.zero_count
+        for index, cnt in self.bins.items():
+            value = min(max(self._value(index), low), high)
+            position = min(int((value - low) / width), bins - 1)
+            counts[position] += cnt
+        edges = [low + i * width for i in range(bins + 1)]
+        return edges, counts
+
+    def to_json(self):
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "bins": {str(k): v for k, v in self.bins.items()},
+            "zero": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        if not text:
+            return cls()
+        data = json.loads(text)
+        sketch = cls(data.get("a", 0.01))
+        sketch.bins = {int(k): v for k, v in data["bins"].items()}
+        sketch.zero_count = data["zero"]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        return sketch
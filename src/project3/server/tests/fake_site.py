@@ -0,0 +1,78 @@
+# tests/fake_site.py
+"""
+本地模拟的二手房列表站点，页面结构与爬虫解析的 fang.com 列表页一致，
+用于压测和测试时代替真实站点，避免对外部网站发起请求
+"""
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+ROOM_TYPES = ["1室1厅", "2室1厅", "2室2厅", "3室1厅", "3室2厅", "4室2厅"]
+FLOORS = ["低层（共6层）", "中层（共18层）", "高层（共33层）", "中层（共11层）"]
+ORIENTATIONS = ["南向", "南北向", "东向", "西向", "北向"]
+DISTRICTS = ["朝阳", "海淀", "丰台", "东城", "西城", "通州"]
+
+
+def make_listing(city, index, seed=0):
+    """生成第 index 条模拟房源，相同参数总是生成相同的数据"""
+    rng = random.Random(f"{city}-{index}-{seed}")
+    area = rng.randint(35, 180)
+    unit_price = rng.randint(15000, 90000)
+    district = rng.choice(DISTRICTS)
+    return {
+        'room_type': rng.choice(ROOM_TYPES),
+        'area': f"{area}㎡",
+        'floor': rng.choice(FLOORS),
+        'orientation': rng.choice(ORIENTATIONS),
+        'build_year': f"{rng.randint(1985, 2022)}年建",
+        'owner_name': "模拟经纪人",
+        'address': f"模拟小区{city}{index}{district}-商圈{index % 20}",
+        'district': district,
+        'description': "满五年 近地铁",
+        'price': f"{area * unit_price // 10000}万{unit_price}元/㎡"
+    }
+
+
+def render_page(city, page, per_page=30, seed=0):
+    items = []
+    for i in range((page - 1) * per_page, page * per_page):
+        house = make_listing(city, i, seed)
+        address_name, _, rest = house['address'].partition(house['district'])
+        tel = "|".join([house['room_type'], house['area'], house['floor'], house['orientation'],
+                        house['build_year'], house['owner_name']])
+        items.append(
+            f'<dl><dd><p class="tel_shop">{tel}</p>'
+            f'<p class="add_shop"><a>{address_name}</a><span>{house["district"]}{rest}</span></p>'
+            f'<p class="clearfix label">{house["description"]}</p></dd>'
+            f'<dd class="price_right">{house["price"]}</dd></dl>'
+        )
+    return f'<html><body><div class="shop_list shop_list_4">{"".join(items)}</div></body></html>'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        city = parsed.path.strip('/') or 'bj'
+        page = int(parse_qs(parsed.query).get('page', ['1'])[0])
+        body = render_page(city, page, self.server.per_page, self.server.seed).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_site(host='127.0.0.1', port=0, per_page=30, seed=0):
+    """
+    在后台线程中启动模拟站点
+    :return: (server, 地址模板)，地址模板可直接作为 SCRAPER_BASE_URL
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.per_page = per_page
+    server.seed = seed
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/{{city}}/"
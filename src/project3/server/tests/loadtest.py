@@ -0,0 +1,267 @@
+# tests/loadtest.py
+"""
+服务器压测工具：
+1. 在临时目录中创建并填充指定规模的 SQLite 数据库；
+2. 启动本地模拟站点代替 fang.com，供 /api/scrape 爬取；
+3. 以进程内线程或子进程方式启动服务器；
+4. 多个虚拟用户并发请求 /api/houses、/api/statistics、/api/scrape，
+   统计每个接口的吞吐量和 p50/p95/p99 延迟；
+5. 可保存为基线，或与已保存的基线比较以发现性能退化。
+
+示例：
+    python loadtest.py --rows 100000 --users 16 --duration 30 --save-baseline baseline.json
+    python loadtest.py --rows 100000 --users 16 --duration 30 --baseline baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, TESTS_DIR)
+
+from fake_site import make_listing, start_fake_site
+
+CITIES = ['bj', 'sh', 'hf', 'sy']
+DEFAULT_MIX = "houses=5,statistics=5,scrape=1"
+
+
+def percentile(sorted_values, q):
+    """最近秩法计算分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def configure_environment(db_path, site_url):
+    """服务器读取的环境变量，必须在导入服务器模块之前设置"""
+    os.environ['HOUSES_DB_URL'] = f"sqlite:///{db_path}"
+    os.environ['SCRAPER_BASE_URL'] = site_url
+    os.environ['SCRAPE_DELAY'] = '0,0'
+
+
+def seed_database(rows):
+    """批量写入模拟房源并回填聚合表，不经过逐条去重以加快准备速度"""
+    from datetime import datetime, timedelta
+    from database import Session, House, bump_data_version
+    from aggregates import rebuild_aggregates
+
+    session = Session()
+    try:
+        now = datetime.now()
+        batch = []
+        for i in range(rows):
+            city = CITIES[i % len(CITIES)]
+            house = make_listing(city, i, seed=1)
+            house['city'] = city
+            house['created_at'] = now - timedelta(days=i % 28)
+            batch.append(house)
+            if len(batch) >= 10000:
+                session.bulk_insert_mappings(House, batch)
+                batch = []
+        if batch:
+            session.bulk_insert_mappings(House, batch)
+        rebuild_aggregates(session)
+        bump_data_version(session)
+        session.commit()
+    finally:
+        session.close()
+
+
+def serve(port):
+    """在当前进程中以多线程 WSGI 服务器运行应用（阻塞）"""
+    from werkzeug.serving import make_server
+    from app import app
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def start_server(mode, port):
+    if mode == 'inprocess':
+        threading.Thread(target=serve, args=(port,), daemon=True).start()
+        return None
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port)],
+                            env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/metrics", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("服务器启动超时")
+
+
+def make_requests(base_url, scrape_pages):
+    """各接口的请求方式"""
+    return {
+        'houses': lambda session: session.get(f"{base_url}/api/houses", timeout=120),
+        'statistics': lambda session: session.get(f"{base_url}/api/statistics", timeout=60),
+        'scrape': lambda session: session.post(f"{base_url}/api/scrape", timeout=300, json={
+            "city_code": random.choice(CITIES), "pages": scrape_pages}),
+    }
+
+
+def run_load(base_url, users, duration, mix, scrape_pages=1):
+    """
+    启动 users 个虚拟用户，在 duration 秒内按权重随机请求各接口
+    :return: {接口: {"latencies": [...], "errors": n}}，以及实际耗时
+    """
+    calls = make_requests(base_url, scrape_pages)
+    names = [name for name in mix if name in calls]
+    weights = [mix[name] for name in names]
+    results = {name: {"latencies": [], "errors": 0} for name in names}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def virtual_user(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = calls[name](session).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                results[name]["latencies"].append(elapsed)
+                if not ok:
+                    results[name]["errors"] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    report = {}
+    for name, result in results.items():
+        latencies = sorted(result["latencies"])
+        report[name] = {
+            "requests": len(latencies),
+            "errors": result["errors"],
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        }
+    return report
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """返回相对基线退化的描述列表：p95 变慢或吞吐量下降超过 tolerance 比例即视为退化"""
+    regressions = []
+    for name, current in report.items():
+        base = baseline.get(name)
+        if not base or not current["requests"]:
+            continue
+        if base.get("p95_ms") and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > 基线 {base['p95_ms']}ms")
+        if base.get("throughput_rps") and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: 吞吐量 {current['throughput_rps']}/s < 基线 {base['throughput_rps']}/s")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: 错误数 {current['errors']} > 基线 {base.get('errors', 0)}")
+    return regressions
+
+
+def print_report(report):
+    print(f"{'接口':<12}{'请求数':>8}{'错误':>6}{'吞吐量/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, row in report.items():
+        print(f"{name:<12}{row['requests']:>8}{row['errors']:>6}{row['throughput_rps']:>10}"
+              f"{str(row['p50_ms']):>10}{str(row['p95_ms']):>10}{str(row['p99_ms']):>10}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run(rows=1000, users=8, duration=10, mode='subprocess', mix=DEFAULT_MIX, scrape_pages=1, workdir=None):
+    """准备数据库和模拟站点，启动服务器并执行压测，返回报告"""
+    workdir = workdir or tempfile.mkdtemp(prefix='loadtest_')
+    site, site_url = start_fake_site()
+    configure_environment(os.path.join(workdir, 'houses.db'), site_url)
+    seed_database(rows)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = start_server(mode, port)
+    try:
+        wait_until_ready(base_url)
+        results, elapsed = run_load(base_url, users, duration, parse_mix(mix), scrape_pages)
+        return summarize(results, elapsed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        site.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="二手房数据服务器压测")
+    parser.add_argument('--rows', type=int, default=1000, help="预先写入数据库的房源数")
+    parser.add_argument('--users', type=int, default=8, help="并发虚拟用户数")
+    parser.add_argument('--duration', type=float, default=10, help="压测时长（秒）")
+    parser.add_argument('--mode', choices=['inprocess', 'subprocess'], default='subprocess',
+                        help="服务器运行方式")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="各接口的请求权重")
+    parser.add_argument('--scrape-pages', type=int, default=1, help="每次 /api/scrape 爬取的页数")
+    parser.add_argument('--baseline', help="与该基线文件比较，出现退化时返回非零退出码")
+    parser.add_argument('--save-baseline', help="把本次结果保存为基线文件")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的退化比例")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    report = run(args.rows, args.users, args.duration, args.mode, args.mix, args.scrape_pages)
+    print_report(report)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("发现性能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("未发现性能退化。")
+
+
+if __name__ == '__main__':
+    main()
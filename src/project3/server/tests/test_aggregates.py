@@ -0,0 +1,87 @@
+# tests/test_aggregates.py
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+from app import app
+from aggregates import price_distribution, counts_by, rebuild_aggregates
+from database import Session
+from scraper import WebScraper_HouseData
+from sketch import QuantileSketch
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_quantiles_within_relative_accuracy(self):
+        values = [random.uniform(50, 2000) for _ in range(5000)]
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0.1, 0.5, 0.9):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q), exact, delta=exact * 0.02)
+
+    def test_merge_equals_single_sketch(self):
+        left, right, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in range(1, 1001):
+            (left if value % 2 else right).add(value)
+            whole.add(value)
+        merged = QuantileSketch.from_json(left.to_json()).merge(right)
+        self.assertEqual(merged.bins, whole.bins)
+        self.assertEqual(merged.quantile(0.5), whole.quantile(0.5))
+
+
+class TestAggregates(unittest.TestCase):
+    CITY = 'agg'
+
+    @classmethod
+    def setUpClass(cls):
+        scraper = WebScraper_HouseData(base_url="http://example.invalid/", pages=1)
+        houses = [{
+            'room_type': '2室1厅', 'area': '80㎡', 'floor': '低层（共6层）',
+            'orientation': '南向' if i % 2 else '南北向', 'build_year': f"{1990 + i}年建",
+            'owner_name': '张三', 'address': f'聚合测试小区{i}', 'district': '朝阳' if i < 6 else '海淀',
+            'description': '满五年', 'price': f"{100 * (i + 1)}万{10000 * (i + 1)}元/㎡"
+        } for i in range(10)]
+        scraper.save_to_db(houses[:4], cls.CITY)
+        scraper.save_to_db(houses[4:], cls.CITY)
+
+    def test_incremental_matches_rebuild(self):
+        session = Session()
+        try:
+            incremental = price_distribution(session, 'district', self.CITY)
+            rebuild_aggregates(session)
+            self.assertEqual(price_distribution(session, 'district', self.CITY), incremental)
+            session.rollback()
+        finally:
+            session.close()
+        self.assertEqual(incremental['朝阳']['count'], 6)
+        self.assertEqual(incremental['海淀']['price']['mean'], 850.0)
+
+    def test_counts(self):
+        session = Session()
+        try:
+            self.assertEqual(counts_by(session, 'decade', self.CITY), {'1990s': 10})
+            self.assertEqual(counts_by(session, 'orientation', self.CITY), {'南北向': 5, '南向': 5})
+        finally:
+            session.close()
+
+    def test_endpoints(self):
+        client = app.test_client()
+        prices = client.get(f'/api/statistics/prices?group=city&city={self.CITY}&bins=5').json
+        self.assertEqual(prices[self.CITY]['count'], 10)
+        self.assertEqual(sum(prices[self.CITY]['price']['histogram']['counts']), 10)
+        merged = client.get(f'/api/statistics/prices?group=all&city={self.CITY}&bins=5').json
+        self.assertEqual(merged['all'], prices[self.CITY])
+        weekly = client.get(f'/api/statistics/weekly?city={self.CITY}').json
+        self.assertEqual(sum(week['count'] for week in weekly), 10)
+        self.assertEqual(client.get('/api/statistics/counts?group=bogus').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# tests/test_events.py
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+from events import EventBroker, broker
+from scraper import WebScraper_HouseData
+
+PAGE_HTML = """
+<html><body>
+<p class="tel_shop">3室2厅|91㎡|中层（共18层）|南向|2010年建|郭星</p>
+<p class="add_shop">测试小区{page}朝阳-青年路</p>
+<p class="clearfix label">满五年</p>
+<dd class="price_right">360万53412元/㎡</dd>
+</body></html>
+"""
+
+
+class TestEventBroker(unittest.TestCase):
+    def test_publish_reaches_subscriber(self):
+        events = EventBroker(heartbeat=0.1)
+        stream = events.stream()
+        self.assertEqual(next(stream), ": connected\n\n")
+        events.publish('listings', {"page": 1})
+        message = next(stream)
+        self.assertTrue(message.startswith("event: listings\n"))
+        self.assertIn('"page": 1', message)
+        stream.close()
+        self.assertEqual(len(events._subscribers), 0)
+
+    @unittest.skipUnless(hasattr(__import__('socket'), 'AF_UNIX'), "需要 Unix 套接字")
+    def test_relay_reaches_subscriber_in_other_process(self):
+        relay_dir = tempfile.mkdtemp()
+        events = EventBroker(heartbeat=0.1)
+        events.enable_relay(relay_dir)
+        try:
+            stream = events.stream()
+            next(stream)
+            server_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            subprocess.run([sys.executable, '-c',
+                            "from events import EventBroker; b = EventBroker(); "
+                            f"b.enable_relay({relay_dir!r}); b.publish('listings', {{'page': 7}}); b.disable_relay()"],
+                           cwd=server_dir, check=True, timeout=30)
+            # 跳过等待期间的保活注释
+            message = next(m for m, _ in zip(stream, range(100)) if not m.startswith(":"))
+            self.assertTrue(message.startswith("event: listings\n"))
+            self.assertIn('"page": 7', message)
+            stream.close()
+        finally:
+            events.disable_relay()
+        self.assertEqual(os.listdir(relay_dir), [])
+
+    def test_slow_subscriber_is_dropped(self):
+        events = EventBroker(max_queue_size=1)
+        subscriber = events.subscribe()
+        events.publish('listings', {})
+        events.publish('listings', {})
+        self.assertTrue(subscriber.dropped)
+        self.assertEqual(len(events._subscribers), 0)
+
+
+class TestScrapeAndSave(unittest.TestCase):
+    def test_each_page_is_published_after_save(self):
+        scraper = WebScraper_HouseData(base_url="http://example.invalid/", pages=2)
+        pages = iter([PAGE_HTML.format(page=1), PAGE_HTML.format(page=2)])
+        subscriber = broker.subscribe()
+        try:
+            with mock.patch.object(scraper, 'get_html', side_effect=lambda url: next(pages)), \
+                    mock.patch('scraper.time.sleep'):
+                data, saved_count = scraper.scrape_and_save(city_code='bj')
+            messages = []
+            while not subscriber.queue.empty():
+                messages.append(subscriber.queue.get_nowait())
+        finally:
+            broker.unsubscribe(subscriber)
+        self.assertEqual(len(data), 2)
+        self.assertEqual(saved_count, 2)
+        listings = [m for m in messages if m.startswith("event: listings")]
+        self.assertEqual(len(listings), 2)
+        self.assertIn('"saved": 2', listings[-1])
+        self.assertTrue(messages[-1].startswith("event: finished"))
+
+    def test_incremental_stops_at_first_page_without_new_listings(self):
+        scraper = WebScraper_HouseData(base_url="http://example.invalid/", pages=5)
+        pages = iter([PAGE_HTML.format(page='增量1'), PAGE_HTML.format(page='增量1'),
+                      PAGE_HTML.format(page='增量3')])
+        with mock.patch.object(scraper, 'get_html', side_effect=lambda url: next(pages)) as get_html, \
+                mock.patch('scraper.time.sleep'):
+            data, saved_count = scraper.scrape_and_save(city_code='bj', incremental=True)
+        self.assertEqual(get_html.call_count, 2)
+        self.assertEqual(len(data), 2)
+        self.assertEqual(saved_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# tests/test_loadtest.py
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+import loadtest
+from fake_site import render_page, make_listing
+
+
+class TestLoadTestHarness(unittest.TestCase):
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 95), 95)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([7], 99), 7)
+        self.assertIsNone(loadtest.percentile([], 50))
+
+    def test_compare_with_baseline(self):
+        baseline = {"houses": {"requests": 100, "errors": 0, "throughput_rps": 50, "p95_ms": 100}}
+        ok = {"houses": {"requests": 100, "errors": 0, "throughput_rps": 48, "p95_ms": 110}}
+        slow = {"houses": {"requests": 100, "errors": 0, "throughput_rps": 30, "p95_ms": 200}}
+        self.assertEqual(loadtest.compare_with_baseline(ok, baseline, 0.2), [])
+        self.assertEqual(len(loadtest.compare_with_baseline(slow, baseline, 0.2)), 2)
+
+    def test_fake_site_matches_scraper(self):
+        from scraper import WebScraper_HouseData
+        scraper = WebScraper_HouseData(base_url="http://example.invalid/", pages=1)
+        parsed = scraper.parse_html(render_page('bj', 2, per_page=10))
+        self.assertEqual(len(parsed), 10)
+        self.assertEqual(parsed[0], make_listing('bj', 10))
+
+    def test_smoke_run(self):
+        # 在独立进程中运行，避免压测设置的环境变量影响当前进程中的其他测试
+        output = os.path.join(tempfile.mkdtemp(), 'report.json')
+        subprocess.run([sys.executable, loadtest.__file__, '--rows', '200', '--users', '2',
+                        '--duration', '1', '--save-baseline', output],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=120)
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(set(report), {"houses", "statistics", "scrape"})
+        self.assertGreater(sum(row["requests"] for row in report.values()), 0)
+        self.assertEqual(sum(row["errors"] for row in report.values()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
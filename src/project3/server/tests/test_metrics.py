@@ -0,0 +1,44 @@
+# tests/test_metrics.py
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+from app import app
+from metrics import Histogram, Counter
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, route="/x")
+        lines = histogram.render()
+        self.assertIn('demo_seconds_bucket{route="/x",le="0.1"} 1', lines)
+        self.assertIn('demo_seconds_bucket{route="/x",le="1.0"} 3', lines)
+        self.assertIn('demo_seconds_bucket{route="/x",le="+Inf"} 4', lines)
+        self.assertIn('demo_seconds_count{route="/x"} 4', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("demo_total", "Demo.", ("city",))
+        counter.inc(city='a"b')
+        self.assertIn('demo_total{city="a\\"b"} 1', counter.render())
+
+    def test_metrics_endpoint(self):
+        client = app.test_client()
+        client.get('/api/statistics')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{method="GET",route="/api/statistics",status="200"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/api/statistics",le="+Inf"}', body)
+        self.assertIn('db_query_duration_seconds_count{statement="SELECT"}', body)
+        self.assertIn('http_requests_in_flight 1', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
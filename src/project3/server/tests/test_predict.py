@@ -0,0 +1,189 @@
+# tests/test_predict.py
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+import joblib
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+import predictor
+from app import app
+from predictor import ModelCache, MicroBatcher, ModelNotFound, parse_listing
+
+# 加载 project4 训练的模型时服务器需要配置的源码目录
+PROJECT4_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            os.pardir, os.pardir, os.pardir, 'project4'))
+LISTING = {"room_type": "3室2厅", "orientation": "南向", "floor": "中层（共18层）",
+           "area": "91㎡", "build_year": "2010年建"}
+
+
+def train_pipeline(slope):
+    """与 project4 训练的管道结构相同：价格 = slope * 面积"""
+    df = pd.DataFrame({
+        'room_type': ['2室1厅', '3室2厅'] * 10,
+        'orientation': ['南向', '北向'] * 10,
+        'floor': ['低层（共6层）', '中层（共18层）'] * 10,
+        'area': [float(50 + i * 5) for i in range(20)],
+        'build_year': [2000 + i % 5 for i in range(20)],
+    })
+    pipeline = Pipeline([
+        ('preprocessor', ColumnTransformer([
+            ('num', StandardScaler(), ['area', 'build_year']),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), ['room_type', 'orientation', 'floor'])])),
+        ('model', LinearRegression())])
+    return pipeline.fit(df, df['area'] * slope)
+
+
+class TestParseListing(unittest.TestCase):
+    def test_accepts_scraped_text_and_numbers(self):
+        self.assertEqual(parse_listing(LISTING), ("3室2厅", "南向", "中层（共18层）", 91.0, 2010))
+        self.assertEqual(parse_listing(dict(LISTING, area=91.5, build_year=2010))[3:], (91.5, 2010))
+
+    def test_rejects_missing_fields(self):
+        with self.assertRaises(ValueError):
+            parse_listing({"room_type": "3室2厅"})
+
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        self.models_dir = tempfile.mkdtemp()
+        self.cache = ModelCache(self.models_dir, max_models=2)
+
+    def dump(self, city, slope):
+        path = os.path.join(self.models_dir, f"{city}_pipeline.joblib")
+        joblib.dump(train_pipeline(slope), path)
+        return path
+
+    def test_reloads_when_file_changes(self):
+        path = self.dump('bj', 1)
+        first = self.cache.get('bj')
+        self.assertIs(self.cache.get('bj'), first)
+        self.dump('bj', 2)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertIsNot(self.cache.get('bj'), first)
+
+    def test_loads_project4_feature_pipeline(self):
+        # 配置 PROJECT4_DIR 后其中的预处理器可以导入和反序列化
+        with mock.patch.object(sys, 'path', sys.path + [PROJECT4_DIR]):
+            from DataPreprocessor import DataPreprocessor
+        df = pd.DataFrame({
+            'room_type': ['2室1厅', '3室2厅'] * 10,
+            'orientation': ['南向', '南北向'] * 10,
+            'floor': ['低层（共6层）', '中层（共18层）'] * 10,
+            'area': [float(50 + i * 5) for i in range(20)],
+            'build_year': [2000 + i % 5 for i in range(20)],
+        })
+        pipeline = Pipeline([('preprocessor', DataPreprocessor().preprocessor), ('model', LinearRegression())])
+        joblib.dump(pipeline.fit(df, df['area'] * 2), os.path.join(self.models_dir, "bj_pipeline.joblib"))
+        rows = [parse_listing(LISTING)]
+        self.assertAlmostEqual(predictor.predict_rows(self.cache, 'bj', rows)[0], 182.0, places=3)
+
+    def test_missing_project4_module_names_the_setting(self):
+        self.dump('bj', 1)
+        error = ModuleNotFoundError("No module named 'FeatureExtractor'", name='FeatureExtractor')
+        with mock.patch('predictor.joblib.load', side_effect=error):
+            with self.assertRaisesRegex(RuntimeError, 'FeatureExtractor.*PROJECT4_DIR'):
+                self.cache.get('bj')
+
+    def test_least_recently_used_is_evicted(self):
+        for city in ('bj', 'sh', 'hf'):
+            self.dump(city, 1)
+        self.cache.get('bj')
+        self.cache.get('sh')
+        self.cache.get('bj')
+        self.cache.get('hf')
+        self.assertEqual(list(self.cache._models), ['bj', 'hf'])
+
+    def test_missing_model(self):
+        with self.assertRaises(ModelNotFound):
+            self.cache.get('zz')
+        with self.assertRaises(ModelNotFound):
+            self.cache.get('../bj')
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_concurrent_requests_share_predict_calls(self):
+        models_dir = tempfile.mkdtemp()
+        joblib.dump(train_pipeline(2), os.path.join(models_dir, "bj_pipeline.joblib"))
+        cache = ModelCache(models_dir)
+        pipeline = cache.get('bj')
+        calls = []
+        original = pipeline.predict
+
+        def slow_predict(frame):
+            calls.append(len(frame))
+            time.sleep(0.01)
+            return original(frame)
+
+        pipeline.predict = slow_predict
+        batcher = MicroBatcher(cache)
+        results = {}
+
+        def request(area):
+            results[area] = batcher.predict('bj', parse_listing(dict(LISTING, area=area)))
+
+        threads = [threading.Thread(target=request, args=(area,)) for area in range(50, 100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 50)
+        self.assertAlmostEqual(results[91], 182, places=3)
+        self.assertEqual(sum(calls), 50)
+        self.assertLess(len(calls), 50)
+
+        # 相同房源再次预测直接返回记住的结果
+        self.assertAlmostEqual(batcher.predict('bj', parse_listing(LISTING)), 182, places=3)
+        self.assertEqual(sum(calls), 50)
+
+
+class TestPredictEndpoint(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.models_dir = tempfile.mkdtemp()
+        joblib.dump(train_pipeline(2), os.path.join(cls.models_dir, "bj_pipeline.joblib"))
+        cls.original_dir = predictor.model_cache.models_dir
+        predictor.model_cache.models_dir = cls.models_dir
+        predictor.model_cache.clear()
+        cls.client = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        predictor.model_cache.models_dir = cls.original_dir
+        predictor.model_cache.clear()
+
+    def test_single_listing(self):
+        response = self.client.post('/api/predict', json={"city": "bj", "listing": LISTING})
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.get_json()["price"], 182, places=3)
+
+    def test_batch(self):
+        listings = [dict(LISTING, area=area) for area in (50, 100)]
+        response = self.client.post('/api/predict', json={"city": "bj", "listings": listings})
+        self.assertEqual(response.status_code, 200)
+        prices = response.get_json()["prices"]
+        self.assertAlmostEqual(prices[0], 100, places=3)
+        self.assertAlmostEqual(prices[1], 200, places=3)
+
+    def test_errors(self):
+        self.assertEqual(self.client.post('/api/predict', json={"city": "zz", "listing": LISTING}).status_code, 404)
+        self.assertEqual(self.client.post('/api/predict', json={"city": "bj", "listing": {}}).status_code, 400)
+        response = self.client.post('/api/predict', json={"city": "bj", "listings": [LISTING, {}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("listings[1]", response.get_json()["message"])
+
+
+if __name__ == '__main__':
+    unittest.main()
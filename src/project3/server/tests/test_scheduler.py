@@ -0,0 +1,120 @@
+# tests/test_scheduler.py
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+import scheduler
+import scraper
+from metrics import registry
+
+
+class TestCreateScheduler(unittest.TestCase):
+    def test_one_job_per_city_staggered_across_interval(self):
+        sched = scheduler.create_scheduler(cities=['bj', 'sh', 'hf', 'sy'], interval_days=7, jitter=0)
+        jobs = {job.id: job for job in sched.get_jobs()}
+        self.assertEqual(set(jobs), {'scrape_bj', 'scrape_sh', 'scrape_hf', 'scrape_sy'})
+
+        now = datetime.now().astimezone()
+        fire_times = sorted(job.trigger.get_next_fire_time(None, now) for job in jobs.values())
+        gaps = [b - a for a, b in zip(fire_times, fire_times[1:])]
+        for gap in gaps:
+            self.assertAlmostEqual(gap.total_seconds(), timedelta(days=7 / 4).total_seconds(), delta=1)
+
+    def test_jobs_do_not_overlap(self):
+        sched = scheduler.create_scheduler(cities=['bj'])
+        self.assertEqual(sched._job_defaults['max_instances'], 1)
+        self.assertTrue(sched._job_defaults['coalesce'])
+
+
+class TestScheduledScrape(unittest.TestCase):
+    def test_records_counts_and_uses_incremental_crawl(self):
+        with mock.patch('scheduler.crawl_city', return_value=([{}] * 30, 12, 'executed')) as crawl:
+            scheduler.scheduled_scrape('zz', pages=3)
+        crawl.assert_called_once_with('zz', pages=3, incremental=scheduler.SCRAPE_INCREMENTAL)
+        output = registry.render()
+        self.assertIn('scheduler_job_records_total{job="scrape_zz",kind="scraped"} 30', output)
+        self.assertIn('scheduler_job_records_total{job="scrape_zz",kind="saved"} 12', output)
+        self.assertIn('scheduler_job_duration_seconds_count{job="scrape_zz"} 1', output)
+
+
+@unittest.skipIf(scheduler.fcntl is None, "文件锁需要 fcntl")
+class TestLeaderElection(unittest.TestCase):
+    def setUp(self):
+        self.lock_path = os.path.join(tempfile.mkdtemp(), 'scheduler.lock')
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_only_lock_holder_starts_and_waiter_takes_over(self):
+        with mock.patch.object(scheduler.scheduler, 'start') as start:
+            # 两个竞争者分别打开锁文件，与两个工作进程相同，flock 只允许一个持有
+            scheduler.start_as_leader(self.lock_path)
+            scheduler.start_as_leader(self.lock_path)
+            self.assertTrue(self.wait_for(lambda: start.call_count == 1))
+            time.sleep(0.1)
+            self.assertEqual(start.call_count, 1)
+            with open(self.lock_path) as f:
+                self.assertEqual(f.read(), str(os.getpid()))
+
+            # 持锁者退出（关闭锁文件）后，等待中的竞争者接替
+            scheduler.stop_scheduler()
+            self.assertTrue(self.wait_for(lambda: start.call_count == 2))
+            scheduler.stop_scheduler()
+
+
+class TestSharedCrawl(unittest.TestCase):
+    def crawl_concurrently(self, first_incremental, second_incremental):
+        """先开始一次爬取，在其结束前开始第二次，返回 scrape_and_save 收到的 incremental 参数和两次的结果"""
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def scrape_and_save(city_code=None, incremental=False):
+            calls.append(incremental)
+            started.set()
+            release.wait(5)
+            return [{}] * 3, 2
+
+        results = []
+        scraper.crawl_flight._completed.clear()
+        with mock.patch.object(scraper.WebScraper_HouseData, 'scrape_and_save', side_effect=scrape_and_save):
+            first = threading.Thread(target=lambda: results.append(
+                scraper.crawl_city('yy', pages=4, incremental=first_incremental)))
+            first.start()
+            started.wait(5)
+            second = threading.Thread(target=lambda: results.append(
+                scraper.crawl_city('yy', pages=4, incremental=second_incremental)))
+            second.start()
+            time.sleep(0.05)
+            release.set()
+            first.join(5)
+            second.join(5)
+        scraper.crawl_flight._completed.clear()
+        return calls, results
+
+    def test_scheduled_crawl_reuses_user_full_crawl(self):
+        calls, results = self.crawl_concurrently(False, True)
+        self.assertEqual(calls, [False])
+        self.assertEqual(sorted(status for _, _, status in results), ['executed', 'joined'])
+        self.assertTrue(all(saved_count == 2 for _, saved_count, _ in results))
+
+    def test_user_full_crawl_does_not_reuse_incremental_crawl(self):
+        # 增量爬取可能只爬了一页，完整的爬取请求要自己执行
+        calls, results = self.crawl_concurrently(True, False)
+        self.assertEqual(sorted(calls), [False, True])
+        self.assertEqual([status for _, _, status in results], ['executed', 'executed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
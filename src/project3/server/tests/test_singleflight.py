@@ -0,0 +1,89 @@
+# tests/test_singleflight.py
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight, EXECUTED, JOINED, FRESH
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def crawl():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return ["house"]
+
+        results = []
+        owner = threading.Thread(target=lambda: results.append(flight.do(('bj', 1, 5), crawl)))
+        owner.start()
+        started.wait(5)
+        joiners = [threading.Thread(target=lambda: results.append(flight.do(('bj', 1, 5), crawl)))
+                   for _ in range(4)]
+        for thread in joiners:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [owner] + joiners:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(status for _, status in results), [EXECUTED] + [JOINED] * 4)
+        self.assertTrue(all(result == ["house"] for result, _ in results))
+
+    def test_fresh_window_reuses_result(self):
+        flight = SingleFlight(fresh_for=0.2)
+        self.assertEqual(flight.do('sh', lambda: 1), (1, EXECUTED))
+        self.assertEqual(flight.do('sh', lambda: 2), (1, FRESH))
+        self.assertEqual(flight.do('hf', lambda: 3), (3, EXECUTED))
+        time.sleep(0.25)
+        self.assertEqual(flight.do('sh', lambda: 4), (4, EXECUTED))
+
+    def test_errors_are_shared_but_not_cached(self):
+        flight = SingleFlight(fresh_for=60)
+
+        def fail():
+            raise RuntimeError("network down")
+
+        with self.assertRaises(RuntimeError):
+            flight.do('bj', fail)
+        self.assertEqual(flight.do('bj', lambda: 'ok'), ('ok', EXECUTED))
+
+
+class TestShare(unittest.TestCase):
+    def test_share_never_executes(self):
+        flight = SingleFlight(fresh_for=60)
+        self.assertIsNone(flight.share('bj'))
+        flight.do('bj', lambda: 1)
+        self.assertEqual(flight.share('bj'), (1, FRESH))
+        flight.forget('bj')
+        self.assertIsNone(flight.share('bj'))
+
+    def test_share_waits_for_running_call(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def crawl():
+            started.set()
+            release.wait(5)
+            return 2
+
+        owner = threading.Thread(target=flight.do, args=('bj', crawl))
+        owner.start()
+        started.wait(5)
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(flight.share('bj'), (2, JOINED))
+        owner.join(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
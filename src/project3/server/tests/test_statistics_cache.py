@@ -0,0 +1,53 @@
+# tests/test_statistics_cache.py
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+from app import app
+from database import get_data_version
+from scraper import WebScraper_HouseData
+
+
+def make_house(address, price="300万30000元/㎡"):
+    return {
+        'room_type': '2室1厅', 'area': '80㎡', 'floor': '低层（共6层）', 'orientation': '南向',
+        'build_year': '2000年建', 'owner_name': '张三', 'address': address,
+        'description': '满五年', 'price': price
+    }
+
+
+class TestStatisticsCache(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.scraper = WebScraper_HouseData(base_url="http://example.invalid/", pages=1)
+
+    def test_etag_and_not_modified(self):
+        first = self.client.get('/api/statistics')
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        second = self.client.get('/api/statistics', headers={'If-None-Match': etag})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.headers['ETag'], etag)
+
+    def test_write_invalidates_cache(self):
+        before = self.client.get('/api/statistics')
+        version = get_data_version()
+        self.scraper.save_to_db([make_house('缓存测试小区A')])
+        self.assertEqual(get_data_version(), version + 1)
+        after = self.client.get('/api/statistics', headers={'If-None-Match': before.headers['ETag']})
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json['total'], before.json['total'] + 1)
+
+    def test_duplicate_save_keeps_version(self):
+        self.scraper.save_to_db([make_house('缓存测试小区B')])
+        version = get_data_version()
+        self.scraper.save_to_db([make_house('缓存测试小区B')])
+        self.assertEqual(get_data_version(), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
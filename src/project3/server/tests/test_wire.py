@@ -0,0 +1,109 @@
+# tests/test_wire.py
+import gzip
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+import wire
+from app import app, HOUSE_FIELDS
+from scraper import WebScraper_HouseData
+
+
+class TestWireFormats(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        scraper = WebScraper_HouseData(base_url="http://example.invalid/", pages=1)
+        scraper.save_to_db([{
+            'room_type': '3室2厅', 'area': '91㎡', 'floor': '中层（共18层）', 'orientation': '南向',
+            'build_year': '2010年建', 'owner_name': '郭星', 'address': f'格式测试小区{i}',
+            'description': '满五年', 'price': '360万53412元/㎡'
+        } for i in range(50)], 'wire')
+        cls.client = app.test_client()
+
+    def test_default_is_row_json(self):
+        response = self.client.get('/api/houses')
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertIsInstance(response.json, list)
+        self.assertEqual(set(response.json[0]), set(HOUSE_FIELDS))
+
+    def test_columns_json_with_gzip(self):
+        response = self.client.get('/api/houses', headers={
+            'Accept': wire.FORMATS['columns'], 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept', response.headers['Vary'])
+        payload = json.loads(gzip.decompress(response.data))
+        self.assertEqual(payload['fields'], HOUSE_FIELDS)
+        rows = self.client.get('/api/houses').json
+        self.assertEqual(payload['columns']['address'], [row['address'] for row in rows])
+
+    @unittest.skipIf(wire.msgpack is None, "msgpack 未安装")
+    def test_msgpack(self):
+        response = self.client.get('/api/houses', headers={'Accept': wire.FORMATS['msgpack']})
+        self.assertEqual(response.mimetype, 'application/msgpack')
+        payload = wire.msgpack.unpackb(response.data, raw=False)
+        self.assertEqual(len(payload['columns']['price']), len(self.client.get('/api/houses').json))
+
+    @unittest.skipIf(wire.pa is None, "pyarrow 未安装")
+    def test_arrow(self):
+        response = self.client.get('/api/houses', headers={'Accept': wire.FORMATS['arrow']})
+        table = wire.pa.ipc.open_stream(response.data).read_all()
+        self.assertEqual(table.column_names, HOUSE_FIELDS)
+
+    def test_unknown_accept_falls_back_to_json(self):
+        response = self.client.get('/api/houses', headers={'Accept': 'text/csv'})
+        self.assertEqual(response.mimetype, 'application/json')
+
+
+class TestIncrementalSync(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def save(self, prefix, count):
+        WebScraper_HouseData(base_url="http://example.invalid/", pages=1).save_to_db([{
+            'room_type': '2室1厅', 'area': '60㎡', 'floor': '低层（共6层）', 'orientation': '南北向',
+            'build_year': '2000年建', 'owner_name': '测试', 'address': f'{prefix}{i}',
+            'description': '', 'price': '200万33333元/㎡'
+        } for i in range(count)], 'sync')
+
+    def test_only_new_rows_are_sent(self):
+        self.save('增量同步小区', 3)
+        full = self.client.get('/api/houses?since_id=0')
+        self.assertEqual(full.status_code, 200)
+        last_id = max(row['id'] for row in full.json)
+        self.assertEqual(int(full.headers['X-Max-Id']), last_id)
+
+        # 同步后客户端带新的 since_id 和上次的 ETag 请求，数据未变化时直接返回 304，
+        # 并带上最大 id 供客户端检查数据库是否重建
+        unchanged = self.client.get(f'/api/houses?since_id={last_id}', headers={'If-None-Match': full.headers['ETag']})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(int(unchanged.headers['X-Max-Id']), last_id)
+        # 不带 ETag 时返回空的增量，ETag 与全量同步时相同
+        empty = self.client.get(f'/api/houses?since_id={last_id}')
+        self.assertEqual(empty.json, [])
+        self.assertEqual(empty.headers['ETag'], full.headers['ETag'])
+
+        self.save('增量同步新小区', 2)
+        delta = self.client.get(f'/api/houses?since_id={last_id}', headers={'If-None-Match': full.headers['ETag']})
+        self.assertEqual(delta.status_code, 200)
+        self.assertEqual([row['address'] for row in delta.json], ['增量同步新小区0', '增量同步新小区1'])
+        self.assertTrue(all(row['id'] > last_id for row in delta.json))
+
+    def test_rebuilt_database_is_visible_on_304(self):
+        self.save('重建检查小区', 1)
+        full = self.client.get('/api/houses?since_id=0')
+        last_id = max(row['id'] for row in full.json)
+        # 客户端缓存的 id 比服务器现有的最大 id 还大（服务器数据库重建过），304 响应也能看出来
+        stale_since = last_id + 1000
+        first = self.client.get(f'/api/houses?since_id={stale_since}')
+        again = self.client.get(f'/api/houses?since_id={stale_since}', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertLess(int(again.headers['X-Max-Id']), stale_since)
+
+
+if __name__ == '__main__':
+    unittest.main()
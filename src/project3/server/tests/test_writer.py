@@ -0,0 +1,70 @@
+# tests/test_writer.py
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HOUSES_DB_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_houses.db'))
+
+from database import Session, House, engine
+from scraper import WebScraper_HouseData
+from writer import DatabaseWriter
+
+
+def make_houses(prefix, count):
+    return [{
+        'room_type': '1室1厅', 'area': '50㎡', 'floor': '高层（共30层）', 'orientation': '东向',
+        'build_year': '2015年建', 'owner_name': '李四', 'address': f'{prefix}-{i}',
+        'description': '', 'price': '200万40000元/㎡'
+    } for i in range(count)]
+
+
+class TestDatabaseWriter(unittest.TestCase):
+    def test_wal_mode(self):
+        if engine.dialect.name != 'sqlite':
+            self.skipTest("仅适用于 SQLite")
+        with engine.connect() as conn:
+            self.assertEqual(conn.exec_driver_sql('PRAGMA journal_mode').scalar(), 'wal')
+
+    def test_concurrent_saves_all_land(self):
+        scraper = WebScraper_HouseData(base_url="http://example.invalid/", pages=1)
+        results = []
+
+        def worker(n):
+            for batch in range(5):
+                results.append(len(scraper.save_to_db(make_houses(f'并发写入{n}-{batch}', 20), 'writer')))
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(results), 8 * 5 * 20)
+        session = Session()
+        try:
+            self.assertEqual(session.query(House).filter(House.address.like('并发写入%')).count(), 800)
+        finally:
+            session.close()
+
+    def test_failed_task_does_not_affect_batch(self):
+        db_writer = DatabaseWriter()
+
+        def fail(session):
+            raise RuntimeError("boom")
+
+        blocker = threading.Event()
+        first = db_writer.submit(lambda session: blocker.wait(5))
+        bad = db_writer.submit(fail)
+        good = db_writer.submit(lambda session: "ok")
+        blocker.set()
+        self.assertTrue(first.result(5))
+        with self.assertRaises(RuntimeError):
+            bad.result(5)
+        self.assertEqual(good.result(5), "ok")
+        db_writer.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
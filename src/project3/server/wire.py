@@ -0,0 +1,89 @@
+# server/wire.py
+import gzip
+import json
+
+# 以下编码/压缩库均为可选依赖，未安装时对应格式不参与协商
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 格式名 -> MIME 类型
+FORMATS = {
+    'json': 'application/json',
+    'columns': 'application/vnd.houses.columns+json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# 小于该字节数的响应不压缩，压缩收益抵不过开销
+MIN_COMPRESS_SIZE = 1024
+
+
+def available_formats():
+    formats = ['json', 'columns']
+    if msgpack is not None:
+        formats.append('msgpack')
+    if pa is not None:
+        formats.append('arrow')
+    return formats
+
+
+def negotiate_format(accept_mimetypes):
+    """根据 Accept 头选择响应格式，默认为逐行 JSON"""
+    offered = {FORMATS[name]: name for name in available_formats()}
+    best = accept_mimetypes.best_match(list(offered), default=FORMATS['json'])
+    return offered.get(best, 'json')
+
+
+def negotiate_encoding(accept_encodings):
+    """根据 Accept-Encoding 头选择压缩方式，优先 brotli"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def encode_rows(fields, rows, fmt):
+    """
+    把查询结果编码为指定格式
+    :param fields: 字段名列表
+    :param rows: 元组列表，顺序与 fields 一致
+    :param fmt: 格式名，见 FORMATS
+    :return: bytes
+    """
+    if fmt == 'json':
+        return json.dumps([dict(zip(fields, row)) for row in rows], ensure_ascii=False).encode('utf-8')
+    # 其余格式均按列组织，字段名只出现一次
+    columns = {field: list(values) for field, values in zip(fields, zip(*rows))} if rows else {field: [] for field in fields}
+    if fmt == 'columns':
+        return json.dumps({"fields": fields, "columns": columns}, ensure_ascii=False).encode('utf-8')
+    if fmt == 'msgpack':
+        return msgpack.packb({"fields": fields, "columns": columns}, use_bin_type=True)
+    if fmt == 'arrow':
+        table = pa.table(columns)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def compress(body, encoding):
+    """按协商结果压缩，返回 (body, 实际使用的 Content-Encoding)"""
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=5), 'br'
+    return gzip.compress(body, compresslevel=6), 'gzip'
@@ -0,0 +1,111 @@
+# server/writer.py
+import os
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+from database import Session
+
+logger = logging.getLogger(__name__)
+
+
+class _WriteTask:
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.future = Future()
+
+
+class DatabaseWriter:
+    """
+    单写线程：所有写操作都提交到队列，由唯一的写线程执行。
+    上一个事务提交期间在队列中积压的写任务会合并到同一个事务中提交，
+    避免多个线程同时写 SQLite 造成 "database is locked" 和串行等待。
+    """
+
+    def __init__(self, max_batch_tasks=64):
+        self.max_batch_tasks = max_batch_tasks
+        self.stats = {"tasks": 0, "transactions": 0, "failures": 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # 按进程启动写线程：fork 出的子进程不会继承父进程的线程
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, func, *args):
+        """
+        提交写任务，func(session, *args) 在写线程的事务中执行
+        :return: Future，结果为 func 的返回值
+        """
+        self._ensure_started()
+        task = _WriteTask(func, args)
+        self._queue.put(task)
+        return task.future
+
+    def execute(self, func, *args):
+        """提交写任务并等待其提交完成"""
+        return self.submit(func, *args).result()
+
+    def stop(self, timeout=10):
+        """处理完队列中已有的任务后停止写线程"""
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _collect_batch(self, first):
+        batch = [first]
+        while len(batch) < self.max_batch_tasks:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                self._queue.put(None)
+                break
+            batch.append(task)
+        return batch
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            batch = self._collect_batch(task)
+            if not self._commit(batch) and len(batch) > 1:
+                # 合并事务失败时逐个重试，避免一个坏任务拖累同批的其他任务
+                for single in batch:
+                    self._commit([single])
+
+    def _commit(self, batch):
+        session = Session()
+        try:
+            results = [task.func(session, *task.args) for task in batch]
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.stats["failures"] += 1
+            logger.error(f"写入数据库时出错（本批 {len(batch)} 个任务）: {e}")
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+            return False
+        finally:
+            session.close()
+        self.stats["tasks"] += len(batch)
+        self.stats["transactions"] += 1
+        for task, result in zip(batch, results):
+            task.future.set_result(result)
+        return True
+
+
+writer = DatabaseWriter()
@@ -0,0 +1,28 @@
+# server/wsgi.py
+"""
+生产环境入口：gunicorn -c gunicorn.conf.py wsgi:application
+
+配置中启用了 preload_app，本模块在主进程中导入一次，
+应用、数据库初始化、预热好的缓存和已加载的预测模型随 fork 被所有工作进程共享（写时复制），
+工作进程启动后无需各自重新计算
+"""
+import logging
+from app import app
+from predictor import model_cache
+
+logger = logging.getLogger(__name__)
+
+# 启动时预先计算的接口，结果进入 response_cache
+WARMUP_PATHS = ['/api/statistics', '/api/houses']
+
+
+def preload():
+    with app.test_client() as client:
+        for path in WARMUP_PATHS:
+            status = client.get(path).status_code
+            logger.info(f"预热 {path}: {status}")
+    logger.info(f"已预加载模型: {model_cache.preload()}")
+
+
+preload()
+application = app
@@ -0,0 +1,63 @@
+# BackgroundCrawler.py
+
+import queue
+import threading
+import time
+
+
+class BackgroundCrawler:
+    def __init__(self, scraper, persist=None):
+        """
+        在后台线程中逐页爬取，每页结果通过队列交给界面线程
+        :param scraper: WebScraper_HouseData 实例
+        :param persist: 可选，persist(page_data) 在后台线程中保存每一页的数据
+        """
+        self.scraper = scraper
+        self.persist = persist
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        self.thread = None
+        self.pages_done = 0
+        self.records = 0
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        """请求停止爬取，已爬取的页面仍会保留"""
+        self.cancelled.set()
+
+    @property
+    def rate(self):
+        """每秒爬取的记录数（包含翻页延时）"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0
+        return self.records / elapsed if elapsed > 0 else 0.0
+
+    def _run(self):
+        try:
+            for page_num, page_data in self.scraper.scrape_pages(cancelled=self.cancelled):
+                if page_data and self.persist is not None:
+                    self.persist(page_data)
+                self.pages_done = page_num
+                self.records += len(page_data)
+                self.messages.put(('page', page_num, page_data))
+        except Exception as e:
+            self.messages.put(('error', e))
+        finally:
+            self.messages.put(('done', self.cancelled.is_set()))
+
+    def poll(self):
+        """
+        在界面线程中取出所有已到达的消息
+        :return: 消息列表，('page', 页码, 数据) / ('error', 异常) / ('done', 是否被取消)
+        """
+        messages = []
+        try:
+            while True:
+                messages.append(self.messages.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
@@ -0,0 +1,201 @@
+# Benchmarks.py
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import warnings
+import joblib
+import pandas as pd
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import NearestNeighbors
+from sklearn.pipeline import Pipeline
+from DataPreprocessor import DataPreprocessor
+from FeatureExtractor import HashingFeatures
+from ModelTrainer import ModelTrainer
+from NeighborIndex import NeighborIndex, FEATURE_COLUMNS
+from ComparablesEngine import ComparablesEngine
+from TrainingPool import read_chunks
+# 模拟房源与测试共用同一个生成器
+from tests.fixtures import make_city_db, make_listings
+
+
+def load_listings(rows, db_path=None):
+    """
+    读取用于对比模型的数据：指定 db_path 时读取爬取的真实房源，否则生成模拟房源。
+    模拟房源的价格与特征无关，只能比较特征列数、耗时和文件大小，MSE 要在真实数据上比较
+    :param rows: 模拟房源数量，读取真实数据时为最多读取的行数
+    :param db_path: 城市数据库，如 bj_house_data.db
+    :return: DataFrame
+    """
+    if db_path is None:
+        print("使用模拟房源：价格与特征无关，MSE 没有参考意义，比较模型误差请用 --db 指定城市数据库")
+        return make_listings(rows)
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query("SELECT * FROM houses LIMIT ?", conn, params=(rows,))
+    conn.close()
+    print(f"读取 {db_path} 中的 {len(df)} 条房源")
+    return df
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def legacy_query(db_path, preprocessor, input_df):
+    """原 show_similar_houses 的做法：每次读取整张表、转换全部数据并重新建立 ball_tree"""
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query("SELECT * FROM houses", conn)
+    conn.close()
+    X = preprocessor.transform(df[FEATURE_COLUMNS])
+    with warnings.catch_warnings():
+        # 稀疏输入时 ball_tree 退化为暴力搜索，sklearn 会给出警告
+        warnings.simplefilter('ignore', UserWarning)
+        nbrs = NearestNeighbors(n_neighbors=5, algorithm='ball_tree').fit(X)
+    _, indices = nbrs.kneighbors(preprocessor.transform(input_df[FEATURE_COLUMNS]))
+    return df.iloc[indices[0]]
+
+
+def report(name, seconds, count=1):
+    print(f"{name:<36}{seconds * 1000 / count:>12.2f} ms")
+
+
+def compare_features(rows, db_path=None):
+    """对比独热编码和 FeatureExtractor 两种预处理下，三种模型的特征列数、训练耗时和测试集误差"""
+    df = load_listings(rows, db_path)
+    X_train, X_test, y_train, y_test = train_test_split(df[FEATURE_COLUMNS], df['price'], test_size=0.2,
+                                                        random_state=42)
+    print(f"\n{'预处理':<12}{'模型':<8}{'特征列数':>10}{'训练耗时':>12}{'MSE':>14}")
+    for name, extract_features in (("独热编码", False), ("特征提取", True)):
+        for model_type in ('linear', 'tree', 'forest'):
+            pipeline = Pipeline([
+                ('preprocessor', DataPreprocessor(extract_features=extract_features).preprocessor),
+                ('model', ModelTrainer(model_type=model_type).model)
+            ])
+            seconds, _ = timed(pipeline.fit, X_train, y_train)
+            width = pipeline.named_steps['preprocessor'].transform(X_test.head(1)).shape[1]
+            mse = mean_squared_error(y_test, pipeline.predict(X_test))
+            print(f"{name:<12}{model_type:<8}{width:>10}{seconds * 1000:>10.0f} ms{mse:>14.2f}")
+
+
+def compare_models(rows, predict_queries=200, db_path=None):
+    """在同一份数据上对比随机森林和直方图梯度提升的训练耗时、模型文件大小、预测延迟和测试集误差"""
+    df = load_listings(rows, db_path)
+    X_train, X_test, y_train, y_test = train_test_split(df[FEATURE_COLUMNS], df['price'], test_size=0.2,
+                                                        random_state=42)
+    workdir = tempfile.mkdtemp()
+    print(f"\n{'模型':<8}{'训练耗时':>12}{'文件大小':>12}{'单条预测':>12}{'批量预测':>14}{'MSE':>12}")
+    for model_type in ('forest', 'hgb'):
+        pipeline = Pipeline([
+            ('preprocessor', DataPreprocessor(native_categorical=model_type == 'hgb').preprocessor),
+            ('model', ModelTrainer(model_type=model_type).model)
+        ])
+        seconds, _ = timed(pipeline.fit, X_train, y_train)
+        path = os.path.join(workdir, f"{model_type}.joblib")
+        joblib.dump(pipeline, path)
+        single = sum(timed(pipeline.predict, X_test.iloc[[i]])[0] for i in range(predict_queries)) / predict_queries
+        batch, predictions = timed(pipeline.predict, X_test)
+        mse = mean_squared_error(y_test, predictions)
+        print(f"{model_type:<8}{seconds:>10.2f} s{os.path.getsize(path) / 2 ** 20:>9.1f} MB{single * 1000:>9.2f} ms"
+              f"{batch * 1000:>8.0f} ms/{len(X_test)}{mse:>12.2f}")
+
+
+def full_table_training(db_path, model_type):
+    """原 train_model 的做法：读取整张表后训练"""
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query("SELECT * FROM houses", conn)
+    conn.close()
+    trainer = ModelTrainer(model_type=model_type)
+    preprocessor = HashingFeatures() if model_type == 'online' else DataPreprocessor().preprocessor
+    trainer.train(Pipeline([('preprocessor', preprocessor), ('model', trainer.model)]), df[FEATURE_COLUMNS],
+                  df['price'])
+    return trainer.mse
+
+
+def compare_chunks(rows, chunk_sizes=(5000, 20000, 100000)):
+    """对比读取整张表训练和分块训练的峰值内存（tracemalloc 统计，会使耗时变长数倍）"""
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'bench_house_data.db')
+    print(f"生成 {rows} 条模拟房源 ...")
+    make_city_db(db_path, rows)
+
+    results = []
+    for model_type in ('linear', 'online'):
+        tracemalloc.start()
+        seconds, mse = timed(full_table_training, db_path, model_type)
+        results.append((f"整张表 {model_type}", tracemalloc.get_traced_memory()[1], seconds, mse))
+        tracemalloc.stop()
+    for chunk_rows in chunk_sizes:
+        trainer = ModelTrainer(model_type='online')
+        pipeline = Pipeline([('preprocessor', HashingFeatures()), ('model', trainer.model)])
+        # 峰值内存与轮数无关，只训练一轮
+        seconds, _ = timed(trainer.train_chunks, pipeline, lambda: read_chunks(db_path, 0, rows, chunk_rows), 1,
+                           0.2, True)
+        results.append((f"分块 online（每块 {chunk_rows} 行）", trainer.peak_memory, seconds, trainer.mse))
+
+    print(f"\n{'方法':<28}{'峰值内存':>12}{'耗时':>12}{'MSE':>14}")
+    for name, peak, seconds, mse in results:
+        print(f"{name:<28}{peak / 2 ** 20:>9.1f} MB{seconds:>10.1f} s{mse:>14.2f}")
+
+
+def compare_neighbors(args):
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'bench_house_data.db')
+    print(f"生成 {args.rows} 条模拟房源 ...")
+    make_city_db(db_path, args.rows)
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query("SELECT * FROM houses", conn)
+    conn.close()
+    preprocessor = DataPreprocessor().preprocessor.fit(df[FEATURE_COLUMNS])
+    queries = make_listings(args.queries, seed=1)
+    districts = queries['district'].tolist()
+
+    print(f"\n{'方法':<36}{'平均耗时':>12}")
+    seconds = sum(timed(legacy_query, db_path, preprocessor, queries.iloc[[i]])[0]
+                  for i in range(args.legacy_queries))
+    report("原做法（每次重建 ball_tree）", seconds, args.legacy_queries)
+
+    index = NeighborIndex('bench', models_dir=workdir, db_path=db_path)
+    report("NeighborIndex 建立", timed(index.build, preprocessor)[0])
+    index.load()
+    seconds = sum(timed(index.query, queries.iloc[[i]], preprocessor)[0] for i in range(args.queries))
+    report("NeighborIndex 单次查询", seconds, args.queries)
+
+    engine = ComparablesEngine(db_path)
+    report("ComparablesEngine 加载", timed(engine.refresh)[0])
+    seconds = sum(timed(engine.query_batch, queries.iloc[[i]], 5)[0] for i in range(args.queries))
+    report("ComparablesEngine 单次查询（全市）", seconds, args.queries)
+    seconds = sum(timed(engine.query_batch, queries.iloc[[i]], 5, [districts[i]])[0] for i in range(args.queries))
+    report("ComparablesEngine 单次查询（同区域）", seconds, args.queries)
+    report("ComparablesEngine 批量查询（同区域）", timed(engine.query_batch, queries, 5, districts)[0], args.queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能对比：neighbors 为相似房源查找，features 为两种特征预处理，"
+                                                 "chunks 为整张表训练和分块训练的峰值内存，models 为随机森林和 hgb")
+    parser.add_argument('suite', nargs='?', choices=['neighbors', 'features', 'chunks', 'models'], default='neighbors')
+    parser.add_argument('--rows', type=int, default=None,
+                        help="房源数量（默认 neighbors 200000，features 和 models 20000，chunks 100000）")
+    parser.add_argument('--db', default=None, help="features 和 models 使用的城市数据库（如 bj_house_data.db），"
+                                                   "不指定时使用模拟房源，MSE 没有参考意义")
+    parser.add_argument('--queries', type=int, default=200, help="查询数量")
+    parser.add_argument('--legacy-queries', type=int, default=3, help="原做法的查询数量（每次都要重建，较慢）")
+    args = parser.parse_args()
+    if args.suite == 'features':
+        compare_features(args.rows or 20000, args.db)
+    elif args.suite == 'models':
+        compare_models(args.rows or 20000, db_path=args.db)
+    elif args.suite == 'chunks':
+        compare_chunks(args.rows or 100000)
+    else:
+        args.rows = args.rows or 200000
+        compare_neighbors(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# ComparablesEngine.py
+
+import re
+import sqlite3
+import numpy as np
+import pandas as pd
+
+NUMERIC_FEATURES = ['area', 'build_year']
+CATEGORICAL_FEATURES = ['room_type', 'orientation', 'floor']
+# 各特征在距离中的权重
+DEFAULT_WEIGHTS = {'area': 2.0, 'build_year': 1.0, 'room_type': 1.5, 'orientation': 0.5, 'floor': 0.5}
+# 距离矩阵每块的最大元素数，批量查询时按块计算以限制内存
+CHUNK_ELEMENTS = 4_000_000
+
+# 地址形如 "小区名朝阳-望京"，"-" 前为区域、后为商圈；小区名与区域之间没有分隔
+_DISTRICT = re.compile(r'([一-龥]+)-')
+
+
+def district_of(address, known=()):
+    """
+    从地址文本中推断区域，用于没有 district 列的旧数据（爬取时已从 <span> 中解析区域）。
+    "-" 前的文字以某个已知区域结尾时取最长的一个（如 "石景山"），否则取 "-" 前的两个字
+    :param address: 地址字符串，例如 "金隅丽港城朝阳-望京"
+    :param known: 已知的区域名
+    :return: 区域（例如 "朝阳"），无法识别时返回 None
+    """
+    if not isinstance(address, str):
+        return None
+    match = _DISTRICT.search(address)
+    if not match:
+        return None
+    prefix = match.group(1)
+    matches = [name for name in known if name and prefix.endswith(name)]
+    return max(matches, key=len) if matches else prefix[-2:]
+
+
+class ComparablesEngine:
+    def __init__(self, db_path, weights=None):
+        """
+        可比房源引擎：按 Gower 距离比较房源，数值特征按取值范围归一化后取绝对差，
+        类别特征取值不同记 1、相同记 0，再按权重加权平均，独热编码的列数不会影响距离。
+        房源按区域排序并记录每个区域的起止位置，查询时只比较同一区域的房源
+        :param db_path: 城市数据库文件
+        :param weights: 各特征权重，默认 DEFAULT_WEIGHTS
+        """
+        self.db_path = db_path
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.max_rowid = 0
+        self.row_ids = np.empty(0, dtype=np.int64)
+        # 按特征存放（每行一个特征），计算距离时每个特征是连续的数组
+        self.numeric = np.empty((len(NUMERIC_FEATURES), 0), dtype=np.float32)
+        self.codes = np.empty((len(CATEGORICAL_FEATURES), 0), dtype=np.int32)
+        self.vocabularies = [{} for _ in CATEGORICAL_FEATURES]
+        self.districts = {}
+        self.district_codes = np.empty(0, dtype=np.int32)
+        self.ranges = np.ones(len(NUMERIC_FEATURES), dtype=np.float32)
+        self._district_starts = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def refresh(self):
+        """
+        读取数据库中新增的房源（rowid 大于上次读取的最大值）并更新区域索引
+        :return: 新增的行数
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            has_district = 'district' in [row[1] for row in conn.execute("PRAGMA table_info(houses)")]
+            df = pd.read_sql_query(f"SELECT rowid AS row_id, {', '.join(NUMERIC_FEATURES + CATEGORICAL_FEATURES)}, "
+                                   f"address, {'district' if has_district else 'NULL AS district'} "
+                                   "FROM houses WHERE rowid > ? ORDER BY rowid", conn, params=(self.max_rowid,))
+        finally:
+            conn.close()
+        if df.empty:
+            return 0
+        district = df['district'].where(df['district'] != 'N/A')
+        missing = district.isna()
+        if missing.any():
+            # 爬取时没有解析区域的旧房源，按已知区域从地址中推断
+            known = {name for name in self.districts if name} | set(district.dropna())
+            district[missing] = [district_of(address, known) for address in df.loc[missing, 'address']]
+
+        codes = np.vstack([self._encode(vocabulary, df[feature], grow=True)
+                           for vocabulary, feature in zip(self.vocabularies, CATEGORICAL_FEATURES)])
+        district_codes = self._encode(self.districts, district, grow=True)
+        row_ids = np.concatenate((self.row_ids, df['row_id'].to_numpy(dtype=np.int64)))
+        numeric = np.concatenate((self.numeric, df[NUMERIC_FEATURES].to_numpy(dtype=np.float32).T), axis=1)
+        codes = np.concatenate((self.codes, codes), axis=1)
+        district_codes = np.concatenate((self.district_codes, district_codes))
+        self.max_rowid = int(df['row_id'].max())
+
+        # 按区域排序，每个区域的房源在数组中连续存放，查询时直接取切片
+        order = np.argsort(district_codes, kind='stable')
+        self.row_ids = row_ids[order]
+        self.numeric = numeric[:, order]
+        self.codes = codes[:, order]
+        self.district_codes = district_codes[order]
+        counts = np.bincount(self.district_codes, minlength=len(self.districts))
+        self._district_starts = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        # 数值特征的取值范围，用于归一化
+        with np.errstate(invalid='ignore'):
+            spans = np.nanmax(self.numeric, axis=1) - np.nanmin(self.numeric, axis=1)
+        self.ranges = np.where(np.isfinite(spans) & (spans > 0), spans, 1).astype(np.float32)
+        return len(df)
+
+    @staticmethod
+    def _encode(vocabulary, values, grow=False):
+        """
+        把取值转换为整数编码，缺失值也作为一种取值
+        :param grow: 为 True 时把新取值加入 vocabulary；否则未见过的取值编码为 -1（与任何房源都不同）
+        """
+        values = pd.Series(values, dtype=object).reset_index(drop=True)
+        missing = values.isna().to_numpy()
+        if grow:
+            for value in pd.unique(values[~missing]):
+                vocabulary.setdefault(value, len(vocabulary))
+            if missing.any():
+                vocabulary.setdefault(None, len(vocabulary))
+        known = [value for value in vocabulary if value is not None]
+        lookup = np.array([vocabulary[value] for value in known] + [-1], dtype=np.int32)
+        codes = lookup[pd.Categorical(values, categories=known).codes]
+        codes[missing] = vocabulary.get(None, -1)
+        return codes
+
+    def _resolve_district(self, district):
+        """把用户输入的区域名对应到索引中的区域，例如 "朝阳区" 对应 "朝阳" """
+        if not district:
+            return None
+        if district in self.districts:
+            return self.districts[district]
+        matches = [name for name in self.districts if name and name in district]
+        return self.districts[max(matches, key=len)] if matches else None
+
+    def candidates(self, district=None, k=5):
+        """
+        返回候选房源的范围：指定区域且该区域至少有 k 套房源时只取该区域，否则取全部
+        :return: (切片, 是否按区域筛选)；区域无法识别或房源不足 k 套时退回全市，第二项为 False
+        """
+        code = self._resolve_district(district)
+        if code is not None:
+            start, stop = self._district_starts[code], self._district_starts[code + 1]
+            if stop - start >= k:
+                return slice(start, stop), True
+        return slice(0, len(self.row_ids)), False
+
+    def distances(self, queries, candidates):
+        """
+        计算 Gower 距离矩阵
+        :param queries: (数值特征矩阵, 类别编码矩阵)
+        :param candidates: 候选房源的切片
+        :return: 形状为 (查询数, 候选数) 的距离矩阵
+        """
+        query_numeric, query_codes = queries
+        numeric, codes = self.numeric[:, candidates], self.codes[:, candidates]
+        total = np.zeros((len(query_numeric), numeric.shape[1]), dtype=np.float32)
+        # 没有缺失值时各行的权重和相同，不需要逐个元素计算
+        complete = not (np.isnan(numeric).any() or np.isnan(query_numeric).any())
+        weight_sum = sum(self.weights.values()) if complete else np.zeros_like(total)
+        for j, feature in enumerate(NUMERIC_FEATURES):
+            scale = np.float32(self.weights[feature] / self.ranges[j])
+            difference = np.abs(query_numeric[:, j, None] - numeric[j])
+            if complete:
+                total += scale * difference
+            else:
+                # 缺失的数值特征不参与比较
+                valid = np.isfinite(difference)
+                total += scale * np.where(valid, difference, 0)
+                weight_sum += self.weights[feature] * valid
+        for j, feature in enumerate(CATEGORICAL_FEATURES):
+            weight = np.float32(self.weights[feature])
+            total += weight * (query_codes[:, j, None] != codes[j])
+            if not complete:
+                weight_sum += weight
+        total /= weight_sum
+        return total
+
+    def _prepare(self, listings):
+        numeric = listings[NUMERIC_FEATURES].to_numpy(dtype=np.float32)
+        codes = np.column_stack([self._encode(vocabulary, listings[feature])
+                                 for vocabulary, feature in zip(self.vocabularies, CATEGORICAL_FEATURES)])
+        return numeric, codes
+
+    def query_batch(self, listings, k=5, districts=None):
+        """
+        批量查找可比房源，同一区域的查询一起计算
+        :param listings: 包含特征列的 DataFrame
+        :param k: 每个查询返回的房源数
+        :param districts: 每个查询的区域（可以为 None），默认不按区域筛选
+        :return: (rowid 矩阵, 距离矩阵, 是否按区域筛选)，矩阵形状为 (查询数, k)，按距离从近到远，
+                 房源不足 k 套时以 -1 / inf 补齐；第三项为每个查询是否只在其区域中查找的布尔数组
+        """
+        numeric, codes = self._prepare(listings)
+        count = len(listings)
+        result_ids = np.full((count, k), -1, dtype=np.int64)
+        result_distances = np.full((count, k), np.inf, dtype=np.float32)
+        result_filtered = np.zeros(count, dtype=bool)
+        if districts is None:
+            districts = [None] * count
+        district_keys = [self._resolve_district(district) for district in districts]
+
+        groups = {}
+        for i, key in enumerate(district_keys):
+            groups.setdefault(key, []).append(i)
+        for members in groups.values():
+            members = np.asarray(members)
+            candidates, filtered = self.candidates(districts[members[0]], k)
+            result_filtered[members] = filtered
+            if candidates.stop == candidates.start:
+                continue
+            best_ids = np.empty((len(members), 0), dtype=np.int64)
+            best_distances = np.empty((len(members), 0), dtype=np.float32)
+            chunk = max(CHUNK_ELEMENTS // len(members), k)
+            for start in range(candidates.start, candidates.stop, chunk):
+                part = slice(start, min(start + chunk, candidates.stop))
+                distances = self.distances((numeric[members], codes[members]), part)
+                best_distances = np.concatenate((best_distances, distances), axis=1)
+                best_ids = np.concatenate((best_ids, np.broadcast_to(self.row_ids[part], distances.shape)), axis=1)
+                if best_distances.shape[1] > k:
+                    top = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                    best_distances = np.take_along_axis(best_distances, top, axis=1)
+                    best_ids = np.take_along_axis(best_ids, top, axis=1)
+            order = np.argsort(best_distances, axis=1, kind='stable')
+            found = best_distances.shape[1]
+            result_distances[members, :found] = np.take_along_axis(best_distances, order, axis=1)
+            result_ids[members, :found] = np.take_along_axis(best_ids, order, axis=1)
+        return result_ids, result_distances, result_filtered
+
+    def query(self, listing, k=5, district=None):
+        """
+        查找一套房源的可比房源
+        :param listing: 包含特征列的一行 DataFrame
+        :return: (可比房源的 DataFrame，增加 distance 列, 是否只在 district 中查找)；
+                 区域无法识别或房源不足 k 套时在全市查找，第二项为 False
+        """
+        self.refresh()
+        row_ids, distances, filtered = self.query_batch(listing, k, [district])
+        found = row_ids[0] >= 0
+        df = self.fetch(row_ids[0][found])
+        df['distance'] = distances[0][found]
+        return df, bool(filtered[0])
+
+    def fetch(self, row_ids):
+        """按 rowid 从数据库读取房源，顺序与 row_ids 一致"""
+        row_ids = [int(row_id) for row_id in row_ids]
+        conn = sqlite3.connect(self.db_path)
+        try:
+            df = pd.read_sql_query(f"SELECT rowid AS row_id, * FROM houses WHERE rowid IN ({', '.join('?' * len(row_ids))})",
+                                   conn, params=row_ids)
+        finally:
+            conn.close()
+        return df.set_index('row_id').loc[row_ids].reset_index(drop=True)
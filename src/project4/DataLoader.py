@@ -1,10 +1,13 @@
 # DataLoader.py
 
 import tkinter as tk
-from tkinter import messagebox, ttk
+from tkinter import messagebox
 import sqlite3
 import pandas as pd
 import os
+from VirtualTable import VirtualTable
+
+HOUSE_COLUMNS = ['room_type', 'area', 'floor', 'orientation', 'build_year', 'owner_name', 'address', 'description', 'price']
 
 
 class DatabaseReader:
@@ -69,23 +72,11 @@ class DatabaseViewer:
 
     def create_widgets(self):
         """创建显示表格的UI"""
-        # 创建表格
-        self.table = ttk.Treeview(self.window, columns=("房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"),
-                                  show="headings", height=15)
-        self.table.pack(pady=10)
-
-        # 设置表头
+        # 创建表格：只渲染可见的行，点击表头可按该列排序
         headers = ["房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"]
-        for header in headers:
-            self.table.heading(header, text=header)
-            if header == "地址":
-                self.table.column(header, width=180)
-            elif header == "描述":
-                self.table.column(header, width=250)
-            elif header == "价格":
-                self.table.column(header, width=130)
-            else:
-                self.table.column(header, width=100)
+        widths = {"地址": 180, "描述": 250, "价格": 130}
+        self.table = VirtualTable(self.window, headers, widths=widths, height=15)
+        self.table.pack(pady=10, fill=tk.BOTH, expand=True)
 
         # 加载并显示数据
         self.load_and_display_data()
@@ -129,23 +120,8 @@ class DatabaseViewer:
         if data is None:
             return
 
-        # 清空表格内容
-        for row in self.table.get_children():
-            self.table.delete(row)
-
-        # 将排序后的数据填充到表格
-        for _, row in data.iterrows():
-            self.table.insert("", tk.END, values=(
-                row['room_type'],
-                row['area'],
-                row['floor'],
-                row['orientation'],
-                row['build_year'],
-                row['owner_name'],
-                row['address'],
-                row['description'],
-                row['price']
-            ))
+        # 按列整体交给表格，不逐行插入
+        self.table.set_columns([data[column].tolist() for column in HOUSE_COLUMNS])
 
 
 def run_test(city):
@@ -1,26 +1,61 @@
 # DataPreprocessor.py
 
+import numpy as np
 import pandas as pd
 import re
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
 from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
+from FeatureExtractor import FeatureExtractor
+
+
+# native_categorical 时按类别编码的列，hgb 模型据此设置 categorical_features
+NATIVE_CATEGORICAL_FEATURES = ['room_type', 'orientation']
 
 
 class DataPreprocessor:
-    def __init__(self):
+    def __init__(self, extract_features=True, native_categorical=False):
+        """
+        :param extract_features: 为 True 时先把楼层、房型、朝向解析为数值特征（FeatureExtractor），
+                                 为 False 时对这三列做独热编码（每种取值一列）
+        :param native_categorical: 供直方图梯度提升（hgb）使用：最前面两列为房型、朝向的整数编码，
+                                   由模型按类别处理，之后为 FeatureExtractor 解析出的数值特征，不填补缺失值也不标准化
+        """
         # 定义需要进行独热编码的类别特征
         self.categorical_features = ['room_type', 'orientation', 'floor']
         # 定义需要进行标准化的数值特征
         self.numeric_features = ['area', 'build_year']
 
         # 定义预处理管道
-        self.preprocessor = ColumnTransformer(
-            transformers=[
-                ('num', StandardScaler(), self.numeric_features),
-                ('cat', OneHotEncoder(handle_unknown='ignore'), self.categorical_features)
-            ]
-        )
+        if native_categorical:
+            # 模型自己处理缺失值和未见过的取值（编码为 NaN），类别数不超过模型支持的 255 个，少见的取值合为一类
+            self.preprocessor = ColumnTransformer(
+                transformers=[
+                    ('cat', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan,
+                                           encoded_missing_value=np.nan, max_categories=255),
+                     NATIVE_CATEGORICAL_FEATURES),
+                    ('num', FeatureExtractor(), self.categorical_features + self.numeric_features)
+                ]
+            )
+        elif extract_features:
+            # 解析后只有十列数值特征，列数不随数据中出现的取值增加
+            self.preprocessor = ColumnTransformer(
+                transformers=[
+                    ('num', Pipeline([
+                        ('extract', FeatureExtractor()),
+                        ('impute', SimpleImputer(strategy='median')),
+                        ('scale', StandardScaler())
+                    ]), self.categorical_features + self.numeric_features)
+                ]
+            )
+        else:
+            self.preprocessor = ColumnTransformer(
+                transformers=[
+                    ('num', StandardScaler(), self.numeric_features),
+                    ('cat', OneHotEncoder(handle_unknown='ignore'), self.categorical_features)
+                ]
+            )
 
     def preprocess(self, df):
         """
@@ -0,0 +1,92 @@
+# FeatureExtractor.py
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.preprocessing import StandardScaler
+
+# 楼层位置：低层为 0、中层为 1、高层为 2
+FLOOR_BANDS = {'底': 0, '低': 0, '中': 1, '高': 2, '顶': 2}
+ORIENTATIONS = ['东', '南', '西', '北']
+TEXT_COLUMNS = ['room_type', 'orientation', 'floor']
+FEATURE_NAMES = (['area', 'build_year', 'floor_band', 'total_floors', 'rooms', 'halls']
+                 + [f"faces_{direction}" for direction in ORIENTATIONS])
+
+
+def _extract(values, pattern):
+    """对每种不同的取值只做一次正则匹配，楼层、房型的取值种类远少于行数"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return pd.Series(pd.Series(uniques).str.extract(pattern, expand=False).to_numpy()[codes], index=values.index)
+
+
+class FeatureExtractor(BaseEstimator, TransformerMixin):
+    """
+    把爬取到的文本字段解析为数值特征：
+    楼层 "中层（共18层）" -> 楼层位置 1、总楼层 18；房型 "3室2厅" -> 3 室、2 厅；
+    朝向 "南北向" -> 东/南/西/北四个 0/1 标记。无法解析的值为 NaN，由后续步骤填补
+    """
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        X = pd.DataFrame(X)
+        floor = X['floor'].astype(str)
+        room_type = X['room_type'].astype(str)
+        orientation = X['orientation'].astype(str)
+
+        band = _extract(floor, r'([底低中高顶])').map(FLOOR_BANDS)
+        # 只有一层的房源写作 "1层" 或 "共1层"
+        total = _extract(floor, r'(\d+)层')
+        rooms = _extract(room_type, r'(\d+)室')
+        halls = _extract(room_type, r'(\d+)厅')
+
+        columns = [
+            pd.to_numeric(X['area'], errors='coerce'),
+            pd.to_numeric(X['build_year'], errors='coerce'),
+            band,
+            pd.to_numeric(total, errors='coerce'),
+            pd.to_numeric(rooms, errors='coerce'),
+            pd.to_numeric(halls, errors='coerce'),
+        ]
+        columns += [orientation.str.contains(direction, regex=False) for direction in ORIENTATIONS]
+        return np.column_stack([np.asarray(column, dtype=float) for column in columns])
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array(FEATURE_NAMES, dtype=object)
+
+
+class HashingFeatures(BaseEstimator, TransformerMixin):
+    """
+    在线训练使用的特征：FeatureExtractor 解析出的数值特征按累计的均值和方差标准化（缺失值取均值），
+    楼层、房型、朝向的原始文本再通过特征哈希映射到固定的 n_features 列。
+    列数不随取值变化，新出现的取值不需要重新拟合；partial_fit 只更新均值和方差
+    """
+
+    def __init__(self, n_features=2 ** 10):
+        """
+        :param n_features: 特征哈希的列数
+        """
+        self.n_features = n_features
+
+    def fit(self, X, y=None):
+        self.scaler_ = StandardScaler()
+        return self.partial_fit(X)
+
+    def partial_fit(self, X, y=None):
+        if not hasattr(self, 'scaler_'):
+            self.scaler_ = StandardScaler()
+        self.scaler_.partial_fit(FeatureExtractor().transform(X))
+        return self
+
+    def transform(self, X):
+        X = pd.DataFrame(X)
+        numeric = np.nan_to_num(self.scaler_.transform(FeatureExtractor().transform(X)))
+        # 不同的文本组合远少于行数，只对每种组合做一次哈希
+        codes, combinations = pd.MultiIndex.from_frame(X[TEXT_COLUMNS].astype(str)).factorize()
+        tokens = ([f"{column}={value}" for column, value in zip(TEXT_COLUMNS, combination)]
+                  for combination in combinations)
+        hashed = FeatureHasher(n_features=self.n_features, input_type='string').transform(tokens)[codes]
+        return sparse.hstack([sparse.csr_matrix(numeric), hashed], format='csr')
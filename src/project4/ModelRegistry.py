@@ -0,0 +1,162 @@
+# ModelRegistry.py
+
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+import joblib
+
+# 每个城市、每种模型保留的版本数
+KEEP_VERSIONS = 5
+# 内存中缓存的模型数
+CACHE_SIZE = 4
+
+
+class ModelRegistry:
+    def __init__(self, root='models', cache_size=CACHE_SIZE, keep_versions=KEEP_VERSIONS):
+        """
+        模型仓库：按城市和模型类型保存多个版本，
+        目录结构为 {root}/{城市}/{模型类型}/v{版本}/pipeline.joblib，同目录的 meta.json 记录训练信息。
+        加载时使用内存映射读取模型中的大数组，并在内存中缓存最近使用的模型
+        :param root: 模型目录
+        :param cache_size: 内存中缓存的模型数
+        :param keep_versions: 每个城市、每种模型保留的版本数
+        """
+        self.root = root
+        self.cache_size = cache_size
+        self.keep_versions = keep_versions
+        self._cache = OrderedDict()
+
+    def _model_dir(self, city_name, model_type):
+        return os.path.join(self.root, city_name, model_type)
+
+    def _pipeline_path(self, city_name, model_type, version):
+        return os.path.join(self._model_dir(city_name, model_type), f"v{version}", 'pipeline.joblib')
+
+    def legacy_path(self, city_name):
+        """城市最近训练的模型的副本，供相似房源索引和 project3 服务器使用"""
+        return os.path.join(self.root, f"{city_name}_pipeline.joblib")
+
+    def versions(self, city_name, model_type):
+        """
+        :return: 该城市、该模型类型的各版本信息，按版本从旧到新
+        """
+        model_dir = self._model_dir(city_name, model_type)
+        if not os.path.isdir(model_dir):
+            return []
+        result = []
+        for name in os.listdir(model_dir):
+            meta_path = os.path.join(model_dir, name, 'meta.json')
+            # 没有 meta.json 的目录是尚未写完的版本
+            if name.startswith('v') and name[1:].isdigit() and os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    result.append(json.load(f))
+        return sorted(result, key=lambda meta: meta['version'])
+
+    def latest(self, city_name, model_type):
+        versions = self.versions(city_name, model_type)
+        return versions[-1] if versions else None
+
+    def save(self, pipeline, city_name, model_type, rows, mse, train_seconds, extra=None, update_legacy=True):
+        """
+        保存新版本，并更新城市的模型副本
+        :param pipeline: 训练好的Pipeline
+        :param rows: 训练数据行数
+        :param mse: 测试集均方误差
+        :param train_seconds: 训练耗时（秒）
+        :param extra: 写入 meta.json 的其他信息，例如自动调参选出的模型和参数
+        :param update_legacy: 是否同时更新城市的模型副本；在线模型频繁更新，不替换副本
+        :return: 新版本的信息
+        """
+        model_dir = self._model_dir(city_name, model_type)
+        os.makedirs(model_dir, exist_ok=True)
+        existing = [int(name[1:]) for name in os.listdir(model_dir) if name.startswith('v') and name[1:].isdigit()]
+        version = max(existing, default=0) + 1
+        while True:
+            version_dir = os.path.join(model_dir, f"v{version}")
+            try:
+                # 创建目录是原子操作，同时保存的另一个进程已占用该版本号时换下一个
+                os.makedirs(version_dir)
+                break
+            except FileExistsError:
+                version += 1
+
+        # 不压缩保存，加载时才能对其中的数组使用内存映射；先写临时文件，被终止时只留下可以识别清理的临时文件
+        pipeline_path = os.path.join(version_dir, 'pipeline.joblib')
+        temp_path = f"{pipeline_path}.{os.getpid()}.tmp"
+        joblib.dump(pipeline, temp_path)
+        os.replace(temp_path, pipeline_path)
+        meta = {
+            'city': city_name,
+            'model_type': model_type,
+            'version': version,
+            'trained_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'rows': int(rows),
+            'mse': float(mse),
+            'train_seconds': round(train_seconds, 3),
+            'size_bytes': os.path.getsize(pipeline_path),
+        }
+        meta.update(extra or {})
+        # meta.json 最后写入，写入后该版本才可见；先写临时文件再替换，versions() 不会读到写了一半的文件
+        meta_path = os.path.join(version_dir, 'meta.json')
+        temp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, meta_path)
+
+        if update_legacy:
+            legacy_path = self.legacy_path(city_name)
+            temp_path = f"{legacy_path}.{os.getpid()}.tmp"
+            shutil.copyfile(pipeline_path, temp_path)
+            os.replace(temp_path, legacy_path)
+
+        self._prune(city_name, model_type)
+        return meta
+
+    def remove_temp_files(self, pid):
+        """
+        删除进程 pid 保存模型或索引时被中断留下的临时文件（{文件名}.{pid}.tmp），
+        以及因此没有写完的空版本目录
+        :param pid: 被取消或失败的训练进程的进程号
+        :return: 删除的临时文件数
+        """
+        suffix = f".{pid}.tmp"
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            temp_files = [name for name in files if name.endswith(suffix)]
+            for name in temp_files:
+                os.remove(os.path.join(directory, name))
+            removed += len(temp_files)
+            name = os.path.basename(directory)
+            if temp_files and name.startswith('v') and name[1:].isdigit() and not os.listdir(directory):
+                os.rmdir(directory)
+        return removed
+
+    def _prune(self, city_name, model_type):
+        for meta in self.versions(city_name, model_type)[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self._model_dir(city_name, model_type), f"v{meta['version']}"),
+                          ignore_errors=True)
+
+    def load(self, city_name, model_type, version=None, mmap=True):
+        """
+        加载模型，默认加载最新版本
+        :param mmap: 为 False 时完整读入内存且不使用缓存，返回的模型可以修改（例如在线模型的增量更新）
+        :return: (Pipeline, 版本信息)；没有该模型时返回 (None, None)
+        """
+        meta = self.latest(city_name, model_type) if version is None else next(
+            (meta for meta in self.versions(city_name, model_type) if meta['version'] == version), None)
+        if meta is None:
+            return None, None
+        if not mmap:
+            return joblib.load(self._pipeline_path(city_name, model_type, meta['version'])), meta
+        key = (city_name, model_type, meta['version'])
+        pipeline = self._cache.get(key)
+        if pipeline is None:
+            pipeline = joblib.load(self._pipeline_path(city_name, model_type, meta['version']), mmap_mode='r')
+            self._cache[key] = pipeline
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return pipeline, meta
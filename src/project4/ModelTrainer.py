@@ -1,18 +1,76 @@
 # ModelTrainer.py
 
+import shutil
+import tempfile
+import time
+import tracemalloc
 import joblib
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
+import numpy as np
+from scipy.stats import randint, loguniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401  启用 HalvingRandomSearchCV
+from sklearn.model_selection import train_test_split, KFold, HalvingRandomSearchCV
+from sklearn.linear_model import LinearRegression, Ridge, SGDRegressor
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.metrics import mean_squared_error
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.pipeline import Pipeline
+from DataPreprocessor import DataPreprocessor, NATIVE_CATEGORICAL_FEATURES
+
+
+def _hgb_model():
+    """
+    直方图梯度提升：特征先分到至多 255 个区间再建树，训练使用多线程；房型、朝向按类别处理（需配合
+    DataPreprocessor(native_categorical=True)，这两列在最前面）；留出 10% 的训练数据，验证误差连续 10 轮
+    不再下降时停止增加树
+    """
+    return HistGradientBoostingRegressor(categorical_features=list(range(len(NATIVE_CATEGORICAL_FEATURES))),
+                                         max_iter=500, early_stopping=True, validation_fraction=0.1,
+                                         n_iter_no_change=10, random_state=42)
+
+
+# 自动调参的搜索空间：每个字典对应一种模型类型
+SEARCH_SPACE = [
+    # 线性模型搜索正则化强度，alpha 很小时与 LinearRegression 相同
+    {'model': [Ridge()], 'model__alpha': loguniform(1e-4, 1e2)},
+    {
+        'model': [DecisionTreeRegressor(random_state=42)],
+        'model__max_depth': [None, 5, 10, 15, 20, 30],
+        'model__min_samples_leaf': randint(1, 20),
+        'model__max_features': [None, 'sqrt', 0.5],
+    },
+    {
+        # 各候选已经在不同进程中并行，单个森林不再使用多线程
+        'model': [RandomForestRegressor(random_state=42, n_jobs=1)],
+        'model__n_estimators': [50, 100, 200],
+        'model__max_depth': [None, 10, 20, 30],
+        'model__min_samples_leaf': randint(1, 10),
+        'model__max_features': [1.0, 'sqrt', 0.5],
+    },
+    {
+        # hgb 使用自己的预处理器，其余候选使用 tune 传入的预处理器
+        'preprocessor': [DataPreprocessor(native_categorical=True).preprocessor],
+        'model': [_hgb_model()],
+        'model__learning_rate': loguniform(0.03, 0.3),
+        'model__max_leaf_nodes': randint(15, 64),
+        'model__l2_regularization': loguniform(1e-3, 10),
+    },
+]
+MODEL_TYPES = {LinearRegression: 'linear', Ridge: 'linear', DecisionTreeRegressor: 'tree',
+               RandomForestRegressor: 'forest', HistGradientBoostingRegressor: 'hgb'}
+
+
+def _plain(params):
+    """把参数中的 numpy 数值转换为 Python 数值，便于打印和写入 meta.json"""
+    return {name: value.item() if hasattr(value, 'item') else value for name, value in params.items()}
+
 
 class ModelTrainer:
     def __init__(self, model_type='linear'):
         """
         初始化模型训练器
-        :param model_type: 模型类型，支持 'linear', 'tree', 'forest'
+        :param model_type: 模型类型，支持 'linear', 'tree', 'forest', 'hgb'（需配合 DataPreprocessor(native_categorical=True)），
+                           'auto' 表示用 tune 自动选择模型和参数，
+                           'online' 为可以用 train_chunks 分块训练、逐批更新的线性模型（SGDRegressor，配合 HashingFeatures）
         """
         if model_type == 'linear':
             model = LinearRegression()
@@ -20,10 +78,27 @@ class ModelTrainer:
             model = DecisionTreeRegressor(random_state=42)
         elif model_type == 'forest':
             model = RandomForestRegressor(random_state=42)
+        elif model_type == 'hgb':
+            model = _hgb_model()
+        elif model_type == 'online':
+            # 不按 tol 判断收敛：学习率逐步下降时损失一直有波动，默认设置往往要跑满几百轮；
+            # power_t 小于默认的 0.25，学习率下降得慢一些，分块训练和增量更新时后面的数据仍有足够的影响
+            model = SGDRegressor(max_iter=20, tol=None, power_t=0.1, random_state=42)
+        elif model_type == 'auto':
+            model = None
         else:
             raise ValueError("Unsupported model type")
         self.model = model
         self.model_type = model_type
+        # 最近一次训练在测试集上的均方误差
+        self.mse = None
+        # 最近一次调参中每个候选的参数、样本数、耗时和交叉验证误差
+        self.search_results = []
+        self.best_params = None
+        # 最近一次分块训练的行数、最大分块占用的内存和 tracemalloc 统计的峰值内存（字节）
+        self.rows = 0
+        self.chunk_memory = 0
+        self.peak_memory = None
 
     def train(self, pipeline, X, y):
         """
@@ -36,10 +111,150 @@ class ModelTrainer:
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         pipeline.fit(X_train, y_train)
         y_pred = pipeline.predict(X_test)
-        mse = mean_squared_error(y_test, y_pred)
-        print(f"{self.model_type} 模型的均方误差: {mse}")
+        self.mse = mean_squared_error(y_test, y_pred)
+        print(f"{self.model_type} 模型的均方误差: {self.mse}")
         return pipeline
 
+    def train_chunks(self, pipeline, read_chunks, epochs=1, test_size=0.2, trace_memory=False):
+        """
+        分块训练在线模型：每次只有一个分块在内存中，用 partial_fit 逐块更新，峰值内存由分块大小决定，与总行数无关。
+        test_size 大于 0 时每个分块随机留出这一比例的行不参与训练，训练结束后再读一遍数据，在这些行上计算均方误差，
+        然后再用留出的行做一次 partial_fit，之后的增量更新只读取新增的房源，留出的行不能丢掉；为 0 时每个分块先用当前模型评估再学习（模型尚未训练时跳过评估），适合用新增数据更新已有模型
+        :param pipeline: 在线模型 Pipeline（预处理为 HashingFeatures），可以是未训练或已训练的
+        :param read_chunks: 无参数的函数，每次调用返回一个新的分块迭代器，每个分块为 (特征 DataFrame, 目标变量)
+        :param epochs: 遍历数据的轮数，每轮调用一次 read_chunks
+        :param test_size: 留作测试的比例
+        :param trace_memory: 是否用 tracemalloc 统计峰值内存；统计本身会使训练慢很多，只在性能对比时使用，
+                             否则只记录最大分块（DataFrame 和转换后的矩阵）占用的内存
+        :return: 训练好的Pipeline
+        """
+        preprocessor = pipeline.named_steps['preprocessor']
+        model = pipeline.named_steps['model']
+        self.rows = 0
+        self.chunk_memory = 0
+        self.peak_memory = None
+        squared_error, scored = 0.0, 0
+        tracing = tracemalloc.is_tracing()
+        if trace_memory:
+            if not tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            for epoch in range(epochs):
+                for i, (X, y) in enumerate(read_chunks()):
+                    # 每个分块的留出行由分块序号决定，各轮相同
+                    train = np.random.default_rng([42, i]).random(len(X)) >= test_size
+                    X, y = X[train], y[train]
+                    if epoch == 0:
+                        self.rows += len(X)
+                        if not test_size and hasattr(model, 'coef_'):
+                            squared_error += float(((pipeline.predict(X) - y) ** 2).sum())
+                            scored += len(X)
+                        # 均值和方差只在第一轮累计，之后各轮数据相同
+                        preprocessor.partial_fit(X)
+                    if len(X):
+                        transformed = preprocessor.transform(X)
+                        model.partial_fit(transformed, y)
+                        if epoch == 0:
+                            chunk_memory = (int(X.memory_usage(deep=True).sum()) + transformed.data.nbytes
+                                            + transformed.indices.nbytes + transformed.indptr.nbytes)
+                            self.chunk_memory = max(self.chunk_memory, chunk_memory)
+            if test_size:
+                for i, (X, y) in enumerate(read_chunks()):
+                    test = np.random.default_rng([42, i]).random(len(X)) < test_size
+                    if test.any():
+                        squared_error += float(((pipeline.predict(X[test]) - y[test]) ** 2).sum())
+                        scored += int(test.sum())
+                # 评估完成后再学习留出的行
+                for i, (X, y) in enumerate(read_chunks()):
+                    test = np.random.default_rng([42, i]).random(len(X)) < test_size
+                    if test.any():
+                        X, y = X[test], y[test]
+                        self.rows += len(X)
+                        preprocessor.partial_fit(X)
+                        model.partial_fit(preprocessor.transform(X), y)
+            if trace_memory:
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            if trace_memory and not tracing:
+                tracemalloc.stop()
+        self.mse = squared_error / scored if scored else float('nan')
+        memory = (f"峰值内存 {self.peak_memory / 2 ** 20:.1f} MB" if trace_memory
+                  else f"最大分块 {self.chunk_memory / 2 ** 20:.1f} MB")
+        print(f"{self.model_type} 模型已分块训练 {self.rows} 条数据（{epochs} 轮），"
+              f"耗时 {time.perf_counter() - start:.2f} 秒，{memory}，均方误差: {self.mse}")
+        return pipeline
+
+    def tune(self, preprocessor, X, y, n_candidates=30, cv=5, n_jobs=-1):
+        """
+        在线性回归、决策树、随机森林、直方图梯度提升及其参数中自动选择：先用少量样本评估全部候选，
+        每轮保留较好的三分之一并把样本增加到三倍，最后一轮使用全部训练数据（successive halving），
+        每个候选做 k 折交叉验证，
+        候选在 n_jobs 个进程中并行，每个进程只用一个线程（hgb 不再各自占满所有核）。
+        预处理器的拟合结果缓存在磁盘上，同一折的各候选不再重复拟合
+        :param preprocessor: 未拟合的预处理器
+        :param X: 特征数据
+        :param y: 目标变量
+        :param n_candidates: 第一轮的候选数
+        :param cv: 交叉验证折数
+        :param n_jobs: 并行进程数，-1 表示使用全部核
+        :return: 用全部训练数据重新拟合的最佳Pipeline
+        """
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        cache_dir = tempfile.mkdtemp(prefix='model_tune_')
+        try:
+            pipeline = Pipeline([
+                ('preprocessor', preprocessor),
+                ('model', LinearRegression())
+            ], memory=joblib.Memory(cache_dir, verbose=0))
+            search = HalvingRandomSearchCV(pipeline, SEARCH_SPACE, n_candidates=n_candidates, factor=3,
+                                           min_resources='exhaust',
+                                           cv=KFold(n_splits=cv, shuffle=True, random_state=42),
+                                           scoring='neg_mean_squared_error', n_jobs=n_jobs,
+                                           random_state=42, refit=True)
+            # 并行的每个进程限制为一个线程，总线程数不超过 n_jobs
+            with joblib.parallel_config(backend='loky', inner_max_num_threads=1):
+                search.fit(X_train, y_train)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        results = search.cv_results_
+        self.search_results = sorted((
+            {
+                'model_type': MODEL_TYPES[type(params['model'])],
+                'params': _plain({name[len('model__'):]: value for name, value in params.items()
+                                  if name.startswith('model__')}),
+                'iteration': int(iteration),
+                'n_samples': int(n_samples),
+                'fit_seconds': float(fit_time),
+                'score_seconds': float(score_time),
+                'cv_mse': float(-score),
+            }
+            for params, iteration, n_samples, fit_time, score_time, score in zip(
+                results['params'], results['iter'], results['n_resources'], results['mean_fit_time'],
+                results['mean_score_time'], results['mean_test_score'])
+        ), key=lambda result: (-result['iteration'], result['cv_mse']))
+
+        best = search.best_estimator_
+        # 缓存目录已删除，保存的模型不再引用它
+        best.set_params(memory=None)
+        self.model = best.named_steps['model']
+        self.model_type = MODEL_TYPES[type(self.model)]
+        self.best_params = _plain({name[len('model__'):]: value for name, value in search.best_params_.items()
+                                   if name.startswith('model__')})
+        self.mse = mean_squared_error(y_test, best.predict(X_test))
+        self.report_search()
+        print(f"最佳模型: {self.model_type} {self.best_params}，测试集均方误差: {self.mse}")
+        return best
+
+    def report_search(self):
+        """打印每个候选的参数、使用的样本数、平均拟合耗时和交叉验证均方误差"""
+        print(f"{'轮次':<6}{'模型':<8}{'样本数':>8}{'拟合耗时':>12}{'交叉验证MSE':>16}  参数")
+        for result in self.search_results:
+            print(f"{result['iteration']:<6}{result['model_type']:<8}{result['n_samples']:>8}"
+                  f"{result['fit_seconds']:>10.3f} s{result['cv_mse']:>16.2f}  {result['params']}")
+
     def save_model(self, pipeline, filename):
         """
         保存训练好的Pipeline
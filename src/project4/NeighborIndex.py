@@ -0,0 +1,314 @@
+# NeighborIndex.py
+
+import os
+import sqlite3
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+from sklearn.preprocessing import OneHotEncoder
+from DataPreprocessor import DataPreprocessor
+
+FEATURE_COLUMNS = ['room_type', 'orientation', 'floor', 'area', 'build_year']
+# 增量部分超过该行数，且超过主索引行数的 REBUILD_RATIO 时，合并进主索引
+REBUILD_MIN_ROWS = 10000
+REBUILD_RATIO = 0.05
+# 主索引中行数不少于该值的组建立 KD 树，较小的组直接逐行计算
+TREE_MIN_ROWS = 2000
+
+
+def _dense(X):
+    X = X.toarray() if hasattr(X, 'toarray') else np.asarray(X)
+    return X.astype(np.float32)
+
+
+def _categorical_layout(preprocessor):
+    """
+    :return: (独热编码的输入列, 独热编码在输出中所占列的布尔掩码)
+    """
+    columns = []
+    mask = np.zeros(max(indices.stop for indices in preprocessor.output_indices_.values()), dtype=bool)
+    for name, transformer, transformer_columns in preprocessor.transformers_:
+        if isinstance(transformer, OneHotEncoder):
+            columns.extend(transformer_columns)
+            mask[preprocessor.output_indices_[name]] = True
+    return columns, mask
+
+
+def _ranges(starts, stops):
+    """把多个 [start, stop) 区间拼接成一个下标数组"""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return np.arange(total, dtype=np.int64) + offsets
+
+
+def _segment(row_ids, codes, keys, patterns, numeric):
+    """
+    按组排列的一段索引：第 g 组的房源独热编码相同（patterns[g]），
+    其 rowid 和数值特征位于 starts[g]:starts[g + 1]
+    """
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(keys))
+    patterns = np.ascontiguousarray(patterns, dtype=np.float32)
+    return {
+        'keys': list(keys),
+        'patterns': patterns,
+        'pattern_norms': (patterns ** 2).sum(axis=1),
+        'starts': np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        'row_ids': np.asarray(row_ids, dtype=np.int64)[order],
+        'numeric': np.ascontiguousarray(numeric[order], dtype=np.float32),
+    }
+
+
+def _combine(first, second):
+    """合并两段索引，类别组合相同的组合并为一组，不需要重新转换数据"""
+    groups = {key: group for group, key in enumerate(first['keys'])}
+    keys = list(first['keys'])
+    new_patterns = []
+    mapping = np.empty(len(second['keys']), dtype=np.int64)
+    for group, key in enumerate(second['keys']):
+        if key not in groups:
+            groups[key] = len(keys)
+            keys.append(key)
+            new_patterns.append(second['patterns'][group])
+        mapping[group] = groups[key]
+    codes = np.concatenate((np.repeat(np.arange(len(first['keys'])), np.diff(first['starts'])),
+                            np.repeat(mapping, np.diff(second['starts']))))
+    patterns = np.vstack([first['patterns']] + new_patterns) if new_patterns else first['patterns']
+    return _segment(np.concatenate((first['row_ids'], second['row_ids'])), codes, keys, patterns,
+                    np.concatenate((first['numeric'], second['numeric'])))
+
+
+def _dump(obj, path):
+    # 先写临时文件再替换，查询方不会读到写了一半的文件
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(obj, temp_path)
+    os.replace(temp_path, path)
+
+
+class NeighborIndex:
+    def __init__(self, city_name, models_dir='models', db_path=None):
+        """
+        相似房源索引：在训练模型时建立，与 models/{city}_pipeline.joblib 保存在一起，
+        查询时用内存映射加载，不需要读取整张表或重新转换全部数据。
+        距离与预处理器输出空间中的欧氏距离一致：房源按独热编码的类别组合分组，
+        先计算查询与各组的类别距离，再由近到远只在需要的组内比较数值特征
+        :param city_name: 城市代码
+        :param models_dir: 模型目录
+        :param db_path: 数据库文件，默认 {city_name}_house_data.db
+        """
+        self.city_name = city_name
+        self.db_path = db_path or f"{city_name}_house_data.db"
+        self.pipeline_path = os.path.join(models_dir, f"{city_name}_pipeline.joblib")
+        self.path = os.path.join(models_dir, f"{city_name}_neighbors.joblib")
+        self.delta_path = os.path.join(models_dir, f"{city_name}_neighbors_delta.joblib")
+        self._base = None
+        self._delta = None
+        self._loaded_mtimes = None
+        self._preprocessor = None
+        self._preprocessor_mtime = None
+
+    def preprocessor(self):
+        """
+        索引所用的预处理器，即城市模型文件中的预处理器，文件更新后重新加载。
+        还没有模型文件时（只训练过 online 或 hgb 模型），使用在整张表上拟合的默认 DataPreprocessor，
+        它随索引一起保存，之后的查询和增量更新继续使用它。表中还没有房源时无法拟合，返回 None
+        """
+        if not os.path.exists(self.pipeline_path):
+            if self.load() and 'preprocessor' in self._base:
+                return self._base['preprocessor']
+            df = self._read_rows()
+            if df.empty:
+                return None
+            return DataPreprocessor().preprocessor.fit(df[FEATURE_COLUMNS])
+        mtime = os.path.getmtime(self.pipeline_path)
+        if mtime != self._preprocessor_mtime:
+            self._preprocessor = joblib.load(self.pipeline_path, mmap_mode='r').named_steps['preprocessor']
+            self._preprocessor_mtime = mtime
+        return self._preprocessor
+
+    def _read_rows(self, since_rowid=0):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            df = pd.read_sql_query(f"SELECT rowid AS row_id, {', '.join(FEATURE_COLUMNS)} FROM houses "
+                                   "WHERE rowid > ? ORDER BY rowid", conn, params=(since_rowid,))
+        finally:
+            conn.close()
+        return df
+
+    def _encode(self, preprocessor, df):
+        """
+        转换数据并分组，去掉数值特征缺失（无法计算距离）的行
+        :return: 一段索引
+        """
+        columns, mask = _categorical_layout(preprocessor)
+        if df.empty:
+            return _segment([], np.empty(0, dtype=np.int64), [], np.zeros((0, mask.sum())),
+                            np.zeros((0, (~mask).sum())))
+        numeric = _dense(preprocessor.transform(df[FEATURE_COLUMNS])[:, np.flatnonzero(~mask)])
+        valid = np.isfinite(numeric).all(axis=1)
+        df, numeric = df[valid], numeric[valid]
+
+        if not columns:
+            # 没有独热编码的特征时所有房源为一组
+            codes = np.zeros(len(df), dtype=np.int64)
+            first_rows = df.head(1)
+        else:
+            # 类别取值相同的行独热编码也相同，每组只需转换一行
+            grouped = df.groupby(columns, sort=False, dropna=False)
+            codes = grouped.ngroup().to_numpy()
+            first_rows = grouped.head(1)
+        patterns = _dense(preprocessor.transform(first_rows[FEATURE_COLUMNS])[:, np.flatnonzero(mask)])
+        keys = list(first_rows[columns].itertuples(index=False, name=None)) if columns else [()]
+        return _segment(df['row_id'].to_numpy(), codes, keys, patterns, numeric)
+
+    def build(self, preprocessor):
+        """
+        从数据库重新建立索引
+        :param preprocessor: 训练好的预处理器（Pipeline 中的 'preprocessor'）
+        :return: 索引的行数
+        """
+        df = self._read_rows()
+        max_rowid = int(df['row_id'].max()) if not df.empty else 0
+        base = self._encode(preprocessor, df)
+        if not os.path.exists(self.pipeline_path):
+            base['preprocessor'] = preprocessor
+        self._write_base(base, max_rowid)
+        return len(base['row_ids'])
+
+    def _write_base(self, base, max_rowid):
+        starts = base['starts']
+        base['trees'] = [KDTree(base['numeric'][start:stop]) if stop - start >= TREE_MIN_ROWS else None
+                         for start, stop in zip(starts[:-1], starts[1:])]
+        base['token'] = time.time_ns()
+        base['max_rowid'] = max_rowid
+        base['pipeline_mtime'] = os.path.getmtime(self.pipeline_path) if os.path.exists(self.pipeline_path) else None
+        _dump(base, self.path)
+        if os.path.exists(self.delta_path):
+            os.remove(self.delta_path)
+        self._loaded_mtimes = None
+
+    def update(self, preprocessor=None):
+        """
+        把数据库中新保存的房源追加到索引的增量部分，增量较多时合并进主索引
+        :param preprocessor: 预处理器，默认从模型文件中加载
+        :return: 新追加的行数；还没有与当前模型对应的索引时返回 0
+        """
+        if not self.load():
+            return 0
+        base, delta = self._base, self._delta
+        df = self._read_rows(delta['max_rowid'] if delta is not None else base['max_rowid'])
+        if df.empty:
+            return 0
+        segment = self._encode(preprocessor or self.preprocessor(), df)
+        if delta is not None:
+            segment = _combine(delta, segment)
+        max_rowid = int(df['row_id'].max())
+
+        if len(segment['row_ids']) > max(REBUILD_MIN_ROWS, REBUILD_RATIO * len(base['row_ids'])):
+            merged = _combine(base, segment)
+            if 'preprocessor' in base:
+                merged['preprocessor'] = base['preprocessor']
+            self._write_base(merged, max_rowid)
+        else:
+            segment['base_token'] = base['token']
+            segment['max_rowid'] = max_rowid
+            _dump(segment, self.delta_path)
+            self._loaded_mtimes = None
+        return len(df)
+
+    def load(self):
+        """
+        以内存映射方式加载索引，文件有变化时重新加载
+        :return: 索引是否可用（存在且与当前模型文件一致）
+        """
+        try:
+            mtimes = (os.path.getmtime(self.path),
+                      os.path.getmtime(self.delta_path) if os.path.exists(self.delta_path) else None)
+        except OSError:
+            return False
+        if mtimes != self._loaded_mtimes:
+            self._base = joblib.load(self.path, mmap_mode='r')
+            self._delta = joblib.load(self.delta_path, mmap_mode='r') if mtimes[1] is not None else None
+            if self._delta is not None and self._delta['base_token'] != self._base['token']:
+                # 增量部分属于旧的主索引
+                self._delta = None
+            self._loaded_mtimes = mtimes
+        pipeline_mtime = os.path.getmtime(self.pipeline_path) if os.path.exists(self.pipeline_path) else None
+        return self._base['pipeline_mtime'] == pipeline_mtime
+
+    def query(self, input_df, preprocessor, k=5):
+        """
+        查找最相似的 k 个房源
+        :param input_df: 包含特征列的一行 DataFrame
+        :param preprocessor: 训练好的预处理器
+        :return: (rowid 数组, 距离数组)，按距离从近到远
+        """
+        _, mask = _categorical_layout(preprocessor)
+        X = _dense(preprocessor.transform(input_df[FEATURE_COLUMNS]))[0]
+        query_categorical, query_numeric = X[mask], X[~mask]
+
+        best_ids = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float32)
+        for segment in (self._base, self._delta):
+            if segment is None:
+                continue
+            # 按类别距离由近到远逐层处理，该层的类别距离已超过当前第 k 近的距离时停止
+            # |p - q|² = |p|² + |q|² - 2p·q，用矩阵乘法代替逐组相减
+            group_distances = (segment['pattern_norms'] + query_categorical @ query_categorical
+                               - 2 * (segment['patterns'] @ query_categorical))
+            starts = segment['starts']
+            for level in np.unique(group_distances):
+                if len(best_distances) == k and level > best_distances.max():
+                    break
+                groups = np.flatnonzero(group_distances == level)
+                trees = segment.get('trees')
+                large = [group for group in groups if trees is not None and trees[group] is not None]
+                # 大的组用 KD 树查询组内最近的 k 个
+                for group in large:
+                    distances, positions = trees[group].query(query_numeric[None], k=min(k, len(trees[group].data)))
+                    best_ids = np.concatenate((best_ids, segment['row_ids'][starts[group] + positions[0]]))
+                    best_distances = np.concatenate((best_distances, level + distances[0] ** 2))
+                if large:
+                    groups = np.setdiff1d(groups, large)
+                rows = _ranges(starts[groups], starts[groups + 1])
+                distances = level + ((segment['numeric'][rows] - query_numeric) ** 2).sum(axis=1)
+                best_ids = np.concatenate((best_ids, segment['row_ids'][rows]))
+                best_distances = np.concatenate((best_distances, distances))
+                if len(best_distances) > k:
+                    top = np.argpartition(best_distances, k - 1)[:k]
+                    best_ids, best_distances = best_ids[top], best_distances[top]
+
+        order = np.argsort(best_distances, kind='stable')
+        return best_ids[order], np.sqrt(best_distances[order])
+
+    def fetch(self, row_ids):
+        """按 rowid 从数据库读取房源，顺序与 row_ids 一致"""
+        row_ids = [int(row_id) for row_id in row_ids]
+        conn = sqlite3.connect(self.db_path)
+        try:
+            df = pd.read_sql_query(f"SELECT rowid AS row_id, * FROM houses WHERE rowid IN ({', '.join('?' * len(row_ids))})",
+                                   conn, params=row_ids)
+        finally:
+            conn.close()
+        return df.set_index('row_id').loc[row_ids].reset_index(drop=True)
+
+    def similar_houses(self, input_df, k=5):
+        """
+        查找相似房源；索引不存在或模型已重新训练时先从数据库重新建立
+        :return: 相似房源的 DataFrame
+        """
+        preprocessor = self.preprocessor()
+        if preprocessor is None:
+            # 城市还没有房源
+            return self.fetch([])
+        if not self.load():
+            print(f"正在建立 {self.city_name} 的相似房源索引 ...")
+            self.build(preprocessor)
+            self.load()
+        row_ids, _ = self.query(input_df, preprocessor, k)
+        return self.fetch(row_ids)
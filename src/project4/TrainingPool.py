@@ -0,0 +1,315 @@
+# TrainingPool.py
+
+import itertools
+import multiprocessing
+import os
+import time
+from collections import deque
+
+FEATURE_COLUMNS = ['room_type', 'orientation', 'floor', 'area', 'build_year']
+# 分块训练时每块的行数，决定峰值内存
+CHUNK_ROWS = 20000
+# 在线模型从头训练时遍历数据的轮数：至少 ONLINE_EPOCHS 轮，数据少时增加轮数，
+# 使单样本更新次数不少于 ONLINE_MIN_UPDATES，但不超过 ONLINE_MAX_EPOCHS 轮
+ONLINE_EPOCHS = 5
+ONLINE_MIN_UPDATES = 300000
+ONLINE_MAX_EPOCHS = 100
+
+# 训练任务的状态
+PENDING = '等待中'
+RUNNING = '训练中'
+DONE = '完成'
+FAILED = '失败'
+CANCELLED = '已取消'
+
+
+def read_chunks(db_path, first_rowid, last_rowid, chunk_rows=CHUNK_ROWS):
+    """
+    分块读取 rowid 在 (first_rowid, last_rowid] 范围内的房源，每次只有一个分块在内存中
+    :return: 分块迭代器，每个分块为 (特征 DataFrame, 价格)
+    """
+    import sqlite3
+    import pandas as pd
+
+    db_connection = sqlite3.connect(db_path)
+    try:
+        # sqlite3 的游标按 chunksize 逐批取回结果，不会一次读入整张表
+        for chunk in pd.read_sql_query(f"SELECT {', '.join(FEATURE_COLUMNS)}, price FROM houses "
+                                       "WHERE rowid > ? AND rowid <= ? ORDER BY rowid", db_connection,
+                                       params=(first_rowid, last_rowid), chunksize=chunk_rows):
+            yield chunk[FEATURE_COLUMNS], chunk['price']
+    finally:
+        db_connection.close()
+
+
+def train_online(city_name, conn):
+    """
+    训练或更新在线模型：已有模型时只读取上次之后新增的房源，没有时分块读取整张表训练多轮
+    """
+    import sqlite3
+    from sklearn.pipeline import Pipeline
+    from FeatureExtractor import HashingFeatures
+    from ModelTrainer import ModelTrainer
+    from ModelRegistry import ModelRegistry
+
+    registry = ModelRegistry()
+    # 完整读入内存，增量更新会修改模型中的数组
+    pipeline, previous = registry.load(city_name, 'online', mmap=False)
+    first_rowid = previous['max_rowid'] if previous else 0
+
+    conn.send(('progress', 5, "统计新增数据" if previous else "统计数据"))
+    db_path = f"{city_name}_house_data.db"
+    db_connection = sqlite3.connect(db_path)
+    # 先确定范围，训练期间新保存的房源留给下一次更新，各轮读取的数据相同
+    count, last_rowid = db_connection.execute("SELECT COUNT(*), MAX(rowid) FROM houses WHERE rowid > ?",
+                                              (first_rowid,)).fetchone()
+    db_connection.close()
+    if previous and not count:
+        conn.send(('done', previous['mse'], f"v{previous['version']}（没有新数据）"))
+        return
+    if not count:
+        conn.send(('error', "数据库中没有数据可以用于训练！"))
+        return
+
+    trainer = ModelTrainer(model_type='online')
+    start = time.perf_counter()
+    if previous:
+        conn.send(('progress', 20, f"用 {count} 条新数据更新"))
+        trained_pipeline = trainer.train_chunks(pipeline, lambda: read_chunks(db_path, first_rowid, last_rowid),
+                                                test_size=0)
+        rows = previous['rows'] + count
+    else:
+        epochs = min(max(ONLINE_EPOCHS, -(-ONLINE_MIN_UPDATES // count)), ONLINE_MAX_EPOCHS)
+        conn.send(('progress', 20, f"分块训练 {count} 条数据，{epochs} 轮"))
+        pipeline = Pipeline([
+            ('preprocessor', HashingFeatures()),
+            ('model', trainer.model)
+        ])
+        trained_pipeline = trainer.train_chunks(pipeline, lambda: read_chunks(db_path, first_rowid, last_rowid),
+                                                epochs=epochs)
+        rows = count
+    train_seconds = time.perf_counter() - start
+
+    conn.send(('progress', 90, "保存模型"))
+    # 记录已经学习到的位置，下次只读取之后的房源；在线模型频繁更新，不替换城市的模型副本
+    extra = {'max_rowid': last_rowid, 'update_rows': count,
+             'chunk_memory_mb': round(trainer.chunk_memory / 2 ** 20, 1)}
+    meta = registry.save(trained_pipeline, city_name, 'online', rows, trainer.mse, train_seconds, extra,
+                         update_legacy=False)
+    print(f"模型已保存为 {city_name} online v{meta['version']}")
+    conn.send(('done', trainer.mse, f"v{meta['version']}"))
+
+
+def train_job(city_name, model_type, conn, n_jobs=1):
+    """
+    在子进程中训练并保存一个模型，通过 conn 回报进度
+    :param city_name: 城市代码，读取 {city_name}_house_data.db
+    :param model_type: 模型类型，'auto' 表示自动调参，'online' 见 train_online
+    :param conn: Pipe 的发送端，发送 ('progress', 百分比, 说明) / ('done', mse, 模型版本) / ('error', 说明)
+    :param n_jobs: 分配给任务的核数，由训练池按空闲的核数分配：自动调参时为交叉验证的并行进程数，
+                   训练本身（如 hgb 的 OpenMP 线程）使用的线程数也不超过它
+    """
+    try:
+        if model_type == 'online':
+            train_online(city_name, conn)
+            return
+
+        # 在子进程中导入，主进程启动时不必加载 sklearn
+        import sqlite3
+        import pandas as pd
+        from sklearn.pipeline import Pipeline
+        from threadpoolctl import threadpool_limits
+        from DataPreprocessor import DataPreprocessor
+        from ModelTrainer import ModelTrainer
+        from ModelRegistry import ModelRegistry
+        from NeighborIndex import NeighborIndex
+
+        conn.send(('progress', 5, "读取数据"))
+        db_path = f"{city_name}_house_data.db"
+        db_connection = sqlite3.connect(db_path)
+        df = pd.read_sql_query("SELECT * FROM houses", db_connection)
+        db_connection.close()
+        if df.empty:
+            conn.send(('error', "数据库中没有数据可以用于训练！"))
+            return
+
+        trainer = ModelTrainer(model_type=model_type)
+        extra = None
+        start = time.perf_counter()
+        # hgb 等模型默认使用所有核的线程，限制在分配给任务的核数内，不与其他任务争抢
+        with threadpool_limits(limits=n_jobs):
+            if model_type == 'auto':
+                conn.send(('progress', 20, f"用 {len(df)} 条数据自动调参"))
+                trained_pipeline = trainer.tune(DataPreprocessor().preprocessor, df[FEATURE_COLUMNS],
+                                                df['price'], n_jobs=n_jobs)
+                # 仍保存在 auto 下，meta.json 记录选出的模型和参数
+                extra = {'best_model': trainer.model_type, 'best_params': trainer.best_params,
+                         'candidates': len(trainer.search_results)}
+            else:
+                conn.send(('progress', 20, f"训练 {len(df)} 条数据"))
+                pipeline = Pipeline([
+                    ('preprocessor', DataPreprocessor(native_categorical=model_type == 'hgb').preprocessor),
+                    ('model', trainer.model)
+                ])
+                trained_pipeline = trainer.train(pipeline, df[FEATURE_COLUMNS], df['price'])
+        train_seconds = time.perf_counter() - start
+        # hgb 的预处理器输出类别编码和未标准化的数值，不能用来计算相似房源的距离，
+        # 因此不替换城市的模型副本，也不重建索引（自动调参选出 hgb 时同样如此）
+        publish = trainer.model_type != 'hgb'
+
+        conn.send(('progress', 90, "保存模型"))
+        # 新版本写完 meta.json 后才可见，取消或失败时不会留下可用的半成品
+        meta = ModelRegistry().save(trained_pipeline, city_name, model_type, len(df), trainer.mse, train_seconds,
+                                    extra, update_legacy=publish)
+        print(f"模型已保存为 {city_name} {model_type} v{meta['version']}")
+
+        neighbor_index = NeighborIndex(city_name)
+        if publish:
+            # 相似房源索引依赖训练好的预处理器，随模型一起重建
+            conn.send(('progress', 95, "建立相似房源索引"))
+            neighbor_index.build(trained_pipeline.named_steps['preprocessor'])
+        elif not neighbor_index.load():
+            # 城市还没有可用的索引（例如只训练过 hgb），用默认预处理器建立，预测时不必等待；
+            # 训练期间房源被清空时无法拟合默认预处理器，留到有数据后查询时再建立
+            preprocessor = neighbor_index.preprocessor()
+            if preprocessor is not None:
+                conn.send(('progress', 95, "建立相似房源索引"))
+                neighbor_index.build(preprocessor)
+        version = f"v{meta['version']}（{trainer.model_type}）" if model_type == 'auto' else f"v{meta['version']}"
+        conn.send(('done', trainer.mse, version))
+    except Exception as e:
+        conn.send(('error', str(e)))
+    finally:
+        conn.close()
+
+
+class TrainingJob:
+    def __init__(self, job_id, city_name, model_type):
+        self.job_id = job_id
+        self.city_name = city_name
+        self.model_type = model_type
+        self.status = PENDING
+        self.progress = 0
+        self.message = ""
+        self.mse = None
+        # 占用的核数：自动调参在子进程中再并行交叉验证，hgb 使用多线程，都占用多个核
+        self.n_jobs = 1
+        self.process = None
+        self.conn = None
+
+
+class TrainingPool:
+    def __init__(self, max_workers=None):
+        """
+        在独立进程中训练模型，不受 GIL 影响，也不阻塞界面；同时运行的进程数不超过 max_workers，
+        多出的任务排队等待。由界面定时调用 poll 推进任务并取回进度
+        :param max_workers: 同时占用的核数上限，默认为 CPU 核数；自动调参的任务占用启动时所有空闲的核
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # spawn 启动的子进程不继承 Tk 等主进程状态，在各平台上行为一致
+        self.context = multiprocessing.get_context('spawn')
+        self.jobs = {}
+        self._pending = deque()
+        self._ids = itertools.count(1)
+
+    def submit(self, city_name, model_type):
+        """
+        提交训练任务
+        :return: TrainingJob
+        """
+        job = TrainingJob(next(self._ids), city_name, model_type)
+        self.jobs[job.job_id] = job
+        self._pending.append(job)
+        self._start_pending()
+        return job
+
+    def cancel(self, job_id):
+        """取消排队中的任务，或终止正在训练的进程"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in (PENDING, RUNNING):
+            return
+        if job.status == PENDING:
+            self._pending.remove(job)
+        else:
+            job.process.terminate()
+            job.process.join()
+            job.conn.close()
+            self._remove_temp_files(job)
+        job.status = CANCELLED
+        job.message = ""
+        self._start_pending()
+
+    def shutdown(self):
+        """终止所有任务，退出程序时调用"""
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    @property
+    def running(self):
+        return [job for job in self.jobs.values() if job.status == RUNNING]
+
+    def _start_pending(self):
+        for job in list(self._pending):
+            running = self.running
+            # 按占用的核数而不是进程数计算，自动调参不会与其他任务叠加出核数平方个进程
+            free = self.max_workers - sum(other.n_jobs for other in running)
+            if free <= 0:
+                break
+            # 同一城市、同一模型的任务依次执行，在线模型的增量更新不会基于同一个旧版本重复进行
+            if any((other.city_name, other.model_type) == (job.city_name, job.model_type) for other in running):
+                continue
+            self._pending.remove(job)
+            # 自动调参在多个进程中交叉验证，hgb 训练使用多线程，都占用启动时所有空闲的核
+            job.n_jobs = free if job.model_type in ('auto', 'hgb') else 1
+            receiver, sender = self.context.Pipe(duplex=False)
+            job.process = self.context.Process(target=train_job,
+                                               args=(job.city_name, job.model_type, sender, job.n_jobs), daemon=True)
+            job.process.start()
+            # 子进程持有发送端的副本，关闭本进程中的这一端，子进程退出后接收端才能读到结束
+            sender.close()
+            job.conn = receiver
+            job.status = RUNNING
+            job.message = "启动中"
+
+    @staticmethod
+    def _remove_temp_files(job):
+        """清理被终止或失败的进程写到一半的模型文件，已有的模型不受影响"""
+        from ModelRegistry import ModelRegistry
+
+        ModelRegistry().remove_temp_files(job.process.pid)
+
+    def poll(self):
+        """
+        读取各任务的进度并回收结束的进程
+        :return: 本次检查的任务列表（调用前处于训练中的任务）
+        """
+        changed = []
+        for job in self.running:
+            finished = False
+            try:
+                while not finished and job.conn.poll():
+                    message = job.conn.recv()
+                    if message[0] == 'progress':
+                        _, job.progress, job.message = message
+                    elif message[0] == 'done':
+                        _, job.mse, job.message = message
+                        job.progress = 100
+                        job.status = DONE
+                        finished = True
+                    elif message[0] == 'error':
+                        job.message = message[1]
+                        job.status = FAILED
+                        finished = True
+            except EOFError:
+                # 进程没有回报结果就退出了（例如被系统终止）
+                job.status = FAILED
+                job.message = f"训练进程异常退出（退出码 {job.process.exitcode}）"
+                finished = True
+            if finished:
+                job.process.join()
+                job.conn.close()
+                if job.status == FAILED:
+                    self._remove_temp_files(job)
+            changed.append(job)
+        self._start_pending()
+        return changed
@@ -0,0 +1,217 @@
+# VirtualTable.py
+
+import re
+import tkinter as tk
+from tkinter import ttk
+
+# 以数字开头的文本（如 "91㎡"、"360万"、"2010年建"）按数值排序
+_LEADING_NUMBER = re.compile(r'\s*(-?\d+(\.\d+)?)')
+
+
+def _numeric_key(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _LEADING_NUMBER.match(str(value))
+    return float(match.group(1)) if match else None
+
+
+class TableModel:
+    """
+    虚拟表格的数据部分：按列保存数据，维护显示顺序和可见窗口的位置，不依赖 Tk
+    """
+
+    def __init__(self, column_count, height):
+        """
+        :param column_count: 列数
+        :param height: 可见行数
+        """
+        self.column_count = column_count
+        self.height = height
+        self._columns = [[] for _ in range(column_count)]  # 按列保存的数据
+        self._order = []  # 显示顺序：第 i 行显示 self._order[i] 号数据
+        self._sort_keys = {}  # 列号 -> 排序键，数据变化时清空
+        self.sorted_by = None  # (列号, 是否降序)
+        self.offset = 0  # 可见窗口第一行在显示顺序中的位置
+
+    def __len__(self):
+        return len(self._order)
+
+    def set_columns(self, columns):
+        """用按列组织的数据替换全部内容，columns[i] 为第 i 列的全部值"""
+        if len(columns) != self.column_count:
+            raise ValueError("列数与表头不一致")
+        self._columns = [list(column) for column in columns]
+        self._order = list(range(len(self._columns[0]) if self._columns else 0))
+        self._sort_keys.clear()
+        self.sorted_by = None
+        self.offset = 0
+
+    def append_rows(self, rows):
+        """
+        在末尾追加行；已按某列排序时，新行仍显示在末尾，直到再次排序
+        :return: 追加的行数
+        """
+        start = len(self._columns[0])
+        count = 0
+        for row in rows:
+            for column, value in zip(self._columns, row):
+                column.append(value)
+            count += 1
+        if count:
+            self._order.extend(range(start, start + count))
+            self._sort_keys.clear()
+        return count
+
+    def row(self, position):
+        """返回当前显示顺序中第 position 行的数据"""
+        index = self._order[position]
+        return tuple(column[index] for column in self._columns)
+
+    def visible_rows(self):
+        """可见窗口中的行，不足一屏时只返回已有的行"""
+        return [self.row(position) for position in range(self.offset, min(self.offset + self.height, len(self)))]
+
+    def sort_by(self, column_index, descending=False):
+        """按列排序：数值列按数值，其余按文本，复杂度 O(n log n)"""
+        keys = self._sort_key(column_index)
+        self._order.sort(key=keys.__getitem__, reverse=descending)
+        self.sorted_by = (column_index, descending)
+
+    def scroll(self, rows):
+        """移动可见窗口，不超出数据范围"""
+        self.offset = min(max(self.offset + rows, 0), max(len(self._order) - self.height, 0))
+
+    def _sort_key(self, column_index):
+        keys = self._sort_keys.get(column_index)
+        if keys is None:
+            column = self._columns[column_index]
+            numbers = [_numeric_key(value) for value in column]
+            if all(number is not None or value in (None, '') for number, value in zip(numbers, column)):
+                # 空值排在最后
+                keys = [(number is None, number or 0.0) for number in numbers]
+            else:
+                keys = [(value is None, str(value) if value is not None else '') for value in column]
+            self._sort_keys[column_index] = keys
+        return keys
+
+
+class VirtualTable(tk.Frame):
+    """
+    虚拟表格：数据按列保存在内存中（TableModel），Treeview 只保留一屏的行，
+    滚动时更新这些行的内容而不是插入/删除行；点击表头按该列排序，只重排行号，不重建控件
+    """
+
+    def __init__(self, master, columns, widths=None, height=15, **kwargs):
+        """
+        :param master: 父控件
+        :param columns: 表头列表
+        :param widths: 各列宽度，可以是列表或 {表头: 宽度}，默认 100
+        :param height: 可见行数
+        """
+        super().__init__(master, **kwargs)
+        self.headers = list(columns)
+        self.height = height
+        self.model = TableModel(len(self.headers), height)
+
+        self.tree = ttk.Treeview(self, columns=self.headers, show="headings", height=height)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        for index, header in enumerate(self.headers):
+            if isinstance(widths, dict):
+                width = widths.get(header, 100)
+            elif widths:
+                width = widths[index]
+            else:
+                width = 100
+            self.tree.heading(header, text=header, command=lambda i=index: self.toggle_sort(i))
+            self.tree.column(header, width=width)
+        # 预先创建一屏的行，之后只更新内容
+        self._items = [self.tree.insert("", tk.END, values=()) for _ in range(height)]
+
+        for widget in (self.tree, self.scrollbar):
+            widget.bind("<MouseWheel>", self._on_mousewheel)
+            widget.bind("<Button-4>", lambda e: self.scroll(-3))
+            widget.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Up>", lambda e: self._on_key(-1))
+        self.tree.bind("<Down>", lambda e: self._on_key(1))
+        self.tree.bind("<Prior>", lambda e: self._on_key(-self.height))
+        self.tree.bind("<Next>", lambda e: self._on_key(self.height))
+        self._render()
+
+    def __len__(self):
+        return len(self.model)
+
+    def set_rows(self, rows):
+        """用行数据（元组序列）替换表格内容"""
+        rows = list(rows)
+        columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in self.headers]
+        self.set_columns(columns)
+
+    def set_columns(self, columns):
+        """用按列组织的数据替换表格内容，columns[i] 为第 i 列的全部值"""
+        self.model.set_columns(columns)
+        self._update_headings()
+        self._render()
+
+    def append_rows(self, rows):
+        """在末尾追加行；已按某列排序时，新行仍显示在末尾，直到再次排序"""
+        if self.model.append_rows(rows):
+            self._render()
+
+    def clear(self):
+        self.set_columns([[] for _ in self.headers])
+
+    def row(self, position):
+        """返回当前显示顺序中第 position 行的数据"""
+        return self.model.row(position)
+
+    def sort_by(self, column_index, descending=False):
+        """按列排序：数值列按数值，其余按文本，复杂度 O(n log n)"""
+        self.model.sort_by(column_index, descending)
+        self._update_headings()
+        self._render()
+
+    def toggle_sort(self, column_index):
+        descending = self.model.sorted_by == (column_index, False)
+        self.sort_by(column_index, descending)
+
+    def scroll(self, rows):
+        self.model.scroll(rows)
+        self._render()
+
+    def _update_headings(self):
+        sorted_by = self.model.sorted_by
+        for index, header in enumerate(self.headers):
+            text = header
+            if sorted_by and sorted_by[0] == index:
+                text += " ▼" if sorted_by[1] else " ▲"
+            self.tree.heading(header, text=text)
+
+    def _render(self):
+        rows = self.model.visible_rows()
+        for position, item in enumerate(self._items):
+            self.tree.item(item, values=rows[position] if position < len(rows) else ())
+        total = len(self.model)
+        if total > self.height:
+            self.scrollbar.set(self.model.offset / total, (self.model.offset + self.height) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.model.offset = 0
+            self.scroll(int(float(amount) * len(self.model)))
+        elif unit == "pages":
+            self.scroll(int(amount) * self.height)
+        else:
+            self.scroll(int(amount))
+
+    def _on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_key(self, rows):
+        self.scroll(rows)
+        return "break"
@@ -5,15 +5,23 @@ from tkinter import messagebox, ttk
 from WebScraper_HouseData import WebScraper_HouseData
 import sqlite3
 import os
-from DataLoader import DatabaseReader, DatabaseViewer
-from DataPreprocessor import DataPreprocessor
-from ModelTrainer import ModelTrainer
+from DataLoader import DatabaseReader, DatabaseViewer, HOUSE_COLUMNS
+from VirtualTable import VirtualTable
+from BackgroundCrawler import BackgroundCrawler
+from TrainingPool import TrainingPool, PENDING, RUNNING, DONE, FAILED
+from NeighborIndex import NeighborIndex
+from ComparablesEngine import ComparablesEngine
+from ModelRegistry import ModelRegistry
 import pandas as pd
-import joblib
 import numpy as np
 import re
-from sklearn.pipeline import Pipeline
-from sklearn.neighbors import NearestNeighbors
+
+# 每次爬取的页数
+CRAWL_PAGES = 100
+# 界面检查后台爬取进度的间隔（毫秒）
+POLL_INTERVAL_MS = 50
+# 界面检查训练进度的间隔（毫秒）
+TRAIN_POLL_INTERVAL_MS = 200
 
 class WebScraperGUI:
     def __init__(self, root):
@@ -23,9 +31,23 @@ class WebScraperGUI:
 
         # 存储爬取到的数据
         self.scraped_data = []
+        # 正在进行的后台爬取
+        self.crawler = None
+        # 爬取时已边爬边保存到数据库的城市，避免重复保存
+        self.persisted_city = None
+        # 在独立进程中训练模型，并发数不超过 CPU 核数
+        self.training_pool = TrainingPool()
+        self.training_polling = False
+        # 各城市的相似房源索引（内存映射加载）
+        self.neighbor_indexes = {}
+        # 各城市的可比房源引擎（首次使用时从数据库加载，之后只读取新增的房源）
+        self.comparables = {}
+        # 按城市和模型类型保存的模型，加载过的模型缓存在内存中
+        self.model_registry = ModelRegistry()
 
         # 创建界面元素
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def get_db_connection(self, city_name):
         db_path = f"{city_name}_house_data.db"
@@ -43,29 +65,23 @@ class WebScraperGUI:
                 owner_name TEXT,
                 address TEXT,
                 description TEXT,
-                price REAL
+                price REAL,
+                district TEXT
             )
         ''')
+        # 旧数据库没有 district 列时补上，之前保存的房源该列为空
+        columns = [row[1] for row in db_cursor.execute("PRAGMA table_info(houses)")]
+        if 'district' not in columns:
+            db_cursor.execute("ALTER TABLE houses ADD COLUMN district TEXT")
         db_connection.commit()
 
     def insert_into_db(self, db_connection, data):
         db_cursor = db_connection.cursor()
-        for item in data:
-            print(f"Inserting into DB: {item}")  # 调试信息
-            db_cursor.execute('''
-                INSERT INTO houses (room_type, area, floor, orientation, build_year, owner_name, address, description, price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                item['room_type'],
-                item['area'],
-                item['floor'],
-                item['orientation'],
-                item['build_year'],
-                item['owner_name'],
-                item['address'],
-                item['description'],
-                item['price']
-            ))
+        db_cursor.executemany('''
+            INSERT INTO houses (room_type, area, floor, orientation, build_year, owner_name, address, description, price,
+                                district)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [tuple(item[column] for column in HOUSE_COLUMNS) + (item.get('district'),) for item in data])
         db_connection.commit()
 
     def create_widgets(self):
@@ -85,13 +101,28 @@ class WebScraperGUI:
         self.model_var.set("linear")  # 默认选择线性回归
 
         self.model_dropdown = ttk.Combobox(self.root, textvariable=self.model_var, state="readonly",
-                                           values=["linear", "tree", "forest"], font=("Arial", 12))
+                                           values=["linear", "tree", "forest", "hgb", "auto", "online"],
+                                           font=("Arial", 12))
         self.model_dropdown.pack(pady=5)
 
         # 开始爬取按钮
         self.scrape_button = tk.Button(self.root, text="开始爬取", font=("Arial", 14), command=self.scrape_data)
         self.scrape_button.pack(pady=10)
 
+        # 爬取进度：进度条、页数/记录数/速度、取消按钮，以及是否边爬边保存
+        progress_frame = tk.Frame(self.root)
+        progress_frame.pack(pady=5)
+        self.progress = ttk.Progressbar(progress_frame, length=300, mode="determinate", maximum=CRAWL_PAGES)
+        self.progress.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(progress_frame, text="取消爬取", font=("Arial", 11),
+                                       command=self.cancel_scrape, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.persist_var = tk.BooleanVar(value=False)
+        self.persist_check = tk.Checkbutton(progress_frame, text="边爬边保存到数据库", variable=self.persist_var)
+        self.persist_check.pack(side=tk.LEFT, padx=5)
+        self.progress_label = tk.Label(self.root, text="", font=("Arial", 11))
+        self.progress_label.pack()
+
         # 保存到数据库按钮
         self.save_button = tk.Button(self.root, text="保存到数据库", font=("Arial", 14), command=self.save_to_db)
         self.save_button.pack(pady=10)
@@ -105,27 +136,28 @@ class WebScraperGUI:
         self.train_button = tk.Button(self.root, text="训练模型", font=("Arial", 14), command=self.train_model)
         self.train_button.pack(pady=10)
 
+        # 训练任务列表：可同时训练多个城市或模型类型
+        training_frame = tk.Frame(self.root)
+        training_frame.pack(pady=5)
+        self.training_table = ttk.Treeview(training_frame, columns=("城市", "模型", "状态", "进度", "MSE"),
+                                           show="headings", height=3)
+        for column, width in (("城市", 60), ("模型", 70), ("状态", 160), ("进度", 60), ("MSE", 120)):
+            self.training_table.heading(column, text=column)
+            self.training_table.column(column, width=width)
+        self.training_table.pack(side=tk.LEFT, padx=5)
+        self.cancel_train_button = tk.Button(training_frame, text="取消训练", font=("Arial", 11),
+                                             command=self.cancel_training)
+        self.cancel_train_button.pack(side=tk.LEFT, padx=5)
+
         # 预测价格按钮
         self.predict_button = tk.Button(self.root, text="预测价格", font=("Arial", 14), command=self.predict_price)
         self.predict_button.pack(pady=10)
 
-        # 创建表格
-        self.table = ttk.Treeview(self.root, columns=("房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"),
-                                  show="headings", height=15)
-        self.table.pack(pady=10)
-
-        # 设置表头
+        # 创建表格：只渲染可见的行，点击表头可按该列排序
         headers = ["房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"]
-        for header in headers:
-            self.table.heading(header, text=header)
-            if header == "地址":
-                self.table.column(header, width=200)
-            elif header == "描述":
-                self.table.column(header, width=300)
-            elif header == "价格":
-                self.table.column(header, width=100)
-            else:
-                self.table.column(header, width=80)
+        widths = [80, 80, 80, 80, 80, 80, 200, 300, 100]
+        self.table = VirtualTable(self.root, headers, widths=widths, height=15)
+        self.table.pack(pady=10, fill=tk.BOTH, expand=True)
 
     def get_city_url(self, city_code):
         if city_code == "bj":
@@ -139,36 +171,95 @@ class WebScraperGUI:
         if not city_code:
             messagebox.showwarning("输入错误", "城市首字母不能为空！")
             return
+        if self.crawler is not None:
+            return
 
         city_url = self.get_city_url(city_code)
-        scraper = WebScraper_HouseData(base_url=city_url, pages=100)
-
-        for row in self.table.get_children():
-            self.table.delete(row)
+        scraper = WebScraper_HouseData(base_url=city_url, pages=CRAWL_PAGES)
+
+        persist = None
+        if self.persist_var.get():
+            neighbor_index = NeighborIndex(city_code)
+
+            def persist(page_data):
+                # 在后台线程中执行，使用该线程自己的数据库连接和索引对象
+                db_connection = self.get_db_connection(city_code)
+                self.create_table(db_connection)
+                self.insert_into_db(db_connection, page_data)
+                db_connection.close()
+                neighbor_index.update()
+            self.persisted_city = city_code
+        else:
+            self.persisted_city = None
 
-        data = scraper.scrape()
-        self.scraped_data = data
+        self.table.clear()
+        self.scraped_data = []
+        self.progress.config(value=0)
+        self.progress_label.config(text=f"正在爬取 {city_code} ...")
+        self.scrape_button.config(state=tk.DISABLED)
+        self.persist_check.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+
+        self.crawler = BackgroundCrawler(scraper, persist=persist)
+        self.crawler.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_crawler)
+
+    def poll_crawler(self):
+        """在界面线程中处理后台爬取送来的每一页数据"""
+        crawler = self.crawler
+        finished = None
+        for message in crawler.poll():
+            if message[0] == 'page':
+                _, page_num, page_data = message
+                self.scraped_data.extend(page_data)
+                # 按照表格列顺序逐页追加
+                self.table.append_rows(tuple(item[column] for column in HOUSE_COLUMNS) for item in page_data)
+            elif message[0] == 'error':
+                messagebox.showerror("爬取错误", f"爬取失败: {message[1]}")
+            elif message[0] == 'done':
+                finished = message[1]
+
+        self.progress.config(value=crawler.pages_done)
+        self.progress_label.config(text=f"已爬取 {crawler.pages_done}/{CRAWL_PAGES} 页，"
+                                        f"{crawler.records} 条记录，{crawler.rate:.1f} 条/秒")
+        if finished is None:
+            self.root.after(POLL_INTERVAL_MS, self.poll_crawler)
+            return
 
-        if data:
-            for item in data:
-                print(f"插入数据库的数据: {item}")  # 调试信息
-                # 直接从字典中提取数据，按照表格列顺序填充
-                self.table.insert("", tk.END, values=(item['room_type'], item['area'], item['floor'],
-                                                      item['orientation'], item['build_year'], item['owner_name'],
-                                                      item['address'], item['description'], item['price']))
-        else:
+        self.crawler = None
+        self.scrape_button.config(state=tk.NORMAL)
+        self.persist_check.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if self.persisted_city is not None:
+            self.update_online_model(self.persisted_city)
+        if finished:
+            self.progress_label.config(text=f"已取消：保留已爬取的 {crawler.pages_done} 页，"
+                                            f"{len(self.scraped_data)} 条记录")
+        elif not self.scraped_data:
             messagebox.showinfo("爬取完成", "没有获取到任何数据。")
 
+    def cancel_scrape(self):
+        if self.crawler is not None:
+            self.crawler.cancel()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.progress_label.config(text="正在取消，等待当前页完成 ...")
+
     def save_to_db(self):
         if not self.scraped_data:
             messagebox.showwarning("没有数据", "请先爬取数据再保存到数据库！")
             return
 
         city_name = self.city_entry.get().strip().lower()
+        if self.persisted_city == city_name:
+            messagebox.showinfo("已保存", f"数据已在爬取时保存到 {city_name} 的数据库！")
+            return
         db_connection = self.get_db_connection(city_name)
         self.create_table(db_connection)
         self.insert_into_db(db_connection, self.scraped_data)
         db_connection.close()
+        # 新房源追加到已有的相似房源索引中
+        self.get_neighbor_index(city_name).update()
+        self.update_online_model(city_name)
 
         messagebox.showinfo("保存成功", f"数据已成功保存到 {city_name} 的数据库！")
 
@@ -198,40 +289,61 @@ class WebScraperGUI:
             messagebox.showwarning("数据库不存在", f"请先爬取并保存 {city_name} 的数据到数据库！")
             return
 
-        # 从数据库中读取数据
-        conn = sqlite3.connect(db_path)
-        df = pd.read_sql_query("SELECT * FROM houses", conn)
-        conn.close()
+        self.submit_training(city_name, self.model_var.get())
 
-        if df.empty:
-            messagebox.showwarning("没有数据", "数据库中没有数据可以用于训练！")
-            return
-
-        # 数据预处理
-        preprocessor = DataPreprocessor()
-
-        # 获取选择的模型类型
-        selected_model = self.model_var.get()
+    def submit_training(self, city_name, model_type):
+        # 读取数据、训练和保存都在子进程中完成，界面不会卡住
+        job = self.training_pool.submit(city_name, model_type)
+        self.training_table.insert("", tk.END, iid=str(job.job_id))
+        self.update_training_row(job)
+        if not self.training_polling:
+            self.training_polling = True
+            self.root.after(TRAIN_POLL_INTERVAL_MS, self.poll_training)
 
-        # 创建Pipeline
-        trainer = ModelTrainer(model_type=selected_model)
-        pipeline = Pipeline([
-            ('preprocessor', preprocessor.preprocessor),
-            ('model', trainer.model)
-        ])
-
-        # 训练模型
-        trained_pipeline = trainer.train(pipeline, df[['room_type', 'orientation', 'floor', 'area', 'build_year']],
-                                         df['price'])
+    def update_online_model(self, city_name):
+        """保存新房源后，用新增的房源增量更新该城市已有的在线模型"""
+        if self.model_registry.latest(city_name, 'online') is None:
+            return
+        # 已在排队的更新开始时会读取到全部新增房源，不必重复提交
+        if any(job.city_name == city_name and job.model_type == 'online' and job.status == PENDING
+               for job in self.training_pool.jobs.values()):
+            return
+        self.submit_training(city_name, 'online')
+
+    def update_training_row(self, job):
+        status = job.status
+        if job.status in (RUNNING, FAILED) and job.message:
+            status = f"{job.status}：{job.message}"
+        mse = f"{job.mse:.2f}" if job.mse is not None else ""
+        self.training_table.item(str(job.job_id), values=(job.city_name, job.model_type, status,
+                                                          f"{job.progress}%", mse))
+
+    def poll_training(self):
+        """在界面线程中读取各训练进程的进度"""
+        for job in self.training_pool.poll():
+            self.update_training_row(job)
+            if job.status == DONE:
+                messagebox.showinfo("训练完成", f"{job.city_name} 的 {job.model_type} 模型训练完成，"
+                                                f"均方误差: {job.mse:.2f}，版本: {job.message}")
+            elif job.status == FAILED:
+                messagebox.showerror("训练失败", f"{job.city_name} 的 {job.model_type} 模型训练失败: {job.message}")
+        if self.training_pool.running:
+            self.root.after(TRAIN_POLL_INTERVAL_MS, self.poll_training)
+        else:
+            self.training_polling = False
 
-        # 保存Pipeline
-        if not os.path.exists('models'):
-            os.makedirs('models')
-        pipeline_filename = f"models/{city_name}_pipeline.joblib"
-        trainer.save_model(trained_pipeline, pipeline_filename)
+    def cancel_training(self):
+        """取消表格中选中的训练任务，没有选中时取消全部"""
+        job_ids = [int(iid) for iid in self.training_table.selection()] or list(self.training_pool.jobs)
+        for job_id in job_ids:
+            self.training_pool.cancel(job_id)
+            self.update_training_row(self.training_pool.jobs[job_id])
 
-        messagebox.showinfo("训练完成",
-                            f"模型和预处理器已保存。\n模型文件: {pipeline_filename}")
+    def on_close(self):
+        if self.crawler is not None:
+            self.crawler.cancel()
+        self.training_pool.shutdown()
+        self.root.destroy()
 
     def predict_price(self):
         city_name = self.city_entry.get().strip().lower()
@@ -240,25 +352,23 @@ class WebScraperGUI:
             return
 
         selected_model = self.model_var.get()
-        pipeline_filename = f"models/{city_name}_pipeline.joblib"
-        if not os.path.exists(pipeline_filename):
-            messagebox.showwarning("模型不存在", f"请先训练 {selected_model} 模型！")
-            return
-
         try:
-            pipeline = joblib.load(pipeline_filename)
-            print(f"Loaded pipeline type: {type(pipeline)}")
-            print(f"Pipeline steps: {pipeline.named_steps}")
+            pipeline, meta = self.model_registry.load(city_name, selected_model)
         except Exception as e:
             print(f"加载模型失败: {e}")
             messagebox.showerror("加载错误", f"加载模型失败: {e}")
             return
+        if pipeline is None:
+            messagebox.showwarning("模型不存在", f"请先训练 {city_name} 的 {selected_model} 模型！")
+            return
+        print(f"使用 {city_name} {selected_model} 模型 v{meta['version']}（{meta['trained_at']} 训练，"
+              f"{meta['rows']} 条数据，MSE {meta['mse']:.2f}）")
 
         prediction_window = tk.Toplevel(self.root)
         prediction_window.title("预测价格")
-        prediction_window.geometry("400x500")
+        prediction_window.geometry("400x580")
 
-        fields = ['房型', '朝向', '楼层', '面积', '建造年份']
+        fields = ['房型', '朝向', '楼层', '面积', '建造年份', '区域（可选）']
         entries = {}
         for idx, field in enumerate(fields):
             label = tk.Label(prediction_window, text=f"请输入{field}：", font=("Arial", 12))
@@ -274,6 +384,7 @@ class WebScraperGUI:
                 floor = entries['楼层'].get().strip()
                 area_input = entries['面积'].get().strip()
                 build_year_input = entries['建造年份'].get().strip()
+                district = entries['区域（可选）'].get().strip() or None
 
                 # 使用正则表达式提取面积中的数字部分
                 area_match = re.search(r'(\d+(\.\d+)?)', area_input)
@@ -306,9 +417,10 @@ class WebScraperGUI:
                 print(f"Predicted Price: {predicted_price}")
 
                 # 查找相似房源
-                self.show_similar_houses(input_df, pipeline, city_name)
+                self.show_similar_houses(input_df, city_name, district)
 
-                messagebox.showinfo("预测结果", f"预测价格为: {predicted_price:.2f} 万元")
+                messagebox.showinfo("预测结果", f"预测价格为: {predicted_price:.2f} 万元\n"
+                                                f"模型: {selected_model} v{meta['version']}（MSE {meta['mse']:.2f}）")
             except ValueError as ve:
                 print(f"ValueError: {ve}")
                 messagebox.showerror("输入错误", f"预测失败: {ve}")
@@ -319,76 +431,53 @@ class WebScraperGUI:
         submit_btn = tk.Button(prediction_window, text="预测", font=("Arial", 12), command=submit_prediction)
         submit_btn.pack(pady=20)
 
-    def show_similar_houses(self, input_df, pipeline, city_name):
-        # 假设使用KNN查找相似房源
-        from sklearn.neighbors import NearestNeighbors
+    def get_neighbor_index(self, city_name):
+        if city_name not in self.neighbor_indexes:
+            self.neighbor_indexes[city_name] = NeighborIndex(city_name)
+        return self.neighbor_indexes[city_name]
 
-        # 加载所有数据
-        df = self.load_data(city_name)
-        if df.empty:
-            messagebox.showwarning("没有数据", "数据库中没有数据可以用于查找相似房源！")
-            return
+    def get_comparables(self, city_name):
+        if city_name not in self.comparables:
+            self.comparables[city_name] = ComparablesEngine(f"{city_name}_house_data.db")
+        return self.comparables[city_name]
 
-        # 预处理数据
-        try:
-            X = pipeline.named_steps['preprocessor'].transform(df[['room_type', 'orientation', 'floor', 'area', 'build_year']])
-        except Exception as e:
-            print(f"预处理数据失败: {e}")
-            messagebox.showerror("预处理错误", f"预处理数据失败: {e}")
+    def show_similar_houses(self, input_df, city_name, district=None):
+        if not os.path.exists(f"{city_name}_house_data.db"):
+            messagebox.showwarning("没有数据", "数据库中没有数据可以用于查找相似房源！")
             return
 
-        # 预处理输入
+        # 使用训练时建立的索引查找，只读取找到的几条房源
         try:
-            input_processed = pipeline.named_steps['preprocessor'].transform(input_df)
+            similar_houses = self.get_neighbor_index(city_name).similar_houses(input_df, k=5)
+            # 按各特征加权的混合距离在同一区域中查找可比房源
+            comparables, in_district = self.get_comparables(city_name).query(input_df, k=5, district=district)
         except Exception as e:
-            print(f"预处理输入数据失败: {e}")
-            messagebox.showerror("预处理错误", f"预处理输入数据失败: {e}")
+            print(f"查找相似房源失败: {e}")
+            messagebox.showerror("查找错误", f"查找相似房源失败: {e}")
             return
-
-        # 使用KNN查找相似房源
-        try:
-            nbrs = NearestNeighbors(n_neighbors=5, algorithm='ball_tree').fit(X)
-            distances, indices = nbrs.kneighbors(input_processed)
-            similar_houses = df.iloc[indices[0]]
-        except Exception as e:
-            print(f"KNN查找失败: {e}")
-            messagebox.showerror("查找错误", f"KNN查找失败: {e}")
+        if similar_houses.empty:
+            messagebox.showwarning("没有数据", "数据库中没有数据可以用于查找相似房源！")
             return
 
         # 在新窗口中显示相似房源
         similar_window = tk.Toplevel(self.root)
         similar_window.title("相似房源推荐")
-        similar_window.geometry("900x400")
-
-        table = ttk.Treeview(similar_window,
-                             columns=("房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"),
-                             show="headings", height=15)
-        table.pack(pady=10)
+        similar_window.geometry("900x500")
 
         headers = ["房型", "面积", "楼层", "朝向", "建造年份", "业主", "地址", "描述", "价格"]
-        for header in headers:
-            table.heading(header, text=header)
-            if header == "地址":
-                table.column(header, width=200)
-            elif header == "描述":
-                table.column(header, width=300)
-            elif header == "价格":
-                table.column(header, width=100)
-            else:
-                table.column(header, width=100)
-
-        for _, row in similar_houses.iterrows():
-            table.insert("", tk.END, values=(
-                row['room_type'],
-                row['area'],
-                row['floor'],
-                row['orientation'],
-                row['build_year'],
-                row['owner_name'],
-                row['address'],
-                row['description'],
-                row['price']
-            ))
+        widths = [100, 100, 100, 100, 100, 100, 200, 300, 100]
+        if in_district:
+            comparables_title = f"{district}可比房源"
+        elif district:
+            # 区域无法识别或房源太少时引擎在全市查找，标题如实说明
+            comparables_title = f"全市可比房源（{district}没有足够的房源）"
+        else:
+            comparables_title = "全市可比房源"
+        for title, houses in (("与模型特征最接近的房源", similar_houses), (comparables_title, comparables)):
+            tk.Label(similar_window, text=title, font=("Arial", 12)).pack(pady=(10, 0))
+            table = VirtualTable(similar_window, headers, widths=widths, height=5)
+            table.pack(pady=5, fill=tk.BOTH, expand=True)
+            table.set_columns([houses[column].tolist() for column in HOUSE_COLUMNS])
 
     def load_data(self, city_name):
         db_path = f"{city_name}_house_data.db"
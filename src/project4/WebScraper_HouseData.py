@@ -28,7 +28,7 @@ class WebScraper_HouseData:
         :return: 网页HTML内容
         """
         try:
-            response = requests.get(url, headers=self.headers)
+            response = requests.get(url, headers=self.headers, timeout=10)
             response.raise_for_status()  # 如果返回状态码不是200，抛出异常
             response.encoding = response.apparent_encoding  # 自动检测编码
             return response.text
@@ -54,13 +54,14 @@ class WebScraper_HouseData:
         # 提取每种元素的文本内容
         tel_numbers = [tel.get_text(strip=True) for tel in tel_shop_paragraphs]
         add_shops = [add.get_text(strip=True) for add in add_shop_paragraphs]
+        districts = [self.parse_district(add) for add in add_shop_paragraphs]
         clearfix_labels = [label.get_text(strip=True) for label in clearfix_paragraphs]
         prices = [price.get_text(strip=True) for price in price_right_dd]
 
         data = []
 
         # 使用 zip 将数据按索引配对，保证每个电话、地址、描述、价格对应输出
-        for tel, addr, label, price in zip(tel_numbers, add_shops, clearfix_labels, prices):
+        for tel, addr, district, label, price in zip(tel_numbers, add_shops, districts, clearfix_labels, prices):
             # 解析电话信息
             phone_info = self.parse_phone_info(tel)
 
@@ -71,10 +72,6 @@ class WebScraper_HouseData:
                     print(f"价格解析失败: {price}")
                     continue  # 跳过无法解析价格的条目
 
-                print(f"房型: {phone_info.get('room_type', 'N/A')}, 面积: {phone_info.get('area', 'N/A')}, "
-                      f"楼层: {phone_info.get('floor', 'N/A')}, 朝向: {phone_info.get('orientation', 'N/A')}, "
-                      f"建造年份: {phone_info.get('build_year', 'N/A')}, 业主: {phone_info.get('owner_name', 'N/A')}, "
-                      f"地址: {addr}, 描述: {label}, 价格: {price_cleaned} 万元")
                 house_data = {
                     'room_type': phone_info.get('room_type', 'N/A'),
                     'area': phone_info.get('area', 'N/A'),
@@ -83,6 +80,7 @@ class WebScraper_HouseData:
                     'build_year': phone_info.get('build_year', 'N/A'),
                     'owner_name': phone_info.get('owner_name', 'N/A'),
                     'address': addr,
+                    'district': district,
                     'description': label,
                     'price': price_cleaned  # 单位：万元
                 }
@@ -92,6 +90,18 @@ class WebScraper_HouseData:
 
         return data
 
+    def parse_district(self, add_shop):
+        """
+        解析区域：地址形如 <a>小区名</a><span>朝阳-青年路</span>，区域为 span 中 "-" 之前的部分。
+        拼接后的地址文本中小区名和区域之间没有分隔，无法区分 "石景山" 与小区名的最后一个字
+        :param add_shop: class="add_shop" 的段落
+        :return: 区域，没有时返回 None
+        """
+        span = add_shop.find('span')
+        if span is None:
+            return None
+        return span.get_text(strip=True).split('-')[0] or None
+
     def parse_phone_info(self, tel):
         """
         解析电话部分的信息，包括房间配置、面积、楼层、朝向、建造年份和业主姓名
@@ -202,30 +212,42 @@ class WebScraper_HouseData:
             for item in data:
                 file.write(f"{item}\n")
 
-    def scrape(self, url=None):
+    def scrape_pages(self, url=None, cancelled=None):
         """
-        执行爬取操作，返回所有数据
+        逐页爬取，每解析完一页就产出 (页码, 该页数据)
         :param url: 可选，指定爬取的URL
-        :return: 数据列表
+        :param cancelled: 可选的 threading.Event，被设置后在当前页结束时停止爬取
         """
         # 如果没有传入url，则默认使用self.base_url
         if url is None:
             url = self.base_url
 
-        all_data = []
-
         for page_num in range(1, self.pages + 1):
+            if cancelled is not None and cancelled.is_set():
+                return
             full_url = f"{url}?page={page_num}"
             print(f"正在爬取: {full_url}")
 
             html = self.get_html(full_url)
-            if html:
-                page_data = self.parse_html(html)
-                all_data.extend(page_data)
+            page_data = self.parse_html(html) if html else []
+            yield page_num, page_data
 
-            # 防止频繁请求被封禁，设置随机的延时
-            time.sleep(random.uniform(1, 3))
+            # 防止频繁请求被封禁，设置随机的延时；取消时立即结束等待
+            delay = random.uniform(1, 3)
+            if cancelled is not None:
+                cancelled.wait(delay)
+            else:
+                time.sleep(delay)
 
+    def scrape(self, url=None):
+        """
+        执行爬取操作，返回所有数据
+        :param url: 可选，指定爬取的URL
+        :return: 数据列表
+        """
+        all_data = []
+        for _, page_data in self.scrape_pages(url):
+            all_data.extend(page_data)
         return all_data
 
 
@@ -0,0 +1,125 @@
+# tests/test_comparables_engine.py
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from fixtures import make_city_db, make_listings
+from ComparablesEngine import ComparablesEngine, DEFAULT_WEIGHTS, district_of
+
+
+class TestComparablesEngine(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.workdir, 'zz_house_data.db')
+        make_city_db(self.db_path, 600)
+        conn = sqlite3.connect(self.db_path)
+        # 只有 2 套房源的区域
+        conn.execute("UPDATE houses SET address = '小区' || rowid || '延庆-商圈', district = '延庆' WHERE rowid <= 2")
+        conn.commit()
+        conn.close()
+        self.engine = ComparablesEngine(self.db_path)
+        self.engine.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def brute_force(self, listing):
+        """逐行计算 Gower 距离"""
+        df = self.engine.fetch(self.engine.row_ids)
+        distance = np.zeros(len(df))
+        for feature in ('area', 'build_year'):
+            values = df[feature].to_numpy(dtype=float)
+            distance += DEFAULT_WEIGHTS[feature] * np.abs(values - listing[feature]) / np.ptp(values)
+        for feature in ('room_type', 'orientation', 'floor'):
+            distance += DEFAULT_WEIGHTS[feature] * (df[feature].to_numpy() != listing[feature])
+        return df, distance / sum(DEFAULT_WEIGHTS.values())
+
+    def test_district_of(self):
+        self.assertEqual(district_of('金隅丽港城朝阳-望京'), '朝阳')
+        # 三个字的区域要靠已知区域识别，地址文本中小区名和区域之间没有分隔
+        self.assertEqual(district_of('鲁谷小区石景山-鲁谷', known={'朝阳', '石景山'}), '石景山')
+        self.assertEqual(district_of('鲁谷小区石景山-鲁谷'), '景山')
+        self.assertIsNone(district_of('没有商圈的地址'))
+        self.assertIsNone(district_of(None))
+
+    def test_three_character_districts(self):
+        self.assertTrue({'石景山', '门头沟'} <= set(self.engine.districts))
+        self.assertNotIn('景山', self.engine.districts)
+        df, filtered = self.engine.query(make_listings(1, seed=7), k=5, district='门头沟区')
+        self.assertTrue(filtered)
+        self.assertTrue(all(address.split('-')[0].endswith('门头沟') for address in df['address']))
+
+    def district_of_row(self, engine, row_id):
+        names = {code: name for name, code in engine.districts.items()}
+        return names[engine.district_codes[np.flatnonzero(engine.row_ids == row_id)[0]]]
+
+    def test_old_rows_without_district_column(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("ALTER TABLE houses DROP COLUMN district")
+        conn.commit()
+        conn.close()
+        engine = ComparablesEngine(self.db_path)
+        engine.refresh()
+        # 没有已知区域时，三个字的区域只能取 "-" 前的两个字；用户输入的 "石景山" 仍能对应上
+        self.assertIn('景山', engine.districts)
+        self.assertTrue(engine.candidates('石景山', k=5)[1])
+
+    def test_old_rows_use_known_districts(self):
+        conn = sqlite3.connect(self.db_path)
+        # 爬取时没有解析区域的旧房源，district 为空
+        conn.execute("UPDATE houses SET district = NULL WHERE rowid % 2 = 0")
+        conn.commit()
+        row_id = conn.execute("SELECT rowid FROM houses WHERE district IS NULL AND address LIKE '%石景山-%'").fetchone()[0]
+        conn.close()
+        engine = ComparablesEngine(self.db_path)
+        engine.refresh()
+        self.assertEqual(self.district_of_row(engine, row_id), '石景山')
+        self.assertNotIn('景山', engine.districts)
+
+    def test_candidates_report_whether_district_applied(self):
+        candidates, filtered = self.engine.candidates('朝阳区', k=5)
+        self.assertTrue(filtered)
+        self.assertLess(candidates.stop - candidates.start, len(self.engine))
+        # 房源不足 k 套、无法识别或没有指定区域时退回全市
+        for district in ('延庆', '火星', None):
+            self.assertEqual(self.engine.candidates(district, k=5), (slice(0, len(self.engine)), False))
+
+    def test_city_wide_query_matches_brute_force(self):
+        listing = make_listings(1, seed=7)
+        df, filtered = self.engine.query(listing, k=5)
+        self.assertFalse(filtered)
+        _, expected = self.brute_force(listing.iloc[0])
+        np.testing.assert_allclose(df['distance'], np.sort(expected)[:5], rtol=1e-5)
+
+    def test_district_query_stays_in_district(self):
+        df, filtered = self.engine.query(make_listings(1, seed=7), k=5, district='海淀')
+        self.assertTrue(filtered)
+        self.assertEqual(len(df), 5)
+        self.assertTrue(all(district_of(address) == '海淀' for address in df['address']))
+
+    def test_small_district_falls_back_to_city(self):
+        df, filtered = self.engine.query(make_listings(1, seed=7), k=5, district='延庆')
+        self.assertFalse(filtered)
+        self.assertEqual(len(df), 5)
+
+    def test_batch_flags_each_query(self):
+        _, _, filtered = self.engine.query_batch(make_listings(3, seed=7), 5, ['海淀', '延庆', None])
+        self.assertEqual(filtered.tolist(), [True, False, False])
+
+    def test_refresh_reads_only_new_rows(self):
+        self.assertEqual(self.engine.refresh(), 0)
+        conn = sqlite3.connect(self.db_path)
+        make_listings(10, seed=8).to_sql('houses', conn, index=False, if_exists='append')
+        conn.close()
+        self.assertEqual(self.engine.refresh(), 10)
+        self.assertEqual(len(self.engine), 610)
+
+
+if __name__ == '__main__':
+    unittest.main()
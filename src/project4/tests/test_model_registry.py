@@ -0,0 +1,108 @@
+# tests/test_model_registry.py
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from ModelRegistry import ModelRegistry
+
+
+def make_pipeline(coef):
+    model = LinearRegression()
+    model.coef_, model.intercept_ = [coef], 0.0
+    return Pipeline([('model', model)])
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.registry = ModelRegistry(root=self.root, cache_size=2, keep_versions=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def save(self, coef, city_name='zz', model_type='linear'):
+        return self.registry.save(make_pipeline(coef), city_name, model_type, rows=10, mse=1.0, train_seconds=0.1)
+
+    def test_versions_increase_and_latest_is_loaded(self):
+        for coef in (1.0, 2.0):
+            self.save(coef)
+        self.assertEqual([meta['version'] for meta in self.registry.versions('zz', 'linear')], [1, 2])
+        pipeline, meta = self.registry.load('zz', 'linear')
+        self.assertEqual(meta['version'], 2)
+        self.assertEqual(pipeline.named_steps['model'].coef_[0], 2.0)
+        pipeline, _ = self.registry.load('zz', 'linear', version=1)
+        self.assertEqual(pipeline.named_steps['model'].coef_[0], 1.0)
+        self.assertTrue(os.path.exists(self.registry.legacy_path('zz')))
+
+    def test_old_versions_are_pruned(self):
+        for coef in range(5):
+            self.save(float(coef))
+        self.assertEqual([meta['version'] for meta in self.registry.versions('zz', 'linear')], [3, 4, 5])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'zz', 'linear', 'v1')))
+
+    def test_version_without_meta_is_invisible(self):
+        self.save(1.0)
+        # 另一个进程正在写入的版本：目录已创建但 meta.json 还没有替换到位
+        os.makedirs(os.path.join(self.root, 'zz', 'linear', 'v2'))
+        with open(os.path.join(self.root, 'zz', 'linear', 'v2', 'meta.json.123.tmp'), 'w') as f:
+            f.write('{"version": ')
+        self.assertEqual([meta['version'] for meta in self.registry.versions('zz', 'linear')], [1])
+        # 该版本号已被占用，下一次保存使用 v3
+        self.assertEqual(self.save(2.0)['version'], 3)
+
+    def test_concurrent_save_takes_next_version(self):
+        real_makedirs = os.makedirs
+
+        def makedirs(path, exist_ok=False):
+            # 模拟另一个进程在列出目录之后、创建目录之前抢先创建了 v1
+            if path.endswith('v1') and not os.path.exists(path):
+                real_makedirs(path)
+            return real_makedirs(path, exist_ok=exist_ok)
+
+        with mock.patch('ModelRegistry.os.makedirs', side_effect=makedirs):
+            self.assertEqual(self.save(1.0)['version'], 2)
+
+    def test_remove_temp_files_of_interrupted_save(self):
+        self.save(1.0)
+        # 进程 123 在保存 v2 和更新索引时被终止，进程 456 的保存还在进行
+        version_dir = os.path.join(self.root, 'zz', 'linear', 'v2')
+        os.makedirs(version_dir)
+        for path in (os.path.join(version_dir, 'pipeline.joblib.123.tmp'),
+                     os.path.join(self.root, 'zz_neighbors.joblib.123.tmp'),
+                     os.path.join(self.root, 'zz_neighbors.joblib.456.tmp')):
+            open(path, 'w').close()
+        self.assertEqual(self.registry.remove_temp_files(123), 2)
+        self.assertFalse(os.path.exists(version_dir))
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'zz_neighbors.joblib.456.tmp')))
+        self.assertEqual([meta['version'] for meta in self.registry.versions('zz', 'linear')], [1])
+        self.assertIsNotNone(self.registry.load('zz', 'linear')[0])
+
+    def test_lru_cache(self):
+        self.save(1.0, model_type='linear')
+        self.save(2.0, model_type='tree')
+        self.save(3.0, model_type='forest')
+        linear, _ = self.registry.load('zz', 'linear')
+        self.assertIs(self.registry.load('zz', 'linear')[0], linear)
+        self.registry.load('zz', 'tree')
+        # 再次使用 linear 后，最久未使用的是 tree，加载 forest 时淘汰 tree
+        self.registry.load('zz', 'linear')
+        self.registry.load('zz', 'forest')
+        self.assertEqual(set(self.registry._cache), {('zz', 'linear', 1), ('zz', 'forest', 1)})
+        self.assertIs(self.registry.load('zz', 'linear')[0], linear)
+
+    def test_unmapped_load_returns_private_copy(self):
+        self.save(1.0)
+        cached, _ = self.registry.load('zz', 'linear')
+        private, _ = self.registry.load('zz', 'linear', mmap=False)
+        self.assertIsNot(private, cached)
+
+
+if __name__ == '__main__':
+    unittest.main()
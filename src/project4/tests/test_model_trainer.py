@@ -0,0 +1,43 @@
+# tests/test_model_trainer.py
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.pipeline import Pipeline
+from fixtures import make_listings
+from FeatureExtractor import HashingFeatures
+from ModelTrainer import ModelTrainer
+from NeighborIndex import FEATURE_COLUMNS
+
+
+class TestTrainChunks(unittest.TestCase):
+    def setUp(self):
+        self.df = make_listings(3000)
+        self.chunks = lambda: ((chunk[FEATURE_COLUMNS], chunk['price'])
+                               for chunk in (self.df[start:start + 1000] for start in range(0, 3000, 1000)))
+
+    def pipeline(self, trainer):
+        return Pipeline([('preprocessor', HashingFeatures()), ('model', trainer.model)])
+
+    def test_held_out_rows_are_learned_after_scoring(self):
+        trainer = ModelTrainer(model_type='online')
+        pipeline = trainer.train_chunks(self.pipeline(trainer), self.chunks, epochs=3)
+        # 之后的增量更新只读取新增的房源，留出评估的行最后也要学习
+        self.assertEqual(trainer.rows, len(self.df))
+        self.assertEqual(pipeline.named_steps['preprocessor'].scaler_.n_samples_seen_.max(), len(self.df))
+        self.assertGreater(trainer.mse, 0)
+
+    def test_update_scores_before_learning(self):
+        trainer = ModelTrainer(model_type='online')
+        pipeline = trainer.train_chunks(self.pipeline(trainer), self.chunks, epochs=3)
+        new = make_listings(200, seed=1)
+        before = ((pipeline.predict(new[FEATURE_COLUMNS]) - new['price']) ** 2).mean()
+        trainer.train_chunks(pipeline, lambda: [(new[FEATURE_COLUMNS], new['price'])], test_size=0)
+        self.assertAlmostEqual(trainer.mse, before, places=6)
+        self.assertEqual(trainer.rows, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
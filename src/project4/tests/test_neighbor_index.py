@@ -0,0 +1,164 @@
+# tests/test_neighbor_index.py
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.neighbors import NearestNeighbors
+from sklearn.pipeline import Pipeline
+from fixtures import make_city_db, make_listings
+from DataPreprocessor import DataPreprocessor
+import NeighborIndex as neighbor_index
+from NeighborIndex import NeighborIndex, FEATURE_COLUMNS
+
+
+class TestMatchesBruteForce(unittest.TestCase):
+    """分组、KD 树和增量部分都不应改变结果：与在全部数据上暴力搜索的最近距离一致"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.workdir, 'zz_house_data.db')
+        make_city_db(self.db_path, 3000)
+        conn = sqlite3.connect(self.db_path)
+        # 面积缺失的行无法计算距离，不进入索引
+        conn.execute("UPDATE houses SET area = NULL WHERE rowid = 3")
+        conn.commit()
+        conn.close()
+        self.index = NeighborIndex('zz', models_dir=self.workdir, db_path=self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def train(self, extract_features):
+        df = self.read_all()
+        pipeline = Pipeline([('preprocessor', DataPreprocessor(extract_features=extract_features).preprocessor),
+                             ('model', LinearRegression())]).fit(df[FEATURE_COLUMNS], df['price'])
+        joblib.dump(pipeline, self.index.pipeline_path)
+        return pipeline.named_steps['preprocessor']
+
+    def read_all(self):
+        conn = sqlite3.connect(self.db_path)
+        df = pd.read_sql_query("SELECT rowid AS row_id, * FROM houses", conn)
+        conn.close()
+        return df.dropna(subset=['area'])
+
+    def append(self, rows, seed):
+        conn = sqlite3.connect(self.db_path)
+        make_listings(rows, seed=seed).to_sql('houses', conn, index=False, if_exists='append')
+        conn.close()
+
+    def assert_matches(self, preprocessor, k=5):
+        df = self.read_all()
+        X = preprocessor.transform(df[FEATURE_COLUMNS])
+        brute = NearestNeighbors(n_neighbors=k).fit(X.toarray() if hasattr(X, 'toarray') else X)
+        queries = make_listings(20, seed=9)
+        # 训练时没见过的类别取值
+        queries.loc[0, 'orientation'] = '未知'
+        self.assertTrue(self.index.load())
+        for i in range(len(queries)):
+            query = queries.iloc[[i]]
+            row_ids, distances = self.index.query(query, preprocessor, k=k)
+            expected, _ = brute.kneighbors(preprocessor.transform(query[FEATURE_COLUMNS]))
+            np.testing.assert_allclose(distances, expected[0], atol=1e-4)
+            self.assertNotIn(3, row_ids)
+
+    def test_one_hot_groups(self):
+        preprocessor = self.train(extract_features=False)
+        self.index.build(preprocessor)
+        self.assert_matches(preprocessor)
+
+    def test_extracted_features_with_kd_trees(self):
+        preprocessor = self.train(extract_features=True)
+        # 没有独热编码的特征时只有一组，行数足够时用 KD 树查询
+        with mock.patch.object(neighbor_index, 'TREE_MIN_ROWS', 100):
+            self.index.build(preprocessor)
+        self.assertTrue(self.index.load())
+        self.assertIsNotNone(self.index._base['trees'][0])
+        self.assert_matches(preprocessor)
+
+    def test_delta_is_searched(self):
+        preprocessor = self.train(extract_features=False)
+        self.index.build(preprocessor)
+        self.append(100, seed=4)
+        self.assertEqual(self.index.update(), 100)
+        self.append(50, seed=5)
+        self.assertEqual(self.index.update(), 50)
+        self.assertTrue(os.path.exists(self.index.delta_path))
+        self.assertTrue(self.index.load())
+        self.assertEqual(len(self.index._delta['row_ids']), 150)
+        self.assert_matches(preprocessor)
+
+    def test_large_delta_is_merged(self):
+        preprocessor = self.train(extract_features=False)
+        self.index.build(preprocessor)
+        self.append(100, seed=4)
+        self.assertEqual(self.index.update(), 100)
+        self.append(200, seed=5)
+        with mock.patch.object(neighbor_index, 'REBUILD_MIN_ROWS', 250):
+            self.assertEqual(self.index.update(), 200)
+        # 增量部分合并进主索引后删除
+        self.assertFalse(os.path.exists(self.index.delta_path))
+        self.assertTrue(self.index.load())
+        self.assertIsNone(self.index._delta)
+        self.assertEqual(len(self.index._base['row_ids']), 3299)
+        self.assert_matches(preprocessor)
+
+    def test_retrained_model_invalidates_index(self):
+        self.index.build(self.train(extract_features=False))
+        self.assertTrue(self.index.load())
+        os.utime(self.index.pipeline_path, ns=(0, os.stat(self.index.pipeline_path).st_mtime_ns + 10 ** 9))
+        self.assertFalse(self.index.load())
+        self.assertEqual(self.index.update(), 0)
+
+
+class TestWithoutPipeline(unittest.TestCase):
+    """只训练过 online 或 hgb 模型的城市没有 {city}_pipeline.joblib"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.workdir, 'zz_house_data.db')
+        make_city_db(self.db_path, 500)
+        self.index = NeighborIndex('zz', models_dir=self.workdir, db_path=self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_similar_houses_uses_default_preprocessor(self):
+        query = make_listings(1, seed=3)[FEATURE_COLUMNS]
+        similar = self.index.similar_houses(query, k=5)
+        self.assertEqual(len(similar), 5)
+        # 默认预处理器随索引保存，之后的查询直接使用
+        self.assertIn('preprocessor', self.index._base)
+        self.assertIs(self.index.preprocessor(), self.index._base['preprocessor'])
+        self.assertEqual(len(self.index.similar_houses(query, k=5)), 5)
+
+    def test_update_keeps_default_preprocessor(self):
+        self.index.similar_houses(make_listings(1, seed=3)[FEATURE_COLUMNS], k=5)
+        conn = sqlite3.connect(self.db_path)
+        make_listings(20, seed=4).to_sql('houses', conn, index=False, if_exists='append')
+        conn.close()
+        self.assertEqual(self.index.update(), 20)
+        self.assertTrue(self.index.load())
+        self.assertEqual(len(self.index.similar_houses(make_listings(1, seed=5)[FEATURE_COLUMNS], k=5)), 5)
+
+    def test_empty_table_has_no_similar_houses(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM houses")
+        conn.commit()
+        conn.close()
+        self.assertIsNone(self.index.preprocessor())
+        self.assertTrue(self.index.similar_houses(make_listings(1, seed=3)[FEATURE_COLUMNS], k=5).empty)
+        self.assertFalse(os.path.exists(self.index.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# tests/test_training_pool.py
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from multiprocessing import Pipe
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import make_city_db, make_listings
+from ModelRegistry import ModelRegistry
+from NeighborIndex import NeighborIndex, FEATURE_COLUMNS
+from TrainingPool import TrainingPool, PENDING, RUNNING, train_job
+
+
+def run_job(city_name, model_type, n_jobs=1):
+    """在当前进程中执行训练任务，返回最后一条消息"""
+    receiver, sender = Pipe(duplex=False)
+    train_job(city_name, model_type, sender, n_jobs)
+    messages = []
+    try:
+        while receiver.poll():
+            messages.append(receiver.recv())
+    except EOFError:
+        # 任务结束时关闭了发送端
+        pass
+    return messages[-1]
+
+
+class TestTrainJob(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        # train_job 使用相对路径的数据库和 models 目录
+        os.chdir(self.workdir)
+        make_city_db('zz_house_data.db', 500)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_hgb_only_city_gets_similar_houses(self):
+        self.assertEqual(run_job('zz', 'hgb')[0], 'done')
+        self.assertFalse(os.path.exists(ModelRegistry().legacy_path('zz')))
+        index = NeighborIndex('zz')
+        # 训练时已用默认预处理器建立索引
+        self.assertTrue(index.load())
+        self.assertEqual(len(index.similar_houses(make_listings(1, seed=3)[FEATURE_COLUMNS], k=5)), 5)
+
+    def test_hgb_job_skips_index_when_table_is_emptied(self):
+        save = ModelRegistry.save
+
+        def save_then_clear(registry, *args, **kwargs):
+            # 模型保存前房源被清空（例如重建了数据库），默认预处理器无法拟合
+            conn = sqlite3.connect('zz_house_data.db')
+            conn.execute("DELETE FROM houses")
+            conn.commit()
+            conn.close()
+            return save(registry, *args, **kwargs)
+
+        with mock.patch.object(ModelRegistry, 'save', save_then_clear):
+            self.assertEqual(run_job('zz', 'hgb')[0], 'done')
+        self.assertFalse(NeighborIndex('zz').load())
+
+    def test_training_threads_are_limited_to_allotted_cores(self):
+        from threadpoolctl import threadpool_info
+        from ModelTrainer import ModelTrainer
+        train = ModelTrainer.train
+        threads = []
+
+        def limited_train(trainer, *args):
+            threads.extend(info['num_threads'] for info in threadpool_info())
+            return train(trainer, *args)
+
+        with mock.patch.object(ModelTrainer, 'train', limited_train):
+            self.assertEqual(run_job('zz', 'hgb', n_jobs=2)[0], 'done')
+        # OpenMP（hgb）和 BLAS 的线程数都等于分配的核数，与机器的核数无关
+        self.assertTrue(threads)
+        self.assertEqual(set(threads), {2})
+
+
+class TestCoreBudget(unittest.TestCase):
+    def setUp(self):
+        self.pool = TrainingPool(max_workers=4)
+        # 不启动真实进程，只检查分配的核数
+        self.pool.context = mock.Mock()
+        self.pool.context.Pipe.side_effect = lambda duplex: (mock.Mock(), mock.Mock())
+
+    def test_auto_job_takes_free_cores(self):
+        linear = self.pool.submit('zz', 'linear')
+        auto = self.pool.submit('zz', 'auto')
+        tree = self.pool.submit('zz', 'tree')
+        self.assertEqual((linear.n_jobs, auto.n_jobs), (1, 3))
+        self.assertEqual(self.pool.context.Process.call_args_list[1].kwargs['args'][3], 3)
+        # 核数已用完，后面的任务排队
+        self.assertEqual([job.status for job in (linear, auto, tree)], [RUNNING, RUNNING, PENDING])
+
+    def test_hgb_job_takes_free_cores(self):
+        linear = self.pool.submit('zz', 'linear')
+        hgb = self.pool.submit('zz', 'hgb')
+        self.assertEqual((linear.n_jobs, hgb.n_jobs), (1, 3))
+        self.assertEqual(self.pool.submit('yy', 'tree').status, PENDING)
+
+    def test_cancel_removes_temp_files(self):
+        job = self.pool.submit('zz', 'linear')
+        job.process.pid = 123
+        with mock.patch('ModelRegistry.ModelRegistry.remove_temp_files') as remove_temp_files:
+            self.pool.cancel(job.job_id)
+        remove_temp_files.assert_called_once_with(123)
+
+    def test_auto_job_waits_for_a_free_core(self):
+        jobs = [self.pool.submit(city, 'linear') for city in ('aa', 'bb', 'cc', 'dd')]
+        auto = self.pool.submit('zz', 'auto')
+        self.assertNotEqual(auto.status, RUNNING)
+        self.pool.cancel(jobs[0].job_id)
+        self.assertEqual((auto.status, auto.n_jobs), (RUNNING, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# tests/test_virtual_table.py
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VirtualTable import TableModel
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# project3 客户端中的副本
+CLIENT_COPY = os.path.join(PROJECT_DIR, os.pardir, 'project3', 'client', 'virtual_table.py')
+
+ROWS = [('3室2厅', '91㎡', '360万'), ('2室1厅', '60㎡', '200万'), ('4室2厅', '', '1200万'),
+        ('1室1厅', '35.5㎡', '95万'), ('2室2厅', '88㎡', '310万')]
+
+
+class TestTableModel(unittest.TestCase):
+    def setUp(self):
+        self.model = TableModel(3, height=2)
+        self.model.set_columns([list(column) for column in zip(*ROWS)])
+
+    def test_visible_window(self):
+        self.assertEqual(self.model.visible_rows(), ROWS[:2])
+        self.model.scroll(2)
+        self.assertEqual(self.model.visible_rows(), ROWS[2:4])
+        # 不会滚动到最后一屏之后或第一行之前
+        self.model.scroll(100)
+        self.assertEqual((self.model.offset, self.model.visible_rows()), (3, ROWS[3:]))
+        self.model.scroll(-100)
+        self.assertEqual(self.model.offset, 0)
+
+    def test_short_table_fits_in_window(self):
+        model = TableModel(3, height=15)
+        model.set_columns([list(column) for column in zip(*ROWS)])
+        model.scroll(3)
+        self.assertEqual(model.visible_rows(), ROWS)
+
+    def test_numeric_sort_puts_blanks_last(self):
+        self.model.sort_by(1)
+        self.assertEqual([self.model.row(i)[1] for i in range(len(self.model))], ['35.5㎡', '60㎡', '88㎡', '91㎡', ''])
+        # 按数值而不是文本排序："1200万" 在 "95万" 之后
+        self.model.sort_by(2, descending=True)
+        self.assertEqual([self.model.row(i)[2] for i in range(len(self.model))],
+                         ['1200万', '360万', '310万', '200万', '95万'])
+        self.assertEqual(self.model.sorted_by, (2, True))
+
+    def test_text_sort(self):
+        self.model.sort_by(0)
+        self.assertEqual([self.model.row(i)[0] for i in range(len(self.model))], sorted(row[0] for row in ROWS))
+
+    def test_appended_rows_stay_at_end_until_resorted(self):
+        self.model.sort_by(1)
+        self.assertEqual(self.model.append_rows([('1室0厅', '20㎡', '50万')]), 1)
+        self.assertEqual(self.model.row(len(self.model) - 1)[1], '20㎡')
+        self.model.sort_by(1)
+        self.assertEqual(self.model.row(0)[1], '20㎡')
+
+    def test_set_columns_resets_sort_and_window(self):
+        self.model.sort_by(1)
+        self.model.scroll(2)
+        self.model.set_columns([['a'], ['1'], ['2']])
+        self.assertEqual((self.model.sorted_by, self.model.offset, len(self.model)), (None, 0, 1))
+        with self.assertRaises(ValueError):
+            self.model.set_columns([['a']])
+
+
+@unittest.skipUnless(os.path.exists(CLIENT_COPY), "没有 project3 客户端")
+class TestClientCopy(unittest.TestCase):
+    def test_client_copy_matches(self):
+        def body(path):
+            with open(path, encoding='utf-8') as f:
+                # 去掉顶格的注释（文件名和副本说明）和空行
+                return ''.join(line for line in f.readlines() if line.strip() and not line.startswith('#'))
+        self.assertEqual(body(CLIENT_COPY), body(os.path.join(PROJECT_DIR, 'VirtualTable.py')))
+
+
+if __name__ == '__main__':
+    unittest.main()